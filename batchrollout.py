@@ -0,0 +1,283 @@
+import numpy as np
+
+GAME_BET_TYPES = ("win", "lose")
+
+
+class RolloutBatch:
+    """
+    Many games held in arrays, one row per game, that are played in lockstep: every step, each running game makes one
+    uniformly random valid move, as mcts.random_rollout() does, with the same rules as camelup.py. The cost of a step
+    is a fixed number of numpy operations, whatever the number of games.
+
+    Camels are referred to by their index in GameState.CAMELS. A camel is placed by its field and its height in the
+    stack on that field (0 for the bottom-most camel). Bets hidden in a player's copy of the game state are left out:
+    they neither pay out nor keep anyone from betting on a camel.
+    """
+    def __init__(self, states, players):
+        """
+        :param states: List of GameState objects, all with the same rules. They are not modified.
+        :param players: List with the player to move in every state.
+        """
+        g = states[0]
+        num_games = len(states)
+        self.num_camels = g.NUM_CAMELS
+        self.num_players = g.NUM_PLAYERS
+        self.board_size = g.BOARD_SIZE
+        self.move_range = g.MOVE_RANGE
+        self.first_place_payout = np.array(g.FIRST_PLACE_ROUND_PAYOUT)
+        self.second_place_payout = np.array(g.SECOND_PLACE_ROUND_PAYOUT)
+        self.third_or_worse_place_payout = g.THIRD_OR_WORSE_PLACE_ROUND_PAYOUT
+        self.bad_game_end_bet = g.BAD_GAME_END_BET
+        camel_index = {camel: i for i, camel in enumerate(g.CAMELS)}
+
+        self.rows = np.arange(num_games)
+        self.player = np.array(players)
+        self.active = np.array([state.active_game for state in states])
+        self.money = np.array([state.player_money_values for state in states])
+        self.yet_to_move = np.array([state.camel_yet_to_move for state in states])
+        self.position = np.zeros((num_games, self.num_camels), dtype=int)
+        self.height = np.zeros((num_games, self.num_camels), dtype=int)
+        self.trap_type = np.zeros((num_games, 2 * self.board_size), dtype=int)
+        self.trap_owner = np.full((num_games, 2 * self.board_size), -1)
+        self.round_bets = np.full((num_games, self.num_camels, len(self.first_place_payout)), -1)
+        self.round_bet_count = np.zeros((num_games, self.num_camels), dtype=int)
+        visible_bets = [[[bet for bet in bets if bet[1] is not None]
+                         for bets in (state.game_winner_bets, state.game_loser_bets)] for state in states]
+        max_bets = max(len(bets) for game in visible_bets for bets in game) + self.num_players * self.num_camels
+        self.game_end_payout = np.ones(max_bets, dtype=int)
+        self.game_end_payout[:len(g.GAME_END_PAYOUT)] = g.GAME_END_PAYOUT[:max_bets]
+        self.game_bet_camel = np.full((num_games, len(GAME_BET_TYPES), max_bets), -1)
+        self.game_bet_player = np.full((num_games, len(GAME_BET_TYPES), max_bets), -1)
+        self.game_bet_count = np.zeros((num_games, len(GAME_BET_TYPES)), dtype=int)
+        self.has_game_bet = np.zeros((num_games, self.num_players, self.num_camels), dtype=bool)
+
+        for row, state in enumerate(states):
+            for field, stack in enumerate(state.camel_track):
+                for height, camel in enumerate(stack):
+                    self.position[row, camel_index[camel]] = field
+                    self.height[row, camel_index[camel]] = height
+            for field, trap in enumerate(state.trap_track):
+                if trap:
+                    self.trap_type[row, field], self.trap_owner[row, field] = trap
+            for camel, player in state.round_bets:
+                self.round_bets[row, camel_index[camel], self.round_bet_count[row, camel_index[camel]]] = player
+                self.round_bet_count[row, camel_index[camel]] += 1
+            for bet_type, bets in enumerate(visible_bets[row]):
+                for camel, player in bets:
+                    self.place_game_bet(np.array([row]), np.array([player]), np.array([bet_type]),
+                                        np.array([camel_index[camel]]))
+
+    def trap_options(self, rows, players):
+        """
+        :param rows: Array of game rows.
+        :param players: Array with the player to move in every row.
+        :return: Boolean array with a column per field from 1 to board_size - 1, True where the player may put a trap.
+        """
+        occupied = np.zeros((len(rows), self.trap_type.shape[1]), dtype=bool)
+        occupied[np.arange(len(rows))[:, None], self.position[rows]] = True
+        trap_type = self.trap_type[rows]
+        others = (trap_type != 0) & (self.trap_owner[rows] != players[:, None])
+        return ~occupied[:, 1:self.board_size] & (trap_type[:, 1:self.board_size] == 0) & \
+            ~others[:, :self.board_size - 1] & ~others[:, 2:self.board_size + 1]
+
+    def options(self, rows, players):
+        """
+        :param rows: Array of game rows.
+        :param players: Array with the player to move in every row.
+        :return: A tuple (traps, round_bets, game_bets) of boolean arrays marking the free trap fields (see
+            trap_options()), the camels open for round bets and the camels open for the player's game bets.
+        """
+        return (self.trap_options(rows, players), self.round_bet_count[rows] < self.round_bets.shape[2],
+                ~self.has_game_bet[rows, players])
+
+    def num_moves(self, rows=None):
+        """
+        :param rows: Optional array of game rows, all of them by default.
+        :return: The number of valid moves in every row, i.e. the length of camelup.get_valid_moves().
+        """
+        rows = self.rows if rows is None else rows
+        traps, round_bets, game_bets = self.options(rows, self.player[rows])
+        return 1 + 2 * traps.sum(1) + round_bets.sum(1) + 2 * game_bets.sum(1)
+
+    def step(self):
+        """
+        Makes one uniformly random valid move in every running game and passes the turn on.
+        """
+        rows = np.flatnonzero(self.active)
+        players = self.player[rows]
+        traps, round_bets, game_bets = self.options(rows, players)
+        num_traps, num_round_bets, num_game_bets = traps.sum(1), round_bets.sum(1), game_bets.sum(1)
+        # Moves are numbered in the order of camelup.get_valid_moves(): the roll, the traps, the round bets and the
+        # game bets
+        choice = (np.random.random(len(rows)) * (1 + 2 * num_traps + num_round_bets + 2 * num_game_bets)).astype(int)
+
+        trap_choice = choice - 1
+        chosen = (trap_choice >= 0) & (trap_choice < 2 * num_traps)
+        if chosen.any():
+            index = trap_choice[chosen] % num_traps[chosen]
+            self.move_trap(rows[chosen], players[chosen], np.where(trap_choice[chosen] < num_traps[chosen], 1, -1),
+                           nth_true(traps[chosen], index) + 1)
+
+        round_choice = trap_choice - 2 * num_traps
+        chosen = (round_choice >= 0) & (round_choice < num_round_bets)
+        if chosen.any():
+            self.place_round_bet(rows[chosen], players[chosen], nth_true(round_bets[chosen], round_choice[chosen]))
+
+        game_choice = round_choice - num_round_bets
+        chosen = game_choice >= 0
+        if chosen.any():
+            self.place_game_bet(rows[chosen], players[chosen], game_choice[chosen] // num_game_bets[chosen],
+                                nth_true(game_bets[chosen], game_choice[chosen] % num_game_bets[chosen]))
+
+        chosen = choice == 0
+        if chosen.any():
+            self.move_camel(rows[chosen], players[chosen])
+        self.player[rows] = (players + 1) % self.num_players
+
+    def play(self):
+        """
+        Plays every game to its end.
+        :return: The RolloutBatch.
+        """
+        while self.active.any():
+            self.step()
+        return self
+
+    def results(self):
+        """
+        :return: Array with one row per game: 1 for the player with the most coins (the first of them on a tie, like
+            mcts.random_rollout()) and 0 for everyone else.
+        """
+        results = np.zeros((len(self.rows), self.num_players))
+        results[self.rows, np.argmax(self.money, axis=1)] = 1
+        return results
+
+    def move_trap(self, rows, players, trap_types, fields):
+        """
+        Places, or moves, the trap of a player in some games, see camelup.move_trap().
+        """
+        old = self.trap_owner[rows] == players[:, None]
+        self.trap_type[rows] = np.where(old, 0, self.trap_type[rows])
+        self.trap_owner[rows] = np.where(old, -1, self.trap_owner[rows])
+        self.trap_type[rows, fields] = trap_types
+        self.trap_owner[rows, fields] = players
+
+    def place_round_bet(self, rows, players, camels):
+        """
+        Takes the next round bet ticket of a camel in some games, see camelup.place_round_winner_bet().
+        """
+        self.round_bets[rows, camels, self.round_bet_count[rows, camels]] = players
+        self.round_bet_count[rows, camels] += 1
+
+    def place_game_bet(self, rows, players, bet_types, camels):
+        """
+        Places a game winner (bet type 0) or loser (bet type 1) bet in some games, see camelup.place_game_bet().
+        """
+        index = self.game_bet_count[rows, bet_types]
+        self.game_bet_camel[rows, bet_types, index] = camels
+        self.game_bet_player[rows, bet_types, index] = players
+        self.game_bet_count[rows, bet_types] += 1
+        self.has_game_bet[rows, players, camels] = True
+
+    def move_camel(self, rows, players, camels=None, distances=None):
+        """
+        Rolls the dice in some games and moves a camel and every camel on top of it, resolving traps, the end of the
+        round and the end of the game like camelup.move_camel().
+        :param rows: Array of game rows.
+        :param players: Array with the rolling player of every row.
+        :param camels: Optional array of camels to move instead of random ones. They must not have moved yet.
+        :param distances: Optional array of dice rolls to use instead of random ones.
+        """
+        n = np.arange(len(rows))
+        if camels is None:
+            yet_to_move = self.yet_to_move[rows]
+            camels = nth_true(yet_to_move, (np.random.random(len(rows)) * yet_to_move.sum(1)).astype(int))
+        if distances is None:
+            distances = np.random.randint(self.move_range[0], self.move_range[1] + 1, len(rows))
+        self.yet_to_move[rows, camels] = False
+
+        position, height = self.position[rows], self.height[rows]
+        start, base = position[n, camels], height[n, camels]
+        movers = (position == start[:, None]) & (height >= base[:, None])
+        landing = start + distances
+        trap_type, trap_owner = self.trap_type[rows, landing], self.trap_owner[rows, landing]
+        hit = trap_type != 0
+        np.add.at(self.money, (rows[hit], trap_owner[hit]), 1)
+        target = landing + trap_type
+        on_target = (position == target[:, None]) & ~movers
+        below = (trap_type == -1)[:, None]
+        # A -1 trap puts the moving camels under the stack on the target field, otherwise they go on top of it
+        mover_height = height - base[:, None] + np.where(below, 0, on_target.sum(1, keepdims=True))
+        self.height[rows] = np.where(movers, mover_height,
+                                     np.where(on_target & below, height + movers.sum(1, keepdims=True), height))
+        self.position[rows] = np.where(movers, target[:, None], position)
+        np.add.at(self.money, (rows, players), 1)
+
+        game_over = (self.position[rows] >= self.board_size).any(1)
+        round_over = ~self.yet_to_move[rows].any(1) | game_over
+        if round_over.any():
+            self.end_of_round(rows[round_over])
+        if game_over.any():
+            self.end_of_game(rows[game_over])
+
+    def ranking(self, rows):
+        """
+        :param rows: Array of game rows.
+        :return: Array with the camels of every row ordered from first to last place.
+        """
+        return np.argsort(-(self.position[rows] * self.num_camels + self.height[rows]), axis=1)
+
+    def end_of_round(self, rows):
+        """
+        Pays out the round bets of some games and starts their next round, see camelup.end_of_round().
+        """
+        ranking = self.ranking(rows)
+        camels = np.arange(self.num_camels)
+        first = (camels == ranking[:, :1])[:, :, None]
+        second = (camels == ranking[:, 1:2])[:, :, None]
+        payouts = np.where(first, self.first_place_payout, np.where(second, self.second_place_payout,
+                                                                    self.third_or_worse_place_payout))
+        bets = self.round_bets[rows]
+        placed = bets >= 0
+        np.add.at(self.money, (np.broadcast_to(rows[:, None, None], bets.shape)[placed], bets[placed]),
+                  payouts[placed])
+        self.round_bets[rows] = -1
+        self.round_bet_count[rows] = 0
+        self.yet_to_move[rows] = True
+
+    def end_of_game(self, rows):
+        """
+        Pays out the game winner and loser bets of some games and ends them, see camelup.end_of_game().
+        """
+        ranking = self.ranking(rows)
+        for bet_type, camel in enumerate((ranking[:, 0], ranking[:, -1])):
+            bet_camels, bet_players = self.game_bet_camel[rows, bet_type], self.game_bet_player[rows, bet_type]
+            # camelup.end_of_game() skips the bets of player 0 along with the hidden ones
+            settled = bet_players > 0
+            correct = settled & (bet_camels == camel[:, None])
+            payouts = np.where(correct, self.game_end_payout[np.maximum(np.cumsum(correct, axis=1) - 1, 0)],
+                               self.bad_game_end_bet)
+            np.add.at(self.money, (np.broadcast_to(rows[:, None], bet_players.shape)[settled], bet_players[settled]),
+                      payouts[settled])
+        self.active[rows] = False
+
+
+def nth_true(mask, n):
+    """
+    :param mask: Two-dimensional boolean array.
+    :param n: Array with an index per row.
+    :return: The column of the n-th True entry (counting from 0) of every row.
+    """
+    return np.argmax(np.cumsum(mask, axis=1) > n[:, None], axis=1)
+
+
+def batch_rollouts(states, players):
+    """
+    Plays random moves from every state until its game ends, all games in lockstep, see RolloutBatch.
+    :param states: List of GameState objects, all with the same rules. They are not modified.
+    :param players: List with the player to move in every state.
+    :return: Array with one row per state, with a 1 for the winning player and 0 for everyone else.
+    """
+    if not states:
+        return np.zeros((0, 0))
+    return RolloutBatch(states, players).play().results()
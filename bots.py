@@ -1,10 +1,18 @@
 from playerinterface import PlayerInterface
 from camelup import get_valid_moves, display_game_state
 from actionids import GAME_BET_ACTION_ID, ROUND_BET_ACTION_ID, MOVE_TRAP_ACTION_ID, MOVE_CAMEL_ACTION_ID
+import time
 import random
 import numpy as np
 from mcts import MCTSAgent as MCTS
-from greedy import simulate_round, calculate_round_bet_ev, simulate_race, calculate_race_bet_ev, calculate_rolling_ev, simulate_round_with_traps
+from evalcache import shared_cache
+from workerpool import shared_pool
+from ponder import shared_ponderer
+from distill import load_policy
+from openingbook import book_move
+from greedy import simulate_round, calculate_round_bet_ev, simulate_race, calculate_race_bet_ev, calculate_rolling_ev, \
+    simulate_round_with_traps, trap_landing_map, lookup_race_probabilities, AnytimeDecision, RacingDecision, \
+    ponder_decision
 
 class RandomAgent(PlayerInterface):
     """
@@ -68,15 +76,68 @@ class HumanAgent(PlayerInterface):
                 print("Invalid input. Please enter a valid number.")
 
 class MCTSAgent(PlayerInterface):
-    @staticmethod
-    def move(active_player, game_state):
-        agent = MCTS()
-        return agent.get_move(active_player, game_state)
+    WORKERS = None  # Worker processes for the rollouts of a move (workerpool.shared_pool), None to stay in-process
+    OPENING_BOOK = False  # Play the first turn from the opening book (openingbook.default_book) instead of searching
+    ITERATIONS = None  # Search iterations per move, None for no limit
+    CPU_TIME = None  # CPU seconds per move, None for no limit
+    DEADLINE = None  # Wall-clock seconds per move; without any budget, mcts.MCTSAgent.DEFAULT_WALL_TIME
+    SEED = None  # Seed for deterministic search (reproducible with an ITERATIONS budget), None for the game streams
+    ROOT_PARALLEL = False  # With WORKERS, one independent search per worker with merged root statistics
+    THREADS = None  # Threads searching one shared tree (free-threaded builds only, not with BATCH), None for one
+    BATCH = None  # Leaves expanded per wave, their rollouts played in lockstep (batchrollout), None for one by one
+    WIDENING = None  # Tuple (k, alpha) for progressive widening, None to expand every action at once
+    CUTOFF = None  # Stop rollouts at the end of the round ("round") or after a number of moves and score the leaf
+    ROLLOUT_WEIGHTS = None  # Move category weights in rollouts (camelup.sample_valid_move), None for uniform
+
+    @classmethod
+    def searcher(cls):
+        """
+        :return: A new mcts.MCTSAgent with the settings of this agent.
+        """
+        return MCTS(pool=shared_pool(cls.WORKERS) if cls.WORKERS else None, iterations=cls.ITERATIONS,
+                    cpu_time=cls.CPU_TIME, wall_time=cls.DEADLINE, seed=cls.SEED, root_parallel=cls.ROOT_PARALLEL,
+                    threads=cls.THREADS, batch=cls.BATCH, rollout_weights=cls.ROLLOUT_WEIGHTS, widening=cls.WIDENING,
+                    cutoff=cls.CUTOFF)
+
+    @classmethod
+    def move(cls, active_player, game_state):
+        move = book_move(game_state, active_player) if cls.OPENING_BOOK else None
+        if move is not None:
+            return move
+        return cls.searcher().get_move(active_player, game_state)
+
+class PersistentMCTSAgent(MCTSAgent):
+    """
+    MCTSAgent that keeps its search tree from turn to turn. Pass one instance per seat to camelup.play_game() with
+    notify_players=True, e.g. play_game([PersistentMCTSAgent(), GreedyAgent], notify_players=True): the root follows
+    the actions actually played, dice outcomes included, and every turn continues the search below it instead of
+    starting from an empty tree. Without notifications, every turn starts a new tree.
+    """
+    def __init__(self):
+        self.search = None
+
+    def on_game_start(self, player, game_state):
+        self.search = self.searcher()
+
+    def observe_action(self, player, active_player, action, game_state):
+        if self.search is not None:
+            self.search.advance(action, game_state)
+
+    def on_game_end(self, player, game_state):
+        self.search = None
+
+    def move(self, active_player, game_state):
+        move = book_move(game_state, active_player) if self.OPENING_BOOK else None
+        if move is not None:
+            return move
+        if self.search is None:
+            self.on_game_start(active_player, game_state)
+        return self.search.get_move(active_player, game_state)
     
 class RoundBetAgent(PlayerInterface):
     @staticmethod
     def move(active_player, game_state):
-        probabilities = simulate_round(game_state, active_player)
+        probabilities = simulate_round(game_state, active_player, cache=shared_cache())
         
         valid_moves = get_valid_moves(game_state, active_player)
         round_bets = [move for move in valid_moves if move[0] == ROUND_BET_ACTION_ID]
@@ -104,12 +165,13 @@ class TrapAgent(PlayerInterface):
         if not trap_bets:
             return (0, )
         
+        trap_map = trap_landing_map(game_state, active_player)
         best_ev = float('-inf')
         best_move = None
         for bet in trap_bets:
             trap_type = bet[1]
             trap_position = bet[2]
-            ev = simulate_round_with_traps(game_state, active_player, trap_type, trap_position)
+            ev = trap_map[(trap_type, trap_position)]["payout"]
             if ev > best_ev:
                 best_ev = ev
                 best_move = bet
@@ -119,7 +181,8 @@ class TrapAgent(PlayerInterface):
 class GameBetAgent(PlayerInterface):
     @staticmethod
     def move(active_player, game_state):
-        probabilities = simulate_race(game_state, active_player)
+        probabilities = lookup_race_probabilities(game_state) or \
+            simulate_race(game_state, active_player, cache=shared_cache())
         
         valid_moves = get_valid_moves(game_state, active_player)
         trap_bets = [move for move in valid_moves if move[0] == GAME_BET_ACTION_ID]
@@ -145,48 +208,74 @@ class RollAgent(PlayerInterface):
         return (0,)
     
 class GreedyAgent(PlayerInterface):
-    @staticmethod
-    def move(active_player, game_state):
-        probabilities_round = simulate_round(game_state, active_player)
-        probabilities_race = simulate_race(game_state, active_player)
-
-        valid_moves = get_valid_moves(game_state, active_player)
-        # np.random.shuffle(valid_moves)
-        best_ev = float('-inf')
-        best_move = None
-
-        for move in valid_moves:
-            if move[0] == ROUND_BET_ACTION_ID:
-                camel = move[1]
-                ev = calculate_round_bet_ev(game_state, probabilities_round, camel)
-                # print(f"Round Bet, Camel : {camel}, EV : {ev}")
-
-            elif move[0] == MOVE_CAMEL_ACTION_ID:
-                ev = calculate_rolling_ev()
-                # print(f"Roll, EV : {ev}")
-
-            elif move[0] == GAME_BET_ACTION_ID:
-                bet_type = move[1]  
-                camel = move[2]
-                ev = calculate_race_bet_ev(game_state, probabilities_race, camel, bet_type)
-                # print(f"Game Bet, Camel : {camel}, Bet Type : {bet_type} EV : {ev}")
-
-            elif move[0] == MOVE_TRAP_ACTION_ID:
-                trap_type = move[1]
-                trap_position = move[2]
-                ev = simulate_round_with_traps(game_state, active_player, trap_type, trap_position)
-                # print(f"Trap, Trap Type : {trap_type}, Trap Position : {trap_position} EV : {ev}")
-            
-            else:
-                continue
+    """
+    Picks the move with the highest expected value. Estimates are refined progressively (see
+    greedy.AnytimeDecision) until the per-move deadline passes, the sample budget is used up or the best move leads
+    the runner-up by SEPARATION standard errors. Use configured() to derive agents with other settings, e.g.
+    GreedyAgent.configured(DEADLINE=0.05) for quick tournaments.
+    """
+    DEADLINE = None  # Seconds per move, None for no time limit
+    SAMPLE_BUDGET = 2000  # Maximum number of sampled futures per move, None for no limit
+    SEPARATION = 3  # Stop early once the best move leads by this many standard errors, None to use the full budget
+    EXACT_TRAPS = True  # Value traps exactly (greedy.trap_landing_map) instead of from the sampled landings
+    CACHE = True  # Share camel outcome estimates with every decision on the same board (evalcache.shared_cache)
+    WORKERS = None  # Worker processes sampling futures for a move (workerpool.shared_pool), None to stay in-process
+    RACING = False  # Successive elimination (greedy.RacingDecision): dominated moves stop costing rollouts early
+    PONDER = False  # Refine the cached estimates during other players' turns (needs play_game(notify_players=True))
+    OPENING_BOOK = False  # Take the values of starting boards from the opening book (openingbook.default_book)
+
+    @classmethod
+    def decide(cls, active_player, game_state):
+        """
+        :return: A refined greedy.AnytimeDecision (greedy.RacingDecision with RACING). Its best() method gives the
+            move, its EV and the confidence in it.
+        """
+        deadline = None if cls.DEADLINE is None else time.perf_counter() + cls.DEADLINE
+        cache = shared_cache() if cls.CACHE else None
+        trap_map = trap_landing_map(game_state, active_player, cache=cache) if cls.EXACT_TRAPS else None
+        pool = shared_pool(cls.WORKERS) if cls.WORKERS else None
+        if cls.RACING:
+            decision = RacingDecision(game_state, active_player, trap_map=trap_map,
+                                      race_probabilities=lookup_race_probabilities(game_state), cache=cache, pool=pool)
+            chunk_size = 50 * (cls.WORKERS or 1)
+            return decision.run(deadline=deadline, sample_budget=cls.SAMPLE_BUDGET, confidence=cls.SEPARATION or 3,
+                                chunk_size=chunk_size, min_simulations=max(50, chunk_size))
+        decision = AnytimeDecision(game_state, active_player, trap_map=trap_map,
+                                   race_probabilities=lookup_race_probabilities(game_state), cache=cache, pool=pool)
+        # Larger chunks keep every worker busy between precision checks
+        chunk_size = 100 * (cls.WORKERS or 1)
+        return decision.run(deadline=deadline, sample_budget=cls.SAMPLE_BUDGET, separation=cls.SEPARATION,
+                            chunk_size=chunk_size, min_simulations=max(100, chunk_size))
+
+    @classmethod
+    def move(cls, active_player, game_state):
+        move = book_move(game_state, active_player) if cls.OPENING_BOOK else None
+        if move is not None:
+            return move
+        move, ev, confidence = cls.decide(active_player, game_state).best()
+        return move
+
+    @classmethod
+    def observe_action(cls, player, active_player, action, game_state):
+        if not cls.PONDER or not cls.CACHE:
+            return
+        ponderer = shared_ponderer((cls, player), ponder_decision)
+        if game_state.active_game:
+            ponderer.ponder(game_state, player, shared_cache(), cls.SAMPLE_BUDGET or 2000, exact_traps=cls.EXACT_TRAPS)
+        else:
+            ponderer.cancel()
+    
+class DistilledGreedyAgent(PlayerInterface):
+    """
+    Imitates GreedyAgent with a linear policy over cheap move features, fitted by distill.py. It runs no simulations,
+    so it is fast enough for high-volume tournaments and for rollouts inside other searchers.
+    """
+    POLICY = None  # Policy file, defaults to $CAMELUP_DISTILLED_POLICY or data/distilled_greedy.npz
 
-            # print(move, ev)
-            if ev > best_ev:
-                best_ev = ev
-                best_move = move
+    @classmethod
+    def move(cls, active_player, game_state):
+        return load_policy(cls.POLICY).choose(game_state, active_player)
 
-        return best_move if best_move is not None else (0,)
-    
 import numpy as np
 from playerinterface import PlayerInterface
 from camelup import get_valid_moves
@@ -165,6 +165,96 @@ def get_valid_moves(g, player):
     return valid_moves
 
 
+def move_slots(g):
+    """
+    Numbers every move the rules know of, valid or not, so a move can be drawn as a single integer: slot 0 is the
+    roll, then come the +1 and the -1 traps on fields 1 to BOARD_SIZE - 1, the round bets and the game winner and
+    loser bets on every camel, in the order of get_valid_moves().
+    :param g: GameState object.
+    :return: Dictionary mapping every action ID to a tuple (first_slot, num_slots).
+    """
+    num_traps = 2 * (g.BOARD_SIZE - 1)
+    return {MOVE_CAMEL_ACTION_ID: (0, 1),
+            MOVE_TRAP_ACTION_ID: (1, num_traps),
+            ROUND_BET_ACTION_ID: (1 + num_traps, g.NUM_CAMELS),
+            GAME_BET_ACTION_ID: (1 + num_traps + g.NUM_CAMELS, 2 * g.NUM_CAMELS)}
+
+
+def slot_move(g, player, slot):
+    """
+    Decodes a move slot (see move_slots()) and checks it with the rules of get_valid_moves(), looking only at the
+    fields and bets that concern this one move.
+    :param g: GameState object.
+    :param player: Player ID integer.
+    :param slot: Integer slot.
+    :return: The move tuple, or None if the move is not valid for the player.
+    """
+    if slot == 0:
+        return (MOVE_CAMEL_ACTION_ID,)
+    slot -= 1
+    num_fields = g.BOARD_SIZE - 1
+    if slot < 2 * num_fields:
+        trap_location = slot % num_fields + 1
+        if g.camel_track[trap_location] or g.trap_track[trap_location]:
+            return None
+        for neighbour in (g.trap_track[trap_location - 1], g.trap_track[trap_location + 1]):
+            if neighbour and neighbour[1] != player:
+                return None
+        return (MOVE_TRAP_ACTION_ID, 1 if slot < num_fields else -1, trap_location)
+    slot -= 2 * num_fields
+    if slot < g.NUM_CAMELS:
+        camel = g.CAMELS[slot]
+        num_bets = sum(1 for bet in g.round_bets if len(bet) > 0 and bet[0] == camel)
+        return (ROUND_BET_ACTION_ID, camel) if num_bets < len(g.FIRST_PLACE_ROUND_PAYOUT) else None
+    slot -= g.NUM_CAMELS
+    camel = g.CAMELS[slot % g.NUM_CAMELS]
+    if any(bet[0] == camel and bet[1] == player for bet in g.game_winner_bets) or \
+            any(bet[0] == camel and bet[1] == player for bet in g.game_loser_bets):
+        return None
+    return (GAME_BET_ACTION_ID, "win" if slot < g.NUM_CAMELS else "lose", camel)
+
+
+def sample_valid_move(g, player, category_weights=None):
+    """
+    Draws a random valid move without building the list of get_valid_moves(). Move slots (see move_slots()) are drawn
+    until one holds a valid move, which takes little more than one draw in most positions.
+    :param g: GameState object.
+    :param player: Player ID integer.
+    :param category_weights: Optional dictionary mapping action IDs to weights. A category of moves is then chosen
+        with these weights among the categories with at least one valid move, and a move uniformly within it, e.g.
+        equal weights for the choice of RandomAgent. By default, every valid move is equally likely.
+    :return: A move tuple as in get_valid_moves().
+    :raises ValueError: If none of the weighted categories has a valid move.
+    """
+    slots = move_slots(g)
+    if category_weights is None:
+        num_slots = sum(num_slots for _, num_slots in slots.values())
+        while True:
+            move = slot_move(g, player, int(random.random() * num_slots))
+            if move is not None:
+                return move
+
+    categories = {action_id: weight for action_id, weight in category_weights.items() if weight > 0}
+    while True:
+        if not categories:
+            raise ValueError("No valid move in the categories {}".format(list(category_weights)))
+        threshold = random.random() * sum(categories.values())
+        for action_id, weight in categories.items():
+            threshold -= weight
+            if threshold < 0:
+                break
+        first_slot, num_slots = slots[action_id]
+        for _ in range(2 * num_slots):
+            move = slot_move(g, player, first_slot + int(random.random() * num_slots))
+            if move is not None:
+                return move
+        # Many misses in a row: keep drawing from the category only if it has a valid move at all
+        if any(slot_move(g, player, slot) is not None for slot in range(first_slot, first_slot + num_slots)):
+            categories = {action_id: weight}
+        else:
+            del categories[action_id]
+
+
 def summarize_game_state(g):
     """
     This function summarizes the game state, i.e. returns the location of all camels and tracks without including the
@@ -220,16 +310,22 @@ def print_update(msg, display_updates=True):
     return None
 
 
-def play_game(players):
+def play_game(players, notify_players=False):
     """
     Play a game until a camel wins. The game loops through players and calls their move() function until a camel passes
-    the finish line.
-    :param players: A list of instances of player classes that extend PlayerInterface.
+    the finish line. Every player's on_game_start() and on_game_end() are called before the first and after the last
+    move.
+    :param players: A list of player classes that extend PlayerInterface, or of instances of them for bots that keep
+        state between turns.
+    :param notify_players: If True, every player's observe_action() is called after each applied action, so bots can
+        follow the game and prepare for their next turn while the others move. Off by default, since every call gets
+        its own copy of the game state; players that keep the default observe_action() are skipped either way.
     :return:
     """
 
     # Check that player instances are valid objects
-    if not all([issubclass(player, PlayerInterface) for player in players]):
+    if not all([isinstance(player, PlayerInterface) or
+                (isinstance(player, type) and issubclass(player, PlayerInterface)) for player in players]):
         raise ValueError("All players must extend PlayerInterface")
 
     def action(result, player):
@@ -277,12 +373,20 @@ def play_game(players):
     # player_n_gold, camel_1_location, ..., camel_m_location, trap_1_location, ..., trap_j_location
 
     action_log = [{"round_id": g_round, **summarize_game_state(g)}]
+    # Only bots that override observe_action() get a copy of the game state after every action
+    observers = [player for player, bot in enumerate(players)
+                 if bot.observe_action is not PlayerInterface.observe_action]
+    for player, bot in enumerate(players):
+        bot.on_game_start(player, g.get_player_copy(player))
     while g.active_game:
         active_player = (g_round % len(players))
         player_action = players[active_player].move(active_player, g.get_player_copy(active_player))
         if player_action not in get_valid_moves(g=g, player=active_player):
             raise IllegalMoveException("Player {} made an illegal move".format(active_player))
         action_summary = action(result=player_action, player=active_player)
+        if notify_players:
+            for player in observers:
+                players[player].observe_action(player, active_player, player_action, g.get_player_copy(player))
         g_round += 1
         display_game_state(g)
         action_log.append({
@@ -291,20 +395,25 @@ def play_game(players):
             **action_summary,
             **summarize_game_state(g)})
 
+    for player, bot in enumerate(players):
+        bot.on_game_end(player, g.get_player_copy(player))
     # print_update("{}".format(str(g.player_money_values)[1:-1]), display_updates=True)
     return action_log, g
 
 
-def move_camel(g, player):
+def move_camel(g, player, camel_index=None, roll=None):
     """
     Selects a random camel and moves it according to the roll_dice() function. This function adheres to rules
     regarding camel stacking and behavior at traps.
     :param g: GameState object.
     :param player: Player ID integer.
+    :param camel_index: Optional index of the camel to move instead of a random one. It must not have moved yet.
+    :param roll: Optional dice roll to use instead of a random one.
     :return:
     """
     # Select a random camel to move
-    camel_index = random.choice([i for i in range(g.NUM_CAMELS) if g.camel_yet_to_move[i]])
+    if camel_index is None:
+        camel_index = random.choice([i for i in range(g.NUM_CAMELS) if g.camel_yet_to_move[i]])
 
     # Remove camel from pool
     g.camel_yet_to_move[camel_index] = False
@@ -315,7 +424,7 @@ def move_camel(g, player):
         if i == g.CAMELS[camel_index]][0]
 
     # Roll the dice
-    distance = roll_dice(g.MOVE_RANGE)
+    distance = roll_dice(g.MOVE_RANGE) if roll is None else roll
 
     # Check if camel hits a trap
     stack_from_bottom = False
@@ -372,7 +481,7 @@ def move_trap(g, trap_type, trap_place, player):
     """
     # TODO: Remove dummy_track and validity checks here and integrate the corresponding unit tests into ValidMovesTest.
     # Create a temporary dummy track
-    dummy_track = copy.deepcopy(g.trap_track)
+    dummy_track = list(g.trap_track)  # Entries are replaced, never changed in place, so a shallow copy will do
 
     # Check if player has places the trap and remove it if so
     remove_old_trap = False
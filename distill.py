@@ -0,0 +1,395 @@
+import os
+import sys
+import random
+import multiprocessing
+import numpy as np
+import tqdm
+import camelup
+from camelup import get_valid_moves
+from actionids import MOVE_CAMEL_ACTION_ID, MOVE_TRAP_ACTION_ID, ROUND_BET_ACTION_ID, GAME_BET_ACTION_ID
+
+POLICY_ENV_VAR = "CAMELUP_DISTILLED_POLICY"
+DEFAULT_POLICY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "distilled_greedy.npz")
+
+NUM_PLACES = 5
+# Facts about the camel a bet is on, each interacted with the camel's place: constant, payout, whether it has moved
+# this round, share of camels yet to move, and one-hot distances (0 to MAX_GAP) to the camels ahead and behind
+MAX_GAP = 3
+CAMEL_FACTS = 4 + 2 * (MAX_GAP + 1)
+# Bets also get a one-hot of the ticket they would take (the last column standing for every later bet) crossed with
+# the place of the camel, once plain and once scaled by how much of the round (round bets) or race (game bets) is left
+ROUND_TICKETS = 4
+GAME_TICKETS = 4
+# Trap moves get, for each of the MOVE_REACH fields behind the trap, the place of the camel on top of the field,
+# once plain and once signed by the trap type, and whether the player holds a round bet on that camel (signed)
+MOVE_REACH = 3
+# Feature blocks: rolling, trap moves, round bets, game bets
+ROLL_FEATURES = 4
+TRAP_FEATURES = 8 + MOVE_REACH * (2 * NUM_PLACES + 1)
+ROUND_BET_FEATURES = 1 + CAMEL_FACTS * NUM_PLACES + 2 * ROUND_TICKETS * NUM_PLACES
+GAME_BET_FEATURES = 2 + (CAMEL_FACTS + 1) * NUM_PLACES + 2 * GAME_TICKETS * NUM_PLACES
+NUM_FEATURES = ROLL_FEATURES + TRAP_FEATURES + ROUND_BET_FEATURES + GAME_BET_FEATURES
+
+
+def board_summary(game_state):
+    """
+    Cheap facts about the camels that all action features share.
+    :param game_state: The current game state.
+    :return: A dictionary with the field and place (0 for the leader) of every camel, the distances to the camels
+        directly ahead and behind (0 within a stack), the number of camels and the top camel on every field, the
+        leader's field and the share of camels that have yet to move this round.
+    """
+    field_of = {}
+    ranking = []
+    stack_sizes = [len(stack) for stack in game_state.camel_track]
+    top = [stack[-1] if stack else None for stack in game_state.camel_track]
+    for field in range(len(game_state.camel_track) - 1, -1, -1):
+        for camel in reversed(game_state.camel_track[field]):
+            field_of[camel] = field
+            ranking.append(camel)
+    fields = [field_of[camel] for camel in ranking]
+    return {
+        "field": field_of,
+        "place": {camel: place for place, camel in enumerate(ranking)},
+        "gap_ahead": {camel: fields[place - 1] - fields[place] if place > 0 else 0
+                      for place, camel in enumerate(ranking)},
+        "gap_behind": {camel: fields[place] - fields[place + 1] if place + 1 < len(ranking) else 0
+                       for place, camel in enumerate(ranking)},
+        "stack_sizes": stack_sizes,
+        "top": top,
+        "leader_field": fields[0],
+        "yet_to_move": sum(game_state.camel_yet_to_move) / len(game_state.camel_yet_to_move)
+    }
+
+
+def camel_facts(game_state, camel, place, payout, summary):
+    """
+    :param game_state: The current game state.
+    :param camel: Camel name.
+    :param place: Place of the camel (0 for the leader; counted from the back for game loser bets).
+    :param payout: What the bet pays if it wins.
+    :param summary: Result of board_summary().
+    :return: Vector of length CAMEL_FACTS * NUM_PLACES, the facts about the camel in the block of its place.
+    """
+    facts = np.zeros((NUM_PLACES, CAMEL_FACTS))
+    row = facts[min(place, NUM_PLACES - 1)]
+    row[:4] = (1, payout, not game_state.camel_yet_to_move[int(camel[2:])], summary["yet_to_move"])
+    row[4 + min(summary["gap_ahead"][camel], MAX_GAP)] = 1
+    row[5 + MAX_GAP + min(summary["gap_behind"][camel], MAX_GAP)] = 1
+    return facts.ravel()
+
+
+def ticket_places(ticket, num_tickets, place, scale):
+    """
+    :param ticket: Number of bets already placed on the camel; num_tickets - 1 or more share the last column.
+    :param num_tickets: Number of ticket columns.
+    :param place: Place of the camel (0 for the leader).
+    :param scale: Share of the round or race that is left.
+    :return: Vector of length 2 * num_tickets * NUM_PLACES: the one-hot of (ticket, place), plain and scaled.
+    """
+    crossed = np.zeros((num_tickets, NUM_PLACES))
+    crossed[min(ticket, num_tickets - 1), min(place, NUM_PLACES - 1)] = 1
+    return np.concatenate([crossed.ravel(), scale * crossed.ravel()])
+
+
+def action_features(game_state, player, move, summary):
+    """
+    Describes one move by a fixed-length feature vector. Every move type fills its own block, so a linear model can
+    learn a separate value function per move type.
+    :param game_state: The current game state.
+    :param player: The player to move.
+    :param move: The move tuple.
+    :param summary: Result of board_summary().
+    :return: Feature vector of length NUM_FEATURES.
+    """
+    features = np.zeros(NUM_FEATURES)
+    progress = summary["leader_field"] / game_state.BOARD_SIZE
+    if move[0] == MOVE_CAMEL_ACTION_ID:
+        num_round_bets = len(game_state.round_bets)
+        features[0:ROLL_FEATURES] = (1, summary["yet_to_move"], progress, num_round_bets)
+
+    elif move[0] == MOVE_TRAP_ACTION_ID:
+        _, trap_type, position = move
+        offset = ROLL_FEATURES
+        # Camels one to three fields behind the trap can land on it with the next roll
+        behind = [summary["stack_sizes"][position - d] if position - d >= 0 else 0 for d in (1, 2, 3)]
+        current = [field for field, trap in enumerate(game_state.trap_track) if trap and trap[1] == player]
+        given_up = 0
+        if current:
+            given_up = sum(summary["stack_sizes"][current[0] - d] for d in (1, 2, 3) if current[0] - d >= 0)
+        features[offset:offset + 8] = (
+            1, trap_type, *behind, (position - summary["leader_field"]) / game_state.MOVE_RANGE[1], given_up,
+            summary["yet_to_move"] * sum(behind))
+        own_bets = {bet[0] for bet in game_state.round_bets if bet[1] == player}
+        for d in range(1, MOVE_REACH + 1):
+            camel = summary["top"][position - d] if position - d >= 0 else None
+            if camel is None:
+                continue
+            block = offset + 8 + (d - 1) * (2 * NUM_PLACES + 1)
+            place = min(summary["place"][camel], NUM_PLACES - 1)
+            features[block + place] = 1
+            features[block + NUM_PLACES + place] = trap_type
+            features[block + 2 * NUM_PLACES] = trap_type * (camel in own_bets)
+
+    elif move[0] == ROUND_BET_ACTION_ID:
+        camel = move[1]
+        offset = ROLL_FEATURES + TRAP_FEATURES
+        num_bets = len([bet for bet in game_state.round_bets if bet[0] == camel])
+        payout = game_state.FIRST_PLACE_ROUND_PAYOUT[num_bets] if num_bets < len(
+            game_state.FIRST_PLACE_ROUND_PAYOUT) else 0
+        features[offset] = 1
+        facts_end = offset + 1 + CAMEL_FACTS * NUM_PLACES
+        features[offset + 1:facts_end] = camel_facts(game_state, camel, summary["place"][camel], payout, summary)
+        features[facts_end:offset + ROUND_BET_FEATURES] = ticket_places(
+            num_bets, ROUND_TICKETS, summary["place"][camel], summary["yet_to_move"])
+
+    elif move[0] == GAME_BET_ACTION_ID:
+        _, bet_type, camel = move
+        offset = ROLL_FEATURES + TRAP_FEATURES + ROUND_BET_FEATURES
+        bets = game_state.game_winner_bets if bet_type == "win" else game_state.game_loser_bets
+        num_bets = len([bet for bet in bets if bet[0] == camel])
+        payout = game_state.GAME_END_PAYOUT[min(num_bets, len(game_state.GAME_END_PAYOUT) - 1)]
+        place = summary["place"][camel]
+        if bet_type == "lose":
+            place = len(summary["place"]) - 1 - place
+        features[offset:offset + 2] = (bet_type == "win", bet_type == "lose")
+        blocks = offset + 2 + CAMEL_FACTS * NUM_PLACES
+        features[offset + 2:blocks] = camel_facts(game_state, camel, place, payout, summary)
+        features[blocks + min(place, NUM_PLACES - 1)] = progress
+        features[blocks + NUM_PLACES:offset + GAME_BET_FEATURES] = ticket_places(
+            num_bets, GAME_TICKETS, place, 1 - progress)
+    return features
+
+
+def state_features(game_state, player, moves=None):
+    """
+    :param game_state: The current game state.
+    :param player: The player to move.
+    :param moves: List of moves. Defaults to every valid move.
+    :return: A tuple (moves, features) with the feature matrix (moves x NUM_FEATURES).
+    """
+    moves = moves if moves is not None else get_valid_moves(game_state, player)
+    summary = board_summary(game_state)
+    return moves, np.array([action_features(game_state, player, move, summary) for move in moves])
+
+
+class DistilledPolicy:
+    """
+    A linear model of an expensive agent's move values over move features (see fit_policy()). Choosing a move only
+    needs the features of the valid moves and one dot product.
+    """
+    def __init__(self, weights, mean, scale):
+        """
+        :param weights: Weight vector of length NUM_FEATURES.
+        :param mean: Feature means used for standardization.
+        :param scale: Feature standard deviations used for standardization.
+        """
+        self.weights = weights
+        self.mean = mean
+        self.scale = scale
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: Path of a file written by save().
+        :return: A DistilledPolicy.
+        """
+        with np.load(path) as data:
+            if data["weights"].shape != (NUM_FEATURES,):
+                raise ValueError("{} was fitted for different features".format(path))
+            return cls(data["weights"], data["mean"], data["scale"])
+
+    def save(self, path):
+        """
+        :param path: Output file path (.npz).
+        """
+        np.savez(path, weights=self.weights, mean=self.mean, scale=self.scale)
+
+    def scores(self, features):
+        """
+        :param features: Feature matrix (moves x NUM_FEATURES).
+        :return: Predicted value of every move.
+        """
+        return ((features - self.mean) / self.scale) @ self.weights
+
+    def choose(self, game_state, player):
+        """
+        :param game_state: The current game state.
+        :param player: The player to move.
+        :return: The move with the highest predicted value.
+        """
+        moves, features = state_features(game_state, player)
+        return moves[int(np.argmax(self.scores(features)))]
+
+
+_policies = {}
+
+
+def load_policy(path=None):
+    """
+    Loads a policy once per process.
+    :param path: Policy file path. Defaults to the CAMELUP_DISTILLED_POLICY environment variable, or the policy
+        shipped in data/distilled_greedy.npz.
+    :return: A DistilledPolicy.
+    """
+    path = path or os.environ.get(POLICY_ENV_VAR) or DEFAULT_POLICY_PATH
+    if path not in _policies:
+        _policies[path] = DistilledPolicy.load(path)
+    return _policies[path]
+
+
+def fit_policy(examples, l2=1.0):
+    """
+    Fits a DistilledPolicy by ridge regression of the teacher's value of every move on the move features. Every move
+    of a state is a training row, so a state teaches the ranking of all its moves, not only which one is best.
+    :param examples: List of (features, values) tuples, where features is a state's feature matrix and values the
+        teacher's value of every move in it.
+    :param l2: L2 regularization strength, per training row.
+    :return: A DistilledPolicy.
+    """
+    stacked = np.concatenate([features for features, _ in examples])
+    values = np.concatenate([values for _, values in examples])
+    mean = stacked.mean(axis=0)
+    scale = stacked.std(axis=0)
+    scale[scale == 0] = 1
+    standardized = (stacked - mean) / scale
+    gram = standardized.T @ standardized + l2 * np.eye(NUM_FEATURES)
+    weights = np.linalg.solve(gram, standardized.T @ (values - values.mean()))
+    return DistilledPolicy(weights, mean, scale)
+
+
+def agreement(policy, examples):
+    """
+    :param policy: DistilledPolicy.
+    :param examples: List of (features, values) tuples, see fit_policy().
+    :return: Share of states in which the policy picks the teacher's move.
+    """
+    return float(np.mean([np.argmax(policy.scores(features)) == np.argmax(values) for features, values in examples]))
+
+
+def regret(policy, examples):
+    """
+    :param policy: DistilledPolicy.
+    :param examples: List of (features, values) tuples, see fit_policy().
+    :return: Average value, by the teacher's estimate, lost by playing the policy's move instead of the teacher's.
+    """
+    return float(np.mean([values.max() - values[np.argmax(policy.scores(features))]
+                          for features, values in examples]))
+
+
+def collect_states(num_games, players=None):
+    """
+    Collects the decision points of simulated games.
+    :param num_games: Number of games to simulate.
+    :param players: List of bot classes. Defaults to four bots.RandomAgent players.
+    :return: List of (game_state, player) tuples, the state as seen by the player to move.
+    """
+    import bots
+    players = players if players is not None else [bots.RandomAgent] * 4
+    states = []
+    for _ in tqdm.tqdm(range(num_games), desc="Collecting states"):
+        g = camelup.GameState(num_players=len(players))
+        active_player = 0
+        while g.active_game:
+            states.append((g.get_player_copy(active_player), active_player))
+            action = players[active_player].move(active_player, g.get_player_copy(active_player))
+            apply_action(g, active_player, action)
+            active_player = (active_player + 1) % len(players)
+    return states
+
+
+def apply_action(g, player, action):
+    """
+    Applies a move to a GameState in place.
+    :param g: GameState object.
+    :param player: Player ID integer.
+    :param action: The move tuple.
+    """
+    if action[0] == MOVE_CAMEL_ACTION_ID:
+        camelup.move_camel(g, player)
+    elif action[0] == MOVE_TRAP_ACTION_ID:
+        camelup.move_trap(g, action[1], action[2], player)
+    elif action[0] == ROUND_BET_ACTION_ID:
+        camelup.place_round_winner_bet(g, action[1], player)
+    else:
+        camelup.place_game_bet(g, action[2], action[1], player)
+
+
+def _label(args):
+    game_state, player, seed = args
+    import bots
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)
+    teacher = bots.GreedyAgent.configured(CACHE=False, SEPARATION=None)
+    return {move: ev for move, (ev, _) in teacher.decide(player, game_state).values().items()}
+
+
+def label_states(states, processes=None, seed=0):
+    """
+    Labels every state with the value bots.GreedyAgent gives each of its moves, in parallel. The teacher uses its
+    full sample budget, so moves it would rule out early still get a precise value.
+    :param states: List of (game_state, player) tuples, see collect_states().
+    :param processes: Number of worker processes (defaults to the number of CPUs).
+    :param seed: Base seed; every state gets its own random stream derived from it.
+    :return: List of dictionaries mapping every valid move to the teacher's value of it.
+    """
+    seeds = np.random.SeedSequence(seed).generate_state(len(states))
+    tasks = [(game_state, player, int(s)) for (game_state, player), s in zip(states, seeds)]
+    with multiprocessing.Pool(processes) as pool:
+        return list(tqdm.tqdm(pool.imap(_label, tasks, chunksize=4), total=len(tasks), desc="Labelling states"))
+
+
+def training_examples(states, labels):
+    """
+    :param states: List of (game_state, player) tuples, see collect_states().
+    :param labels: List of the teacher's move values, see label_states().
+    :return: List of (features, values) tuples, see fit_policy().
+    """
+    examples = []
+    for (game_state, player), values in zip(states, labels):
+        moves, features = state_features(game_state, player)
+        examples.append((features, np.array([values[move] for move in moves])))
+    return examples
+
+
+def win_rate(agent, opponent, num_games):
+    """
+    Plays two-player games with alternating seats.
+    :param agent: Bot class to evaluate.
+    :param opponent: Opponent bot class.
+    :param num_games: Number of games.
+    :return: The agent's share of wins, ties counting half.
+    """
+    score = 0
+    for game in range(num_games):
+        seat = game % 2
+        players = [agent, opponent] if seat == 0 else [opponent, agent]
+        _, final_state = camelup.play_game(players)
+        coins = final_state.player_money_values
+        if coins[seat] > coins[1 - seat]:
+            score += 1
+        elif coins[seat] == coins[1 - seat]:
+            score += 0.5
+    return score / num_games
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python {} <OUTPUT_FILE> <NUM_GAMES> [NUM_EVALUATION_GAMES]".format(sys.argv[0]))
+        exit(0)
+
+    states = collect_states(int(sys.argv[2]))
+    examples = training_examples(states, label_states(states))
+    random.shuffle(examples)
+    split = int(0.8 * len(examples))
+    policy = fit_policy(examples[:split])
+    policy.save(sys.argv[1])
+    print("Agreement with GreedyAgent: {:.1%} on {} training and {:.1%} on {} held-out states".format(
+        agreement(policy, examples[:split]), split, agreement(policy, examples[split:]), len(examples) - split))
+    print("Coins lost per move by GreedyAgent's estimate: {:.3f} on training and {:.3f} on held-out states".format(
+        regret(policy, examples[:split]), regret(policy, examples[split:])))
+
+    if len(sys.argv) > 3:
+        import bots
+        agent = bots.DistilledGreedyAgent.configured(POLICY=sys.argv[1])
+        print("Win rate against GreedyAgent: {:.1%}".format(win_rate(agent, bots.GreedyAgent, int(sys.argv[3]))))
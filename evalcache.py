@@ -0,0 +1,262 @@
+import os
+import time
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+
+EVAL_CACHE_ENV_VAR = "CAMELUP_EVAL_CACHE"
+# Version of the stored evaluations. Increase it whenever an estimator changes what it computes for the same key, so
+# that entries written by older code are dropped instead of being used.
+CACHE_VERSION = 1
+
+
+class DiskCache:
+    """
+    A persistent key-value store of evaluations in an SQLite database, shared by all processes and runs that open the
+    same file. The database runs in write-ahead-log mode, so reads in one process do not wait for writes in another,
+    and concurrent writers wait for each other (up to timeout) instead of failing. Within a process, all threads share
+    one connection and take turns on it. Values are pickled; keys are stored as their repr(), which is stable for the
+    tuples of numbers, strings and None that Board.key() and the estimators build.
+
+    Reads do not write: the last-use times of the entries read are collected in memory and written in one transaction
+    every TOUCH_BATCH reads, with the next write, and on close(). Between those updates, eviction works from slightly
+    stale last-use times.
+
+    The file is versioned with CACHE_VERSION: opening a file written by another version empties it. Rule settings
+    that change camel movement (board size, dice range) are part of every Board.key(), and estimator settings are part
+    of the keys built by the estimators, so entries of other configurations are never returned either. When the file
+    holds more than max_entries evaluations, the least recently used ones are deleted.
+    """
+    TOUCH_BATCH = 100
+
+    def __init__(self, path, max_entries=100000, version=CACHE_VERSION, timeout=30):
+        """
+        :param path: Path of the database file, created if it does not exist.
+        :param max_entries: Maximum number of stored evaluations.
+        :param version: Version of the stored evaluations.
+        :param timeout: Number of seconds to wait for a lock held by another process.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.version = version
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.connection = None
+        self.pid = None
+        self.puts = 0
+        self.touched = {}
+        with self.lock:
+            self._connect()
+
+    def _connect(self):
+        # SQLite connections must not be shared with forked children, so every process opens its own
+        if self.connection is not None and self.pid == os.getpid():
+            return self.connection
+        self.connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                          check_same_thread=False)
+        self.pid = os.getpid()
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS entries "
+                                    "(key TEXT PRIMARY KEY, value BLOB, last_used REAL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+            row = self.connection.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+            if row is None or row[0] != str(self.version):
+                self.connection.execute("DELETE FROM entries")
+                self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(self.version),))
+        return self.connection
+
+    def __len__(self):
+        with self.lock:
+            return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def get(self, key):
+        """
+        :param key: Key built from numbers, strings, None and tuples.
+        :return: The stored value or None.
+        """
+        with self.lock:
+            connection = self._connect()
+            row = connection.execute("SELECT value FROM entries WHERE key = ?", (repr(key),)).fetchone()
+            if row is None:
+                return None
+            self.touched[repr(key)] = time.time()
+            if len(self.touched) >= self.TOUCH_BATCH:
+                with connection:
+                    connection.execute("BEGIN IMMEDIATE")
+                    self._write_touched(connection)
+        return pickle.loads(row[0])
+
+    def put(self, key, value):
+        """
+        Stores a value, replacing any value stored for the key before.
+        :param key: Key built from numbers, strings, None and tuples.
+        :param value: Picklable value.
+        """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                self._write_touched(connection)
+                connection.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (repr(key), data, time.time()))
+                # Counting the entries takes a scan, so the size limit is only enforced every few writes
+                self.puts += 1
+                if self.puts % 100 == 0 or self.max_entries < 100:
+                    self._evict(connection)
+
+    def _write_touched(self, connection):
+        if self.touched:
+            connection.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                   [(last_used, key) for key, last_used in self.touched.items()])
+            self.touched.clear()
+
+    def _evict(self, connection):
+        excess = connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+        if excess > 0:
+            connection.execute("DELETE FROM entries WHERE key IN "
+                               "(SELECT key FROM entries ORDER BY last_used LIMIT ?)", (excess,))
+
+    def clear(self):
+        with self.lock:
+            self.touched.clear()
+            self._connect().execute("DELETE FROM entries")
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None and self.pid == os.getpid():
+                with self.connection:
+                    self.connection.execute("BEGIN IMMEDIATE")
+                    self._write_touched(self.connection)
+                self.connection.close()
+            self.connection = None
+            self.touched.clear()
+
+
+class EvaluationCache:
+    """
+    A thread-safe, size-limited cache of camel outcome evaluations. Keys are built from fastboard.Board.key(), i.e.
+    only from the camels, the traps and which camels have yet to move. Bets and coins never change where camels end
+    up, so one evaluation serves every seat, turn and game that reaches the same board, and an entry only goes stale
+    when the board itself changes (which produces a different key). The least recently used entries are evicted first.
+
+    With a DiskCache as store, evaluations missing in memory are looked up on disk, and new ones are written through,
+    so later runs and other processes start warm. Disk lookups and writes run outside the lock, so threads hitting
+    the memory tier never wait for SQLite or pickle.
+    """
+    def __init__(self, max_entries=4096, store=None):
+        """
+        :param max_entries: Maximum number of cached evaluations.
+        :param store: Optional DiskCache used as a second, persistent tier.
+        """
+        self.max_entries = max_entries
+        self.store = store
+        self.entries = OrderedDict()
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """
+        :param key: Hashable key.
+        :return: The cached value or None.
+        """
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return value
+            if self.store is None:
+                self.misses += 1
+                return None
+        value = self.store.get(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # Another thread may have loaded or created the entry meanwhile; the first stored value wins
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            self._remember(key, value)
+            return value
+
+    def put(self, key, value):
+        """
+        :param key: Hashable key.
+        :param value: Value to cache.
+        """
+        with self.lock:
+            self._remember(key, value)
+        if self.store is not None:
+            self.store.put(key, value)
+
+    def persist(self, key):
+        """
+        Writes the current value of an entry to the store again. Values that are refined in place, like the
+        DecisionEstimate of a board, call this once they have grown. The lock is held while the value is written, since
+        refinements merge into it under the same lock.
+        :param key: Hashable key.
+        """
+        with self.lock:
+            if self.store is not None and key in self.entries:
+                self.store.put(key, self.entries[key])
+
+    def _remember(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get_or_create(self, key, factory):
+        """
+        :param key: Hashable key.
+        :param factory: Callable creating the value if it is not cached yet. It runs without holding the lock, so
+            other threads are not blocked by a slow evaluation; if two threads race, the first stored value wins.
+        :return: The cached or newly created value.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = factory()
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            self._remember(key, value)
+        if self.store is not None:
+            self.store.put(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def shared_cache():
+    """
+    The process-wide EvaluationCache shared by all agents, created on first use. If the CAMELUP_EVAL_CACHE
+    environment variable names a file, the cache is backed by a DiskCache in that file.
+    :return: An EvaluationCache.
+    """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            path = os.environ.get(EVAL_CACHE_ENV_VAR)
+            _shared_cache = EvaluationCache(store=DiskCache(path) if path else None)
+        return _shared_cache
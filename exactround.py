@@ -0,0 +1,207 @@
+import itertools
+import functools
+import numpy as np
+
+
+class RoundOutcome:
+    """
+    The exact distribution of the rest of the current round, as computed by enumerate_round().
+    """
+    def __init__(self, rank_probabilities, landings):
+        """
+        :param rank_probabilities: Matrix where entry [camel, place - 1] is the probability of that camel finishing
+            the round in that place.
+        :param landings: Vector with the expected number of camels landing (before traps are applied) on every field.
+        """
+        self.rank_probabilities = rank_probabilities
+        self.landings = landings
+
+    def place_probability(self, camel, place):
+        """
+        :param camel: Camel index.
+        :param place: Place to evaluate (1 for first, 2 for second, etc.).
+        :return: Probability of the camel being in that place at the end of the round.
+        """
+        return self.rank_probabilities[camel, place - 1]
+
+
+@functools.lru_cache(maxsize=64)
+def round_sequences(remaining, move_range):
+    """
+    Lists every way the rest of a round can play out: each order of the remaining camels combined with each sequence
+    of dice rolls. All sequences are equally likely.
+    :param remaining: Tuple of indices of the camels that have yet to move.
+    :param move_range: Tuple with the minimum and maximum dice roll (inclusive).
+    :return: A tuple (orders, rolls) of integer arrays with one row per sequence and one column per move.
+    """
+    orders = np.array(list(itertools.permutations(remaining)), dtype=np.int8).reshape(-1, len(remaining))
+    faces = range(move_range[0], move_range[1] + 1)
+    rolls = np.array(list(itertools.product(faces, repeat=len(remaining))), dtype=np.int8).reshape(
+        -1, len(remaining))
+    orders = np.repeat(orders, len(rolls), axis=0)
+    rolls = np.tile(rolls, (len(orders) // len(rolls), 1))
+    return orders, rolls
+
+
+def board_arrays(board, num_camels):
+    """
+    Converts a Board into per-camel field and stack height vectors.
+    :param board: fastboard.Board object.
+    :param num_camels: Number of camels.
+    :return: A tuple (fields, heights) of integer arrays.
+    """
+    fields = np.zeros(num_camels, dtype=np.int8)
+    heights = np.zeros(num_camels, dtype=np.int8)
+    for field, stack in board.stacks.items():
+        for height, camel in enumerate(stack):
+            fields[camel] = field
+            heights[camel] = height
+    return fields, heights
+
+
+def play_moves(fields, heights, active, camel, distance, trap_types, board_size):
+    """
+    Applies one camel move to many boards at once, following the rules of camelup.move_camel().
+    :param fields: Integer array (boards x camels) of camel fields, modified in place.
+    :param heights: Integer array (boards x camels) of camel stack heights, modified in place.
+    :param active: Boolean array (boards) marking boards whose game is still running, modified in place. Inactive
+        boards are left untouched.
+    :param camel: Integer array (boards) with the camel to move on each board.
+    :param distance: Integer array (boards) with the dice roll on each board.
+    :param trap_types: Callable mapping an array of landing fields to an array of trap types (0 for no trap).
+    :param board_size: Integer, the field at which the finish line is crossed.
+    :return: Integer array (boards) with the field each roll pointed at before traps were applied.
+    """
+    rows = np.arange(len(camel))
+    start = fields[rows, camel]
+    start_height = heights[rows, camel]
+    landing = start + distance
+    trap = trap_types(landing)
+    target = landing + trap
+
+    moving = (fields == start[:, None]) & (heights >= start_height[:, None]) & active[:, None]
+    at_target = (fields == target[:, None]) & ~moving & active[:, None]
+    underneath = (trap == -1)[:, None]
+    group_size = moving.sum(axis=1)[:, None]
+    target_size = at_target.sum(axis=1)[:, None]
+
+    new_heights = heights - start_height[:, None] + np.where(underneath, 0, target_size)
+    heights[:] = np.where(moving, new_heights, np.where(at_target & underneath, heights + group_size, heights))
+    fields[:] = np.where(moving, target[:, None], fields)
+    active &= ~(target >= board_size)
+    return landing
+
+
+def final_places(fields, heights):
+    """
+    :param fields: Integer array (boards x camels) of camel fields.
+    :param heights: Integer array (boards x camels) of camel stack heights.
+    :return: Integer array (boards x camels) with the place of every camel, 0 being the leader.
+    """
+    score = fields.astype(np.int64) * fields.shape[1] + heights
+    return np.argsort(np.argsort(-score, axis=1), axis=1)
+
+
+def play_sequences(board, orders, rolls, trap_types):
+    """
+    Plays the rest of the round on one copy of the board per sequence.
+    :param board: fastboard.Board object. It is not modified.
+    :param orders: Integer array (sequences x moves) with the camel moved at every step.
+    :param rolls: Integer array (sequences x moves) with the dice roll at every step.
+    :param trap_types: Callable mapping the step's landing fields to trap types, see play_moves().
+    :return: A tuple (places, landings). places holds the final place of every camel on every board, landings the
+        field every roll pointed at (-1 once the game has ended).
+    """
+    num_camels = len(board.yet_to_move)
+    start_fields, start_heights = board_arrays(board, num_camels)
+    fields = np.tile(start_fields, (len(orders), 1))
+    heights = np.tile(start_heights, (len(orders), 1))
+    active = np.full(len(orders), board.active)
+    landings = np.full(orders.shape, -1, dtype=np.int64)
+    for step in range(orders.shape[1]):
+        was_active = active.copy()
+        landing = play_moves(fields, heights, active, orders[:, step], rolls[:, step], trap_types, board.board_size)
+        landings[was_active, step] = landing[was_active]
+    return final_places(fields, heights), landings
+
+
+def _group_totals(group, places, landings, num_groups, num_camels, num_fields):
+    """
+    Sums place indicators and landings of many boards per group.
+    :return: A tuple (place_counts, landing_counts) with shapes (groups x camels x camels) and (groups x fields).
+    """
+    place_counts = np.bincount(
+        (group[:, None] * num_camels * num_camels + np.arange(num_camels) * num_camels + places).ravel(),
+        minlength=num_groups * num_camels * num_camels).reshape(num_groups, num_camels, num_camels)
+    landed = landings >= 0
+    landing_counts = np.bincount(
+        (np.broadcast_to(group[:, None], landings.shape)[landed] * num_fields + landings[landed]),
+        minlength=num_groups * num_fields).reshape(num_groups, num_fields)
+    return place_counts, landing_counts
+
+
+def enumerate_round(board, trap_candidates=None):
+    """
+    Computes the exact outcome distribution of the rest of the current round by playing every possible order of the
+    remaining camels with every possible sequence of dice rolls, all boards at once.
+
+    With trap_candidates, the round is additionally evaluated once per candidate trap added to the board. A trap only
+    changes the sequences in which a camel lands on its field, so only those sequences are replayed, and a candidate
+    no camel can reach costs nothing at all.
+    :param board: fastboard.Board object. It is not modified.
+    :param trap_candidates: Optional list of (field, trap_type) tuples, each evaluated on its own.
+    :return: A RoundOutcome, or a tuple (outcome, candidate_outcomes) where candidate_outcomes is a list with one
+        RoundOutcome per candidate.
+    """
+    num_camels = len(board.yet_to_move)
+    num_fields = 2 * board.board_size
+    orders, rolls = round_sequences(tuple(board.remaining()), tuple(board.move_range))
+    num_sequences = len(orders)
+
+    trap_table = np.zeros(num_fields, dtype=np.int8)
+    for field, trap in board.traps.items():
+        trap_table[field] = trap[0]
+    places, landings = play_sequences(board, orders, rolls, lambda fields_hit: trap_table[fields_hit])
+    no_group = np.zeros(num_sequences, dtype=np.int64)
+    place_counts, landing_counts = _group_totals(no_group, places, landings, 1, num_camels, num_fields)
+    outcome = RoundOutcome(place_counts[0] / num_sequences, landing_counts[0] / num_sequences)
+    if trap_candidates is None:
+        return outcome
+
+    # Replay every sequence that lands on a candidate field, for all candidates in one batch
+    affected = [np.flatnonzero((landings == field).any(axis=1)) for field, _ in trap_candidates]
+    group = np.concatenate([np.full(len(rows), i, dtype=np.int64) for i, rows in enumerate(affected)])
+    rows = np.concatenate(affected).astype(np.int64)
+    candidate_table = np.tile(trap_table, (len(trap_candidates), 1))
+    for i, (field, trap_type) in enumerate(trap_candidates):
+        candidate_table[i, field] = trap_type
+    new_places, new_landings = play_sequences(
+        board, orders[rows], rolls[rows], lambda fields_hit: candidate_table[group, fields_hit])
+
+    old_place_counts, old_landing_counts = _group_totals(
+        group, places[rows], landings[rows], len(trap_candidates), num_camels, num_fields)
+    new_place_counts, new_landing_counts = _group_totals(
+        group, new_places, new_landings, len(trap_candidates), num_camels, num_fields)
+    candidate_place_counts = place_counts - old_place_counts + new_place_counts
+    candidate_landing_counts = landing_counts - old_landing_counts + new_landing_counts
+    candidate_outcomes = [
+        RoundOutcome(candidate_place_counts[i] / num_sequences, candidate_landing_counts[i] / num_sequences)
+        for i in range(len(trap_candidates))]
+    return outcome, candidate_outcomes
+
+
+def reachable_fields(board):
+    """
+    Lists the fields a camel could possibly land on during the rest of the current round. A roll always starts behind
+    the leading camel's reach and ahead of the last camel, and every move can push a stack forward by at most the
+    highest roll plus one (for a +1 trap), which bounds how far ahead a roll can point.
+    :param board: fastboard.Board object.
+    :return: Set of fields.
+    """
+    num_moves = len(board.remaining())
+    if not board.active or not board.stacks:
+        return set()
+    max_roll = board.move_range[1]
+    first = min(board.stacks) + board.move_range[0]
+    last = max(board.stacks) + (max_roll + 1) * (num_moves - 1) + max_roll
+    return set(range(first, last + 1))
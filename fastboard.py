@@ -0,0 +1,274 @@
+import random
+import itertools
+
+
+class Board:
+    """
+    A compact copy of the parts of a GameState that decide where camels end up: the camel stacks, the traps and which
+    camels have yet to move this round. Bets and coins are left out on purpose because they never influence camel
+    movement, which makes a Board cheap to copy and safe to share between players.
+
+    Camels are referred to by their index in GameState.CAMELS. Moves follow the same rules as camelup.move_camel().
+    """
+    __slots__ = ("stacks", "where", "traps", "yet_to_move", "board_size", "move_range", "active")
+
+    def __init__(self, stacks, traps, yet_to_move, board_size, move_range, active=True):
+        """
+        :param stacks: Dictionary mapping a field to the list of camel indices on it (bottom-most camel first).
+        :param traps: Dictionary mapping a field to a tuple (trap_type, player).
+        :param yet_to_move: List of booleans, one per camel.
+        :param board_size: Integer, the field at which the finish line is crossed.
+        :param move_range: Tuple with the minimum and maximum dice roll (inclusive).
+        :param active: Boolean, whether the game is still running.
+        """
+        self.stacks = stacks
+        self.where = {}
+        for field, stack in stacks.items():
+            for camel in stack:
+                self.where[camel] = field
+        self.traps = traps
+        self.yet_to_move = yet_to_move
+        self.board_size = board_size
+        self.move_range = move_range
+        self.active = active
+
+    @classmethod
+    def from_game_state(cls, g):
+        """
+        Builds a Board from a GameState.
+        :param g: GameState object.
+        :return: Board object.
+        """
+        camel_index = {camel: i for i, camel in enumerate(g.CAMELS)}
+        stacks = {field: [camel_index[camel] for camel in stack] for field, stack in enumerate(g.camel_track) if stack}
+        traps = {field: (trap[0], trap[1]) for field, trap in enumerate(g.trap_track) if trap}
+        return cls(stacks, traps, list(g.camel_yet_to_move), g.BOARD_SIZE, g.MOVE_RANGE, g.active_game)
+
+    def copy(self):
+        """
+        :return: An independent copy of this Board.
+        """
+        new_board = Board.__new__(Board)
+        new_board.stacks = {field: stack[:] for field, stack in self.stacks.items()}
+        new_board.where = dict(self.where)
+        new_board.traps = dict(self.traps)
+        new_board.yet_to_move = self.yet_to_move[:]
+        new_board.board_size = self.board_size
+        new_board.move_range = self.move_range
+        new_board.active = self.active
+        return new_board
+
+    def key(self):
+        """
+        A hashable summary of everything that influences camel movement from here on. Two boards with the same key
+        produce the same distribution over camel outcomes, regardless of bets, coins and trap owners. The board size
+        and dice range are included, so boards of different rule settings never share a key.
+        :return: Tuple.
+        """
+        return (tuple(sorted((field, tuple(stack)) for field, stack in self.stacks.items())),
+                tuple(sorted((field, trap[0]) for field, trap in self.traps.items())),
+                tuple(self.yet_to_move), self.board_size, tuple(self.move_range))
+
+    def remaining(self):
+        """
+        :return: List of indices of the camels that have yet to move this round.
+        """
+        return [i for i, yet in enumerate(self.yet_to_move) if yet]
+
+    def move(self, camel, distance):
+        """
+        Moves a camel (and every camel on top of it) by a dice roll, resolving traps, the end of the round and the end
+        of the game in the same way as camelup.move_camel().
+        :param camel: Camel index.
+        :param distance: The dice roll.
+        :return: A tuple (landing, trap_owner). landing is the field the roll pointed at before any trap was applied,
+            trap_owner is the player whose trap was hit or None.
+        """
+        self.yet_to_move[camel] = False
+        curr_pos = self.where[camel]
+        stack = self.stacks[curr_pos]
+        height = stack.index(camel)
+        camels_to_move = stack[height:]
+        if height:
+            del stack[height:]
+        else:
+            del self.stacks[curr_pos]
+
+        landing = curr_pos + distance
+        trap = self.traps.get(landing)
+        trap_owner = None
+        new_pos = landing
+        if trap is not None:
+            trap_owner = trap[1]
+            new_pos += trap[0]
+
+        target = self.stacks.get(new_pos)
+        if target is None:
+            self.stacks[new_pos] = camels_to_move
+        elif trap is not None and trap[0] == -1:
+            self.stacks[new_pos] = camels_to_move + target
+        else:
+            target.extend(camels_to_move)
+        for moved in camels_to_move:
+            self.where[moved] = new_pos
+
+        if not any(self.yet_to_move):
+            self.yet_to_move = [True] * len(self.yet_to_move)
+        if new_pos >= self.board_size:
+            self.yet_to_move = [True] * len(self.yet_to_move)
+            self.active = False
+        return landing, trap_owner
+
+    def ranking(self):
+        """
+        :return: List of camel indices ordered from first to last place.
+        """
+        order = []
+        for field in sorted(self.stacks, reverse=True):
+            order.extend(reversed(self.stacks[field]))
+        return order
+
+
+def sample_round_plan(board, rng=random):
+    """
+    Draws the order and dice rolls of the camels that have yet to move this round. Picking a uniformly random
+    permutation is equivalent to picking a random remaining camel before every roll, as camelup.move_camel() does.
+    :param board: Board object.
+    :param rng: Source of randomness offering choice() and randint(), e.g. the random module or a random.Random.
+    :return: List of (camel, distance) tuples in the order they are rolled.
+    """
+    remaining = board.remaining()
+    plan = []
+    while remaining:
+        camel = rng.choice(remaining)
+        remaining.remove(camel)
+        plan.append((camel, rng.randint(*board.move_range)))
+    return plan
+
+
+SAMPLING_MODES = ("random", "stratified", "antithetic", "quasi")
+
+_HALTON_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29)
+
+
+def _radical_inverse(index, base):
+    inverse = 0
+    fraction = 1 / base
+    while index:
+        index, digit = divmod(index, base)
+        inverse += digit * fraction
+        fraction /= base
+    return inverse
+
+
+class PlanSampler:
+    """
+    Draws round plans (see sample_round_plan()) for many simulations of the same round. Besides plain random sampling
+    it offers variance reduction modes that exploit the structure of a round, a permutation of the remaining camels
+    and one die per camel:
+        - "random": independent plans, exactly as sample_round_plan().
+        - "stratified": the orders run through all permutations in shuffled passes, and each camel's rolls run
+          through all die faces in shuffled passes, so every order and face is used equally often.
+        - "antithetic": plans come in pairs with the same order, the second one rolling the mirrored face
+          (minimum + maximum - roll) of every die.
+        - "quasi": a randomly shifted Halton sequence picks the order and the rolls, which spreads the plans evenly
+          over the whole space of rounds.
+    All modes are unbiased; only the spread of the resulting estimates differs. The estimators in greedy.py report
+    standard errors as if the plans were independent, which usually overstates the error of the other modes;
+    greedy.variance_report() measures the actual spread per mode.
+    """
+    def __init__(self, remaining, move_range, mode="random", rng=random):
+        """
+        :param remaining: List of indices of the camels that have yet to move.
+        :param move_range: Tuple with the minimum and maximum dice roll (inclusive).
+        :param mode: One of SAMPLING_MODES.
+        :param rng: Source of randomness, see sample_round_plan().
+        """
+        if mode not in SAMPLING_MODES:
+            raise ValueError("Unknown sampling mode {}".format(mode))
+        self.remaining = list(remaining)
+        self.move_range = move_range
+        self.faces = list(range(move_range[0], move_range[1] + 1))
+        self.mode = mode
+        self.rng = rng
+        self.count = 0
+        self.orders = []
+        self.rolls = {camel: [] for camel in self.remaining}
+        self.previous = None
+        if mode in ("stratified", "quasi"):
+            self.permutations = list(itertools.permutations(self.remaining))
+        if mode == "quasi":
+            if len(self.remaining) + 1 > len(_HALTON_BASES):
+                raise ValueError("Too many camels for quasi-random sampling")
+            self.shift = [rng.random() for _ in range(len(self.remaining) + 1)]
+
+    def draw(self):
+        """
+        :return: The next round plan, a list of (camel, distance) tuples.
+        """
+        self.count += 1
+        if self.mode == "random":
+            remaining = self.remaining[:]
+            plan = []
+            while remaining:
+                camel = self.rng.choice(remaining)
+                remaining.remove(camel)
+                plan.append((camel, self.rng.randint(*self.move_range)))
+            return plan
+
+        if self.mode == "stratified":
+            if not self.orders:
+                self.orders = self.permutations[:]
+                self.rng.shuffle(self.orders)
+            plan = []
+            for camel in self.orders.pop():
+                rolls = self.rolls[camel]
+                if not rolls:
+                    rolls.extend(self.faces)
+                    self.rng.shuffle(rolls)
+                plan.append((camel, rolls.pop()))
+            return plan
+
+        if self.mode == "antithetic":
+            if self.previous is not None:
+                mirror = self.move_range[0] + self.move_range[1]
+                plan = [(camel, mirror - distance) for camel, distance in self.previous]
+                self.previous = None
+                return plan
+            order = self.remaining[:]
+            self.rng.shuffle(order)
+            self.previous = [(camel, self.rng.randint(*self.move_range)) for camel in order]
+            return self.previous
+
+        point = [(_radical_inverse(self.count, base) + shift) % 1 for base, shift in zip(_HALTON_BASES, self.shift)]
+        order = self.permutations[int(point[0] * len(self.permutations))]
+        return [(camel, self.faces[int(u * len(self.faces))]) for camel, u in zip(order, point[1:])]
+
+
+def play_plan(board, plan, on_landing=None):
+    """
+    Rolls the camels of a round plan until the plan is used up or the game ends.
+    :param board: Board object, modified in place.
+    :param plan: List of (camel, distance) tuples, see sample_round_plan().
+    :param on_landing: Optional callable receiving (landing, trap_owner) after every roll.
+    :return: The Board.
+    """
+    for camel, distance in plan:
+        landing, trap_owner = board.move(camel, distance)
+        if on_landing is not None:
+            on_landing(landing, trap_owner)
+        if not board.active:
+            break
+    return board
+
+
+def play_to_end(board, rng=random):
+    """
+    Plays random rounds until the game ends.
+    :param board: Board object, modified in place.
+    :param rng: Source of randomness, see sample_round_plan().
+    :return: The Board.
+    """
+    while board.active:
+        play_plan(board, sample_round_plan(board, rng))
+    return board
@@ -1,5 +1,14 @@
+import math
+import time
+import bisect
 import random
 import copy
+import contextlib
+import numpy as np
+from fastboard import Board, PlanSampler, SAMPLING_MODES, sample_round_plan, play_plan, play_to_end
+from exactround import enumerate_round, reachable_fields
+from racetable import default_table
+from workerpool import seed_worker
 from camelup import (
     get_valid_moves,
     GameState,
@@ -12,45 +21,148 @@ from camelup import (
 from playerinterface import PlayerInterface
 from actionids import MOVE_CAMEL_ACTION_ID, ROUND_BET_ACTION_ID, GAME_BET_ACTION_ID, MOVE_TRAP_ACTION_ID
 
+# SAMPLING
+
+class SampleStatistics:
+    """
+    Running sums of per-sample value vectors, from which means and standard errors of the mean are derived.
+    """
+    def __init__(self, size):
+        """
+        :param size: Number of values recorded per sample.
+        """
+        self.count = 0
+        self.sums = np.zeros(size)
+        self.squared_sums = np.zeros(size)
+
+    def add(self, values):
+        """
+        :param values: Array (samples x size) of per-sample values.
+        """
+        values = np.asarray(values, dtype=float).reshape(-1, len(self.sums))
+        self.count += len(values)
+        self.sums += values.sum(axis=0)
+        self.squared_sums += (values ** 2).sum(axis=0)
+
+    def mean(self):
+        return self.sums / max(self.count, 1)
+
+    def standard_error(self):
+        if self.count < 2:
+            return np.full(len(self.sums), np.inf)
+        mean = self.mean()
+        variance = np.maximum(self.squared_sums / self.count - mean ** 2, 0) * self.count / (self.count - 1)
+        return np.sqrt(variance / self.count)
+
+
+def sample_in_chunks(draw, statistics, num_simulations, tolerance=None, chunk_size=100, min_simulations=100,
+                     converged=None):
+    """
+    Draws samples chunk by chunk until the requested precision is reached or the budget is exhausted. Without a
+    tolerance or convergence test the full budget is used.
+    :param draw: Callable taking a number of samples and returning an array (samples x size) of per-sample values.
+    :param statistics: SampleStatistics collecting the samples.
+    :param num_simulations: Maximum number of samples (the budget).
+    :param tolerance: Stop once every standard error is at most this value.
+    :param chunk_size: Number of samples drawn between precision checks.
+    :param min_simulations: Number of samples drawn before precision is checked for the first time.
+    :param converged: Optional callable receiving the statistics and returning True once sampling can stop.
+    :return: The statistics.
+    """
+    while statistics.count < num_simulations:
+        statistics.add(draw(min(chunk_size, num_simulations - statistics.count)))
+        if statistics.count < min_simulations:
+            continue
+        if tolerance is not None and statistics.standard_error().max() <= tolerance:
+            break
+        if converged is not None and converged(statistics):
+            break
+    return statistics
+
+def variance_report(estimator, game_state, active_player, modes=SAMPLING_MODES, num_simulations=200, replications=20,
+                    **kwargs):
+    """
+    Measures how much an estimator's results spread between independent runs in each sampling mode, to pick the
+    cheapest mode for it. The efficiency of a mode is the variance of plain random sampling divided by its own, i.e.
+    how many times fewer rollouts it needs for the same standard error.
+    :param estimator: simulate_round, simulate_race or simulate_round_with_traps.
+    :param game_state: The current game state.
+    :param active_player: The active player.
+    :param modes: Sampling modes to compare, see fastboard.SAMPLING_MODES.
+    :param num_simulations: Number of simulations per run.
+    :param replications: Number of independent runs per mode.
+    :param kwargs: Further estimator arguments, e.g. trap_type and trap_position.
+    :return: A dictionary mapping every mode to a dictionary with the average "variance" of the estimates, the
+        "efficiency" (None if "random" is not among the modes) and the average "seconds" per run.
+    """
+    def flatten(result):
+        if isinstance(result, dict):
+            return [value for camel in result.values() for name, value in camel.items() if not name.endswith("_se")]
+        return [result]
+
+    report = {}
+    for mode in modes:
+        start = time.perf_counter()
+        results = np.array([
+            flatten(estimator(game_state, active_player, num_simulations=num_simulations, sampling=mode, **kwargs))
+            for _ in range(replications)])
+        report[mode] = {
+            "variance": float(results.var(axis=0, ddof=1).mean()),
+            "seconds": (time.perf_counter() - start) / replications
+        }
+    for mode in modes:
+        if "random" in report and report[mode]["variance"] > 0:
+            report[mode]["efficiency"] = report["random"]["variance"] / report[mode]["variance"]
+        else:
+            report[mode]["efficiency"] = None
+    return report
+
+# END SAMPLING
+
 # ROUND BETTING
 
-def simulate_round(game_state, active_player, num_simulations=1000):
+def simulate_round(game_state, active_player, num_simulations=1000, tolerance=None, chunk_size=100, cache=None,
+                   sampling="random"):
     """
-    Simulates the rest of the current round num_simulations times to estimate camel probabilities.
+    Simulates the rest of the current round up to num_simulations times to estimate camel probabilities.
     :param game_state: The current game state.
-    :param num_simulations: Number of simulations to run.
-    :return: A dictionary with probabilities for each camel finishing first or second.
+    :param num_simulations: Number of simulations to run. With a tolerance this is the maximum number.
+    :param tolerance: Optional target standard error; sampling stops early once every probability is this precise.
+    :param chunk_size: Number of simulations between precision checks.
+    :param cache: Optional evalcache.EvaluationCache. The result is reused for every state with the same board.
+    :param sampling: How round plans are drawn, one of fastboard.SAMPLING_MODES (see fastboard.PlanSampler).
+    :return: A dictionary with probabilities (and their standard errors "first_se" and "second_se") for each camel
+        finishing first or second.
     """
-    camel_counts = {camel: {"first": 0, "second": 0} for camel in game_state.CAMELS}
-    
-    current_player = active_player
-    for _ in range(num_simulations):
-        state = game_state
-        round_start = False
-        if all(state.camel_yet_to_move):
-            round_start = True
-        while round_start or not all(state.camel_yet_to_move):  # Continue until all camels have moved
-            round_start = False
-            if not state.active_game:
-                break
-            roll_id = (0,)
-            state = transition(state, current_player, roll_id)
-            current_player = (current_player + 1) % state.NUM_PLAYERS
-        
-        # Determine first and second place camels
-        first_place_camel = find_camel_in_nth_place(state, 1)
-        second_place_camel = find_camel_in_nth_place(state, 2)
-        
-        camel_counts[first_place_camel]["first"] += 1
-        camel_counts[second_place_camel]["second"] += 1
-    
-    total_simulations = num_simulations
+    num_camels = game_state.NUM_CAMELS
+    start_board = Board.from_game_state(game_state)
+    if cache is not None:
+        return cache.get_or_create(
+            ("round", start_board.key(), num_simulations, tolerance, sampling),
+            lambda: simulate_round(game_state, active_player, num_simulations, tolerance, chunk_size,
+                                   sampling=sampling))
+    sampler = PlanSampler(start_board.remaining(), start_board.move_range, sampling)
+
+    def draw(n):
+        values = np.zeros((n, 2 * num_camels))
+        for i in range(n):
+            board = play_plan(start_board.copy(), sampler.draw())
+            ranking = board.ranking()
+            values[i, ranking[0]] = 1
+            values[i, num_camels + ranking[1]] = 1
+        return values
+
+    statistics = sample_in_chunks(draw, SampleStatistics(2 * num_camels), num_simulations, tolerance, chunk_size)
+    mean = statistics.mean()
+    standard_error = statistics.standard_error()
     probabilities = {
         camel: {
-            "first": camel_counts[camel]["first"] / total_simulations,
-            "second": camel_counts[camel]["second"] / total_simulations
+            "first": float(mean[i]),
+            "second": float(mean[num_camels + i]),
+            "first_se": float(standard_error[i]),
+            "second_se": float(standard_error[num_camels + i])
         }
-        for camel in game_state.CAMELS
+        for i, camel in enumerate(game_state.CAMELS)
     }
     
     return probabilities
@@ -117,41 +229,304 @@ def calculate_rolling_ev(gamma = 0.75):
 
 # RACE BETTING
 
-def simulate_race(game_state, active_player, num_simulations=800):
+def simulate_race(game_state, active_player, num_simulations=800, tolerance=None, chunk_size=100, cache=None,
+                  sampling="random"):
     """
-    Simulates the rest of the current round num_simulations times to estimate camel probabilities.
+    Simulates the rest of the game up to num_simulations times to estimate camel probabilities.
     :param game_state: The current game state.
-    :param num_simulations: Number of simulations to run.
-    :return: A dictionary with probabilities for each camel finishing first or second.
+    :param num_simulations: Number of simulations to run. With a tolerance this is the maximum number.
+    :param tolerance: Optional target standard error; sampling stops early once every probability is this precise.
+    :param chunk_size: Number of simulations between precision checks.
+    :param cache: Optional evalcache.EvaluationCache. The result is reused for every state with the same board.
+    :param sampling: How the plans of the current round are drawn (later rounds are always random), one of
+        fastboard.SAMPLING_MODES (see fastboard.PlanSampler). "control" uses simulate_race_control_variate() instead.
+    :return: A dictionary with probabilities (and their standard errors "win_se" and "lose_se") for each camel
+        winning or losing the game.
     """
-    camel_counts = {camel: {"win": 0, "lose": 0} for camel in game_state.CAMELS}
-    
-    current_player = active_player
-    for _ in range(num_simulations):
-        state = game_state
-        while state.active_game:  # Continue until game ends
-            roll_id = (0,)
-            state = transition(state, current_player, roll_id)
-            current_player = (current_player + 1) % state.NUM_PLAYERS
-        
-        # Determine first and second place camels
-        first_place_camel = find_camel_in_nth_place(state, 1)
-        last_place_camel = find_camel_in_nth_place(state, state.NUM_CAMELS)
-        
-        camel_counts[first_place_camel]["win"] += 1
-        camel_counts[last_place_camel]["lose"] += 1
-    
-    total_simulations = num_simulations
+    num_camels = game_state.NUM_CAMELS
+    start_board = Board.from_game_state(game_state)
+    if cache is not None:
+        return cache.get_or_create(
+            ("race", start_board.key(), num_simulations, tolerance, sampling),
+            lambda: simulate_race(game_state, active_player, num_simulations, tolerance, chunk_size, sampling=sampling))
+    if sampling == "control":
+        return simulate_race_control_variate(game_state, active_player, num_simulations, tolerance, chunk_size)
+    sampler = PlanSampler(start_board.remaining(), start_board.move_range, sampling)
+
+    def draw(n):
+        values = np.zeros((n, 2 * num_camels))
+        for i in range(n):
+            board = play_plan(start_board.copy(), sampler.draw())
+            ranking = play_to_end(board).ranking()
+            values[i, ranking[0]] = 1
+            values[i, num_camels + ranking[-1]] = 1
+        return values
+
+    statistics = sample_in_chunks(draw, SampleStatistics(2 * num_camels), num_simulations, tolerance, chunk_size)
+    mean = statistics.mean()
+    standard_error = statistics.standard_error()
     probabilities = {
         camel: {
-            "win": camel_counts[camel]["win"] / total_simulations,
-            "lose": camel_counts[camel]["lose"] / total_simulations
+            "win": float(mean[i]),
+            "lose": float(mean[num_camels + i]),
+            "win_se": float(standard_error[i]),
+            "lose_se": float(standard_error[num_camels + i])
         }
-        for camel in game_state.CAMELS
+        for i, camel in enumerate(game_state.CAMELS)
     }
     
     return probabilities
 
+def simulate_race_importance(game_state, active_player, num_simulations=800, tolerance=None, chunk_size=100,
+                             pilot_share=0.25, rare_threshold=0.1, uniform_share=0.3, tilt=1.0):
+    """
+    Estimates race probabilities by importance sampling, for accurate tail probabilities such as a trailing camel
+    winning or the leader finishing last.
+
+    A pilot share of the playouts is drawn from the real game. For every win or lose outcome that turns out rare in
+    the pilot, a proposal game is fitted to the playouts in which it happened (the cross-entropy method): every
+    camel's die rolls faces in the proportions seen there, half mixed with a fair die, and camels are drawn to move
+    with weights that favour the turns they moved at (one minorize-maximize step of a Plackett-Luce model, halved on a
+    log scale). An outcome the pilot never saw gets a proposal in which its camel's die is tilted towards high (win)
+    or low (lose) rolls and all other dice the opposite way. The remaining playouts are drawn from a mixture of the
+    real game and all proposals and weighted with their probability in the real game divided by their probability
+    under the mixture, which keeps every estimate unbiased and every weight below 1 / uniform_share. Only the rolls
+    and draws a playout uses enter the weights, and the weights of a whole chunk are computed at once.
+
+    This is not a sampling mode of simulate_race(): a weighted playout costs about 1.4 times a plain one, while the
+    standard errors of rare outcomes at an equal number of playouts stay about the same, so at equal wall time plain
+    sampling is more precise. Use it for a standalone look at the tails of one position.
+    :param game_state: The current game state.
+    :param active_player: The active player.
+    :param num_simulations: Number of playouts. With a tolerance this is the maximum number.
+    :param tolerance: Optional target standard error of the weighted playouts; sampling stops early once it is met.
+    :param chunk_size: Number of playouts between precision checks.
+    :param pilot_share: Share of the playouts spent on the pilot.
+    :param rare_threshold: Outcomes with a pilot probability below this value get their own proposal.
+    :param uniform_share: Share of the weighted playouts drawn from the real game.
+    :param tilt: Strength of the tilt for outcomes the pilot never saw; the die then rolls face f with probability
+        proportional to exp(tilt * f) or exp(-tilt * f).
+    :return: A dictionary in the format of simulate_race(); the standard errors are those of the weighted estimates.
+    """
+    num_camels = game_state.NUM_CAMELS
+    start_board = Board.from_game_state(game_state)
+    faces = list(range(start_board.move_range[0], start_board.move_range[1] + 1))
+    num_faces = len(faces)
+    fair = np.full((num_camels, num_faces), 1 / num_faces)
+    even = np.ones(num_camels)
+
+    def playout(face_cdfs, order_weights):
+        # Returns the ranking, the index camel * num_faces + face of every roll and the (camel, remaining camels as a
+        # bit mask) of every draw of the camel to move
+        board = start_board.copy()
+        rolls = []
+        draws = []
+        while board.active:
+            remaining = board.remaining()
+            while remaining and board.active:
+                mask = sum(1 << camel for camel in remaining)
+                if order_weights is None:
+                    camel = remaining[int(random.random() * len(remaining))]
+                else:
+                    threshold = random.random() * sum(order_weights[camel] for camel in remaining)
+                    for camel in remaining:
+                        threshold -= order_weights[camel]
+                        if threshold < 0:
+                            break
+                remaining.remove(camel)
+                face = min(bisect.bisect(face_cdfs[camel], random.random()), num_faces - 1)
+                rolls.append(camel * num_faces + face)
+                draws.append((camel, mask))
+                board.move(camel, faces[face])
+        return board.ranking(), rolls, draws
+
+    def outcome_rows(rankings, weights):
+        rows = np.zeros((len(rankings), 2 * num_camels))
+        for row, ranking, weight in zip(rows, rankings, weights):
+            row[ranking[0]] = weight
+            row[num_camels + ranking[-1]] = weight
+        return rows
+
+    fair_cdfs = np.cumsum(fair, axis=1).tolist()
+    num_pilot = min(max(int(num_simulations * pilot_share), 1), num_simulations)
+    pilot = [playout(fair_cdfs, None) for _ in range(num_pilot)]
+    pilot_statistics = SampleStatistics(2 * num_camels)
+    pilot_statistics.add(outcome_rows([ranking for ranking, _, _ in pilot], np.ones(num_pilot)))
+
+    proposals = [(fair, even)]
+    centered = np.array(faces) - np.mean(faces)
+    for camel in range(num_camels):
+        for place, direction in ((0, 1), (-1, -1)):
+            hits = [(rolls, draws) for ranking, rolls, draws in pilot if ranking[place] == camel]
+            if len(hits) >= rare_threshold * num_pilot:
+                continue
+            order = even
+            if hits:
+                fitted = np.ones(num_camels * num_faces)
+                moves = np.ones(num_camels)
+                exposure = np.ones(num_camels)
+                for rolls, draws in hits:
+                    np.add.at(fitted, rolls, 1)
+                    for picked, mask in draws:
+                        available = [other for other in range(num_camels) if mask >> other & 1]
+                        moves[picked] += 1
+                        exposure[available] += 1 / len(available)
+                fitted = fitted.reshape(num_camels, num_faces)
+                order = np.sqrt(moves / exposure)
+            else:
+                fitted = np.array([np.exp((direction if other == camel else -direction) * tilt * centered)
+                                   for other in range(num_camels)])
+            fitted = fitted / fitted.sum(axis=1, keepdims=True)
+            proposals.append((0.5 * fitted + 0.5 * fair, order / order.sum()))
+    shares = np.full(len(proposals), (1 - uniform_share) / max(len(proposals) - 1, 1))
+    shares[0] = uniform_share if len(proposals) > 1 else 1
+    share_cdf = np.cumsum(shares).tolist()
+    samplers = [(np.cumsum(face_probabilities, axis=1).tolist(), None if np.ptp(order) == 0 else order.tolist())
+                for face_probabilities, order in proposals]
+    log_shares = np.log(shares)
+    # Log probability of every roll (camel * num_faces + face) and of drawing every camel, per proposal
+    log_faces = np.log(np.array([face_probabilities for face_probabilities, _ in proposals]))
+    log_faces = log_faces.reshape(len(proposals), -1)
+    order_weights = np.array([order for _, order in proposals])
+    log_order = np.log(order_weights)
+    bits = 1 << np.arange(num_camels)
+
+    def draw(n):
+        rankings = []
+        rolls = np.zeros((n, num_camels * num_faces))
+        picks, masks, owners = [], [], []
+        for i in range(n):
+            proposal = min(bisect.bisect(share_cdf, random.random()), len(proposals) - 1)
+            ranking, playout_rolls, draws = playout(*samplers[proposal])
+            rankings.append(ranking)
+            np.add.at(rolls[i], playout_rolls, 1)
+            for picked, mask in draws:
+                picks.append(picked)
+                masks.append(mask)
+                owners.append(i)
+        log_likelihoods = rolls @ log_faces.T
+        available = (np.array(masks)[:, None] & bits) > 0
+        draw_terms = log_order[:, picks].T - np.log(available @ order_weights.T)
+        np.add.at(log_likelihoods, owners, draw_terms)
+        mixture = log_shares + log_likelihoods
+        top = mixture.max(axis=1, keepdims=True)
+        log_mixture = top[:, 0] + np.log(np.exp(mixture - top).sum(axis=1))
+        return outcome_rows(rankings, np.exp(log_likelihoods[:, 0] - log_mixture))
+
+    statistics = SampleStatistics(2 * num_camels)
+    if num_simulations > num_pilot:
+        statistics = sample_in_chunks(draw, statistics, num_simulations - num_pilot, tolerance, chunk_size)
+
+    # Both stages are unbiased; combine them in proportion to their sizes
+    stages = [stage for stage in (pilot_statistics, statistics) if stage.count]
+    total = sum(stage.count for stage in stages)
+    mean = sum(stage.count * stage.mean() for stage in stages) / total
+    standard_error = np.sqrt(sum(stage.count ** 2 * stage.standard_error() ** 2 for stage in stages)) / total
+    return {
+        camel: {
+            "win": float(mean[i]),
+            "lose": float(mean[num_camels + i]),
+            "win_se": float(standard_error[i]),
+            "lose_se": float(standard_error[num_camels + i])
+        }
+        for i, camel in enumerate(game_state.CAMELS)
+    }
+
+def simulate_race_control_variate(game_state, active_player, num_simulations=800, tolerance=None, chunk_size=100,
+                                  return_report=False):
+    """
+    Estimates race probabilities with the ranking at the end of the current round as control variates. Which camels
+    lead and trail when the round ends is known exactly (see exactround.enumerate_round()) and strongly predicts who
+    wins and loses the game, so the Monte Carlo estimate is corrected by the regression of the race outcome on the
+    round outcome (the place of every camel): playouts that happened to end the round with an unlikely leader count
+    less, and vice versa.
+    :param game_state: The current game state.
+    :param active_player: The active player.
+    :param num_simulations: Number of playouts. With a tolerance this is the maximum number.
+    :param tolerance: Optional target standard error; sampling stops early once every probability is this precise.
+    :param chunk_size: Number of playouts between precision checks.
+    :param return_report: Whether to also return a report of the variance reduction.
+    :return: A dictionary in the format of simulate_race(), or a tuple (probabilities, report) if return_report is
+        set. The report has the overall "variance_reduction" (the variance of plain Monte Carlo divided by the
+        remaining variance, i.e. how many times fewer playouts reach the same precision), the same factor per camel
+        and outcome under "per_camel", and the number of "playouts".
+    """
+    num_camels = game_state.NUM_CAMELS
+    start_board = Board.from_game_state(game_state)
+    round_outcome = enumerate_round(start_board)
+    control_means = round_outcome.rank_probabilities.ravel()
+
+    race_rows = []
+    control_rows = []
+
+    def estimate():
+        race = np.array(race_rows)
+        controls = np.array(control_rows)
+        race_deviations = race - race.mean(axis=0)
+        control_deviations = controls - controls.mean(axis=0)
+        coefficients = np.linalg.lstsq(control_deviations, race_deviations, rcond=None)[0]
+        mean = race.mean(axis=0) - (controls.mean(axis=0) - control_means) @ coefficients
+        residual_variance = (race_deviations - control_deviations @ coefficients).var(axis=0, ddof=1)
+        return mean, np.sqrt(residual_variance / len(race)), race.var(axis=0, ddof=1), residual_variance
+
+    while len(race_rows) < num_simulations:
+        for _ in range(min(chunk_size, num_simulations - len(race_rows))):
+            board = play_plan(start_board.copy(), sample_round_plan(start_board))
+            round_ranking = board.ranking()
+            race_ranking = play_to_end(board).ranking()
+            race_row = np.zeros(2 * num_camels)
+            race_row[race_ranking[0]] = 1
+            race_row[num_camels + race_ranking[-1]] = 1
+            control_row = np.zeros((num_camels, num_camels))
+            control_row[round_ranking, np.arange(num_camels)] = 1
+            race_rows.append(race_row)
+            control_rows.append(control_row.ravel())
+        if tolerance is not None and len(race_rows) >= 100 and estimate()[1].max() <= tolerance:
+            break
+
+    mean, standard_error, plain_variance, residual_variance = estimate()
+    mean = np.clip(mean, 0, 1)
+    probabilities = {
+        camel: {
+            "win": float(mean[i]),
+            "lose": float(mean[num_camels + i]),
+            "win_se": float(standard_error[i]),
+            "lose_se": float(standard_error[num_camels + i])
+        }
+        for i, camel in enumerate(game_state.CAMELS)
+    }
+    if not return_report:
+        return probabilities
+
+    def reduction(plain, residual):
+        return float(plain / residual) if residual > 0 else float('inf') if plain > 0 else 1.0
+
+    report = {
+        "variance_reduction": reduction(plain_variance.sum(), residual_variance.sum()),
+        "per_camel": {
+            camel: {
+                "win": reduction(plain_variance[i], residual_variance[i]),
+                "lose": reduction(plain_variance[num_camels + i], residual_variance[num_camels + i])
+            }
+            for i, camel in enumerate(game_state.CAMELS)
+        },
+        "playouts": len(race_rows)
+    }
+    return probabilities, report
+
+def lookup_race_probabilities(game_state, table=None):
+    """
+    Looks the position up in a precomputed race table (see racetable.py) instead of simulating it.
+    :param game_state: The current game state.
+    :param table: A racetable.RaceTable. Defaults to the table named by the CAMELUP_RACE_TABLE environment variable.
+    :return: A dictionary in the format of simulate_race(), or None if no table is available or the position is not
+        in it.
+    """
+    table = table if table is not None else default_table()
+    if table is None:
+        return None
+    return table.lookup(game_state)
+
 def get_race_bet_payout(game_state : GameState, camel, bet_type):
     """
     Get the payout for betting on a camel to finish as the overall winner or loser.
@@ -205,66 +580,894 @@ def calculate_race_bet_ev(game_state, probabilities, camel, bet_type):
     return ev
 
 
+def calculate_race_bet_standard_error(game_state, probabilities, camel, bet_type):
+    """
+    Standard error of calculate_race_bet_ev() caused by the uncertainty of estimated race probabilities. The EV is
+    linear in the win and lose probability of the camel; their covariance is bounded by the product of their standard
+    errors, so the result never understates the error.
+    :param game_state: The current game state.
+    :param probabilities: A dictionary with race probabilities and their standard errors ("win_se" and "lose_se") for
+        each camel, see simulate_race(). Probabilities without standard errors are treated as exact.
+    :param camel: The camel to evaluate.
+    :param bet_type: The type of bet ("win" or "lose").
+    :return: Standard error of the expected value of the bet.
+    """
+    inv_bet_type = 'lose' if bet_type == 'win' else 'win'
+    correct_weight = get_race_bet_payout(game_state, camel, bet_type) + 1
+    inv_weight = get_race_bet_payout(game_state, camel, inv_bet_type) - 1
+    return (correct_weight * probabilities[camel].get(bet_type + "_se", 0)
+            + abs(inv_weight) * probabilities[camel].get(inv_bet_type + "_se", 0))
+
+
 # END RACE BETTING
 
 # TRAPS
 
-def simulate_round_with_traps(game_state : GameState, active_player, trap_type, trap_position, num_simulations=500):
+def settle_round_bets(game_state, player, ranking):
     """
-    Simulates the rest of the current round num_simulations times to estimate camel probabilities.
+    The payout a player receives for their round bets at the end of the round, following camelup.end_of_round().
     :param game_state: The current game state.
-    :param num_simulations: Number of simulations to run.
-    :return: A dictionary with probabilities for each camel finishing first or second.
+    :param player: Player ID integer.
+    :param ranking: Camel indices ordered from first to last place.
+    :return: The payout.
     """
-    min_non_none_index = min([i for i, track in enumerate(game_state.camel_track) if track])
-    max_non_none_index = max([i for i, track in enumerate(game_state.camel_track) if track])
-    if trap_position < min_non_none_index or max_non_none_index - trap_position > 3:
-        return 0
-    
-    current_player = active_player
-    money_no_trap = 0
-    
-    for _ in range(num_simulations // 2):
-        state = game_state
-        round_start = False
-        if all(state.camel_yet_to_move):
-            round_start = True
-        while round_start or not all(state.camel_yet_to_move):  # Continue until all camels have moved
-            round_start = False
-            if not state.active_game:
+    first_place_camel = game_state.CAMELS[ranking[0]]
+    second_place_camel = game_state.CAMELS[ranking[1]]
+    first_place_payout_index = 0
+    second_place_payout_index = 0
+    payout = 0
+    for camel, bettor in game_state.round_bets:
+        if camel == first_place_camel:
+            if bettor == player:
+                payout += game_state.FIRST_PLACE_ROUND_PAYOUT[first_place_payout_index]
+            first_place_payout_index += 1
+        elif camel == second_place_camel:
+            if bettor == player:
+                payout += game_state.SECOND_PLACE_ROUND_PAYOUT[second_place_payout_index]
+            second_place_payout_index += 1
+        elif bettor == player:
+            payout += game_state.THIRD_OR_WORSE_PLACE_ROUND_PAYOUT
+    return payout
+
+
+def round_earnings(game_state, player, start_board, plan):
+    """
+    A player's earnings from the rest of the round (trap coins and round bet payouts) for one round plan.
+    :param game_state: The current game state.
+    :param player: Player ID integer.
+    :param start_board: fastboard.Board object. It is not modified.
+    :param plan: Round plan, see fastboard.sample_round_plan().
+    :return: The earnings.
+    """
+    coins = []
+    end_board = play_plan(
+        start_board.copy(), plan, lambda landing, trap_owner: coins.append(1) if trap_owner == player else None)
+    return len(coins) + settle_round_bets(game_state, player, end_board.ranking())
+
+
+def trap_boards(board, active_player, trap_moves):
+    """
+    :param board: fastboard.Board object.
+    :param active_player: The player placing the trap.
+    :param trap_moves: List of (trap_type, trap_position) tuples.
+    :return: List with one copy of the board per trap move, the player's trap moved accordingly.
+    """
+    boards = []
+    for trap_type, trap_position in trap_moves:
+        trap_board = board.copy()
+        for field, trap in list(trap_board.traps.items()):
+            if trap[1] == active_player:
+                del trap_board.traps[field]
+        trap_board.traps[trap_position] = (trap_type, active_player)
+        boards.append(trap_board)
+    return boards
+
+
+def simulate_round_with_traps(game_state : GameState, active_player, trap_type, trap_position, num_simulations=500,
+                              tolerance=None, chunk_size=100, return_stderr=False, sampling="random"):
+    """
+    Estimates what moving the active player's trap to trap_position is worth this round, by comparing the player's
+    round earnings (trap coins and round bet payouts) with and without the move. Both sides replay the same camel
+    orders and dice rolls (common random numbers), so the noise they share cancels out of the difference; half of the
+    simulations are spent on each side.
+    :param game_state: The current game state.
+    :param active_player: The player placing the trap.
+    :param trap_type: The trap type (1 or -1).
+    :param trap_position: The field to place the trap on.
+    :param num_simulations: Number of simulations to run. With a tolerance this is the maximum number.
+    :param tolerance: Optional target standard error of the returned value; sampling stops early once it is reached.
+    :param chunk_size: Number of simulations between precision checks.
+    :param return_stderr: Whether to also return the standard error.
+    :param sampling: How round plans are drawn, one of fastboard.SAMPLING_MODES (see fastboard.PlanSampler).
+    :return: The expected gain of the trap move, or a tuple (gain, standard_error) if return_stderr is set.
+    """
+    board = Board.from_game_state(game_state)
+    if trap_position not in reachable_fields(board):
+        return (0, 0) if return_stderr else 0
+
+    trap_board, = trap_boards(board, active_player, [(trap_type, trap_position)])
+    sampler = PlanSampler(board.remaining(), board.move_range, sampling)
+
+    def draw(n):
+        differences = []
+        for _ in range(n):
+            plan = sampler.draw()
+            differences.append([round_earnings(game_state, active_player, trap_board, plan) -
+                                round_earnings(game_state, active_player, board, plan)])
+        return differences
+
+    statistics = sample_in_chunks(
+        draw, SampleStatistics(1), max(num_simulations // 2, 1), tolerance, max(chunk_size // 2, 1),
+        min_simulations=50)
+    gain = float(statistics.mean()[0])
+    if return_stderr:
+        return gain, float(statistics.standard_error()[0])
+    return gain
+
+
+def compare_trap_moves(game_state, active_player, trap_moves=None, num_simulations=500, sampling="random"):
+    """
+    Estimates the gain of several trap moves at once (see simulate_round_with_traps()). Every sampled round plan is
+    replayed on the board without the move and on the board of every candidate, so candidates are compared on
+    identical futures and the differences between them are far less noisy than independent estimates.
+    :param game_state: The current game state.
+    :param active_player: The player placing the trap.
+    :param trap_moves: List of (trap_type, trap_position) tuples. Defaults to every valid trap move.
+    :param num_simulations: Number of round plans (at least 2), each replayed on every board.
+    :param sampling: How round plans are drawn, one of fastboard.SAMPLING_MODES.
+    :return: A tuple (gains, standard_errors, difference_standard_errors). gains and standard_errors map every trap
+        move to its expected gain and its standard error; difference_standard_errors is a matrix with the standard
+        error of the gain difference for every pair of moves (in the order of trap_moves).
+    """
+    if trap_moves is None:
+        trap_moves = [move[1:] for move in get_valid_moves(game_state, active_player)
+                      if move[0] == MOVE_TRAP_ACTION_ID]
+    board = Board.from_game_state(game_state)
+    reachable = reachable_fields(board)
+    columns = [i for i, move in enumerate(trap_moves) if move[1] in reachable]
+    boards = trap_boards(board, active_player, [trap_moves[i] for i in columns])
+    sampler = PlanSampler(board.remaining(), board.move_range, sampling)
+
+    gains = np.zeros((num_simulations, len(trap_moves)))
+    for i in range(num_simulations):
+        plan = sampler.draw()
+        baseline = round_earnings(game_state, active_player, board, plan)
+        for column, trap_board in zip(columns, boards):
+            gains[i, column] = round_earnings(game_state, active_player, trap_board, plan) - baseline
+
+    mean = gains.mean(axis=0)
+    standard_errors = gains.std(axis=0, ddof=1) / np.sqrt(num_simulations)
+    differences = gains[:, :, None] - gains[:, None, :]
+    difference_standard_errors = differences.std(axis=0, ddof=1) / np.sqrt(num_simulations)
+    return ({move: float(mean[i]) for i, move in enumerate(trap_moves)},
+            {move: float(standard_errors[i]) for i, move in enumerate(trap_moves)},
+            difference_standard_errors)
+
+def get_round_bets_value(game_state, player, outcome):
+    """
+    Expected payout of the round bets a player has already placed, given the exact outcome of the round.
+    :param game_state: The current game state.
+    :param player: Player ID integer.
+    :param outcome: exactround.RoundOutcome of the current round.
+    :return: Expected payout.
+    """
+    value = 0
+    bets_per_camel = {}
+    for camel, bettor in game_state.round_bets:
+        num_bets = bets_per_camel.get(camel, 0)
+        bets_per_camel[camel] = num_bets + 1
+        if bettor != player:
+            continue
+        camel_index = game_state.CAMELS.index(camel)
+        prob_first = outcome.place_probability(camel_index, 1)
+        prob_second = outcome.place_probability(camel_index, 2)
+        value += (prob_first * game_state.FIRST_PLACE_ROUND_PAYOUT[num_bets] +
+                  prob_second * game_state.SECOND_PLACE_ROUND_PAYOUT[num_bets] +
+                  (1 - prob_first - prob_second) * game_state.THIRD_OR_WORSE_PLACE_ROUND_PAYOUT)
+    return value
+
+
+def trap_landing_map(game_state, active_player, cache=None):
+    """
+    Computes exactly, for every legal trap move of the active player, how often camels land on the trap's field this
+    round, what the move is worth and how it shifts the round ranking. All candidates are evaluated in one enumeration
+    of the round (see exactround.enumerate_round()); fields no camel can reach are skipped without any work.
+    :param game_state: The current game state.
+    :param active_player: The player placing the trap.
+    :param cache: Optional evalcache.EvaluationCache. The enumeration only depends on the board (without the player's
+        own trap) and the candidates, so it is shared by every player and bet that sees the same board.
+    :return: A dictionary mapping (trap_type, trap_position) to a dictionary with the entries
+        - "landing": expected number of camels landing on the field if no trap were there,
+        - "coins": expected coins collected by the trap,
+        - "payout": expected change in the player's round earnings (trap coins and round bets) compared to leaving
+          their trap where it is, i.e. the EV of the trap move,
+        - "rank_shift": per camel, the change in the probability of finishing the round first and second.
+    """
+    board = Board.from_game_state(game_state)
+    current_trap = None
+    for field, trap in list(board.traps.items()):
+        if trap[1] == active_player:
+            current_trap = (field, trap[0])
+            del board.traps[field]
+
+    moves = [move for move in get_valid_moves(game_state, active_player) if move[0] == MOVE_TRAP_ACTION_ID]
+    candidates = [(move[2], move[1]) for move in moves]
+    if current_trap is not None:
+        candidates.append(current_trap)
+    if not candidates:
+        return {}
+    if cache is None:
+        outcome, candidate_outcomes = enumerate_round(board, candidates)
+    else:
+        outcome, candidate_outcomes = cache.get_or_create(
+            ("traps", board.key(), tuple(candidates)), lambda: enumerate_round(board, candidates))
+
+    baseline = candidate_outcomes[-1] if current_trap is not None else outcome
+    baseline_value = get_round_bets_value(game_state, active_player, baseline)
+    if current_trap is not None:
+        baseline_value += baseline.landings[current_trap[0]]
+
+    trap_map = {}
+    for move, candidate_outcome in zip(moves, candidate_outcomes):
+        _, trap_type, trap_position = move
+        coins = candidate_outcome.landings[trap_position]
+        rank_shift = {
+            camel: {
+                "first": candidate_outcome.place_probability(i, 1) - baseline.place_probability(i, 1),
+                "second": candidate_outcome.place_probability(i, 2) - baseline.place_probability(i, 2)
+            }
+            for i, camel in enumerate(game_state.CAMELS)
+        }
+        trap_map[(trap_type, trap_position)] = {
+            "landing": outcome.landings[trap_position],
+            "coins": coins,
+            "payout": coins + get_round_bets_value(game_state, active_player, candidate_outcome) - baseline_value,
+            "rank_shift": rank_shift
+        }
+    return trap_map
+
+# END TRAPS
+
+# SHARED DECISION ESTIMATE
+
+class DecisionEstimate:
+    """
+    Camel outcome statistics for one greedy decision, collected from a single set of sampled futures. Each sample
+    provides the round ranking, the race ranking and the fields camels land on during the rest of the current round,
+    so round bets, game bets and traps are all judged against the same futures.
+    """
+    def __init__(self, camels, num_fields, known_race_probabilities=None):
+        """
+        :param camels: List of camel IDs (GameState.CAMELS).
+        :param num_fields: Length of the camel track.
+        :param known_race_probabilities: Optional race probabilities known from elsewhere (e.g. a race table). Samples
+            then only need to cover the current round.
+        """
+        self.camels = camels
+        self.known_race_probabilities = known_race_probabilities
+        self.num_simulations = 0
+        self.first_counts = [0] * len(camels)
+        self.second_counts = [0] * len(camels)
+        self.win_counts = [0] * len(camels)
+        self.lose_counts = [0] * len(camels)
+        self.landing_sums = [0] * num_fields
+        self.landing_squared_sums = [0] * num_fields
+
+    def add_sample(self, round_ranking, race_ranking, landings):
+        """
+        Records one sampled future.
+        :param round_ranking: Camel indices ordered first to last at the end of the current round.
+        :param race_ranking: Camel indices ordered first to last at the end of the game, or None if the sample
+            stopped at the end of the round.
+        :param landings: List of fields camels landed on (before traps were applied) during the current round.
+        """
+        self.num_simulations += 1
+        self.first_counts[round_ranking[0]] += 1
+        self.second_counts[round_ranking[1]] += 1
+        if race_ranking is not None:
+            self.win_counts[race_ranking[0]] += 1
+            self.lose_counts[race_ranking[-1]] += 1
+        landing_counts = {}
+        for field in landings:
+            landing_counts[field] = landing_counts.get(field, 0) + 1
+        for field, count in landing_counts.items():
+            self.landing_sums[field] += count
+            self.landing_squared_sums[field] += count ** 2
+
+    def merge(self, other):
+        """
+        Adds the samples of another estimate of the same board.
+        :param other: DecisionEstimate.
+        :return: The DecisionEstimate.
+        """
+        self.num_simulations += other.num_simulations
+        for counts, other_counts in ((self.first_counts, other.first_counts),
+                                     (self.second_counts, other.second_counts),
+                                     (self.win_counts, other.win_counts),
+                                     (self.lose_counts, other.lose_counts),
+                                     (self.landing_sums, other.landing_sums),
+                                     (self.landing_squared_sums, other.landing_squared_sums)):
+            for i, count in enumerate(other_counts):
+                counts[i] += count
+        return self
+
+    def round_probabilities(self):
+        """
+        :return: A dictionary with probabilities for each camel finishing first or second, see simulate_round().
+        """
+        n = max(self.num_simulations, 1)
+        return {camel: {"first": self.first_counts[i] / n, "second": self.second_counts[i] / n}
+                for i, camel in enumerate(self.camels)}
+
+    def race_probabilities(self):
+        """
+        :return: A dictionary with probabilities for each camel winning or losing the game, see simulate_race().
+        """
+        if self.known_race_probabilities is not None:
+            return self.known_race_probabilities
+        n = max(self.num_simulations, 1)
+        return {camel: {"win": self.win_counts[i] / n, "lose": self.lose_counts[i] / n}
+                for i, camel in enumerate(self.camels)}
+
+    def trap_landings(self):
+        """
+        :return: List with the expected number of camels landing on each field during the rest of the round.
+        """
+        n = max(self.num_simulations, 1)
+        return [total / n for total in self.landing_sums]
+
+    def trap_ev(self, game_state, active_player, trap_position):
+        """
+        Expected coins from moving the active player's trap to trap_position. Every camel landing on the trap pays one
+        coin, so this is the expected number of landings on the new field minus the landings the player's current trap
+        would have collected. The effect of the trap on the round ranking is not included.
+        :param game_state: The current game state.
+        :param active_player: The player placing the trap.
+        :param trap_position: The field to place the trap on.
+        :return: Expected value of the trap move.
+        """
+        landings = self.trap_landings()
+        ev = landings[trap_position]
+        for field, trap in enumerate(game_state.trap_track):
+            if trap and trap[1] == active_player:
+                ev -= landings[field]
+        return ev
+
+    def action_values(self, game_state, active_player, moves, trap_map=None):
+        """
+        Expected value and standard error of every move. Round and game bets have three mutually exclusive outcomes,
+        so their variance follows directly from the outcome probabilities.
+        :param game_state: The current game state.
+        :param active_player: The player making the decision.
+        :param moves: List of moves to evaluate, e.g. from get_valid_moves().
+        :param trap_map: Optional result of trap_landing_map(). Its exact trap EVs are used instead of the sampled
+            landing counts.
+        :return: A dictionary mapping every move to a tuple (ev, standard_error).
+        """
+        n = max(self.num_simulations, 1)
+        round_probabilities = self.round_probabilities()
+        race_probabilities = self.race_probabilities()
+
+        def value_and_error(outcomes):
+            ev = sum(probability * value for probability, value in outcomes)
+            variance = max(sum(probability * value ** 2 for probability, value in outcomes) - ev ** 2, 0)
+            return ev, np.sqrt(variance / n)
+
+        values = {}
+        for move in moves:
+            if move[0] == ROUND_BET_ACTION_ID:
+                camel = move[1]
+                prob_first = round_probabilities[camel]["first"]
+                prob_second = round_probabilities[camel]["second"]
+                values[move] = value_and_error([
+                    (prob_first, get_round_bet_payout(game_state, camel, place=1)),
+                    (prob_second, get_round_bet_payout(game_state, camel, place=2)),
+                    (1 - prob_first - prob_second, get_round_bet_payout(game_state, camel, place=3))])
+
+            elif move[0] == MOVE_CAMEL_ACTION_ID:
+                values[move] = (calculate_rolling_ev(), 0)
+
+            elif move[0] == GAME_BET_ACTION_ID:
+                _, bet_type, camel = move
+                inv_bet_type = 'lose' if bet_type == 'win' else 'win'
+                prob_correct = race_probabilities[camel][bet_type]
+                prob_inv_true = race_probabilities[camel][inv_bet_type]
+                if self.known_race_probabilities is not None:
+                    values[move] = (calculate_race_bet_ev(game_state, race_probabilities, camel, bet_type),
+                                    calculate_race_bet_standard_error(game_state, race_probabilities, camel, bet_type))
+                    continue
+                values[move] = value_and_error([
+                    (prob_correct, get_race_bet_payout(game_state, camel, bet_type)),
+                    (prob_inv_true, -get_race_bet_payout(game_state, camel, inv_bet_type)),
+                    (1 - prob_correct - prob_inv_true, -1)])
+
+            elif move[0] == MOVE_TRAP_ACTION_ID:
+                _, trap_type, trap_position = move
+                if trap_map is not None:
+                    values[move] = (trap_map[(trap_type, trap_position)]["payout"], 0)
+                else:
+                    mean = self.landing_sums[trap_position] / n
+                    variance = max(self.landing_squared_sums[trap_position] / n - mean ** 2, 0)
+                    values[move] = (self.trap_ev(game_state, active_player, trap_position), np.sqrt(variance / n))
+        return values
+
+
+def is_decision_clear(values, tolerance=None, separation=None):
+    """
+    Tests whether action values are precise enough to stop sampling.
+    :param values: Dictionary mapping moves to tuples (ev, standard_error), see DecisionEstimate.action_values().
+    :param tolerance: Absolute EV tolerance: every standard error must be at most this value.
+    :param separation: The best move must lead the runner-up by at least this many standard errors of the gap.
+    :return: True if one of the given targets is met.
+    """
+    if tolerance is not None and max(error for _, error in values.values()) <= tolerance:
+        return True
+    if separation is not None and len(values) > 1:
+        (best_ev, best_error), (second_ev, second_error) = sorted(values.values(), key=lambda v: v[0])[-1:-3:-1]
+        gap_error = np.sqrt(best_error ** 2 + second_error ** 2)
+        return best_ev - second_ev >= separation * gap_error
+    return False
+
+
+def best_move(moves, values):
+    """
+    Picks the move with the highest EV. The confidence is the normal-approximation probability that the best move
+    really has a higher EV than the runner-up; it is 1 when the leader is exact or there is no runner-up.
+    :param moves: List of valid moves.
+    :param values: Dictionary mapping moves to tuples (ev, standard_error).
+    :return: A tuple (move, ev, confidence).
+    """
+    best = None
+    best_ev = float('-inf')
+    for move in moves:
+        if move in values and values[move][0] > best_ev:
+            best, best_ev = move, values[move][0]
+    if best is None:
+        return (0,), calculate_rolling_ev(), 1.0
+
+    runner_up = [value for move, value in values.items() if move != best]
+    if not runner_up:
+        return best, best_ev, 1.0
+    second_ev, second_error = max(runner_up, key=lambda value: value[0])
+    gap_error = math.sqrt(values[best][1] ** 2 + second_error ** 2)
+    if gap_error == 0:
+        return best, best_ev, 1.0 if best_ev > second_ev else 0.5
+    confidence = 0.5 * (1 + math.erf((best_ev - second_ev) / (gap_error * math.sqrt(2))))
+    return best, best_ev, confidence
+
+
+def sample_future(start_board, estimate):
+    """
+    Plays one future from start_board and records it in estimate. The future ends with the game, or with the round if
+    the estimate already knows the race probabilities.
+    :param start_board: fastboard.Board object. It is not modified.
+    :param estimate: DecisionEstimate receiving the sample.
+    """
+    board = start_board.copy()
+    landings = []
+    play_plan(board, sample_round_plan(board), lambda landing, trap_owner: landings.append(landing))
+    round_ranking = board.ranking()
+    race_ranking = None
+    if estimate.known_race_probabilities is None:
+        race_ranking = play_to_end(board).ranking()
+    estimate.add_sample(round_ranking, race_ranking, landings)
+
+
+def sample_futures(start_board, camels, num_fields, known_race_probabilities, num_simulations, seed=None):
+    """
+    Samples futures into a new DecisionEstimate. This is the unit of work a workerpool.WorkerPool runs per worker.
+    :param start_board: fastboard.Board object. It is not modified.
+    :param camels: List of camel IDs.
+    :param num_fields: Length of the camel track.
+    :param known_race_probabilities: Optional known race probabilities, see DecisionEstimate.
+    :param num_simulations: Number of futures to sample.
+    :param seed: Optional seed for the random streams of this process.
+    :return: A DecisionEstimate.
+    """
+    if seed is not None:
+        seed_worker(seed)
+    estimate = DecisionEstimate(camels, num_fields, known_race_probabilities)
+    for _ in range(num_simulations):
+        sample_future(start_board, estimate)
+    return estimate
+
+
+def simulate_decision(game_state, active_player, num_simulations=1000, tolerance=None, separation=None,
+                      chunk_size=100, min_simulations=100, trap_map=None, race_probabilities=None):
+    """
+    Samples up to num_simulations futures once and collects everything a greedy decision needs from them: round
+    first/second probabilities, race winner/loser probabilities and per-field trap landing counts.
+
+    Without a precision target all num_simulations futures are sampled. With a tolerance and/or separation (see
+    is_decision_clear()), futures are sampled in chunks and sampling stops as soon as the decision is clear, so
+    obvious decisions cost a fraction of the budget.
+    :param game_state: The current game state.
+    :param active_player: The player making the decision.
+    :param num_simulations: Number of sampled futures, or the maximum number with a precision target.
+    :param tolerance: Optional absolute EV tolerance.
+    :param separation: Optional number of standard errors by which the best move must lead the runner-up.
+    :param chunk_size: Number of futures sampled between precision checks.
+    :param min_simulations: Number of futures sampled before precision is checked for the first time.
+    :param trap_map: Optional result of trap_landing_map() used to value trap moves during precision checks.
+    :param race_probabilities: Optional known race probabilities, e.g. from lookup_race_probabilities(). Futures then
+        stop at the end of the current round.
+    :return: A DecisionEstimate.
+    """
+    decision = AnytimeDecision(game_state, active_player, trap_map=trap_map, race_probabilities=race_probabilities)
+    decision.run(sample_budget=num_simulations, tolerance=tolerance, separation=separation, chunk_size=chunk_size,
+                 min_simulations=min_simulations)
+    return decision.estimate
+
+
+class AnytimeDecision:
+    """
+    A greedy decision that is refined progressively. Futures are sampled in chunks into a DecisionEstimate, and the
+    current best move and the confidence in it can be read at any time, so the same code serves quick low-budget
+    tournaments and slow high-budget evaluation matches.
+
+    With a cache, the estimate is shared with every other decision on the same board. Bets never move camels, so a
+    decision made right after another player's bet starts from all the futures already sampled for the previous
+    decision and only samples more if its own moves still need them.
+    """
+    def __init__(self, game_state, active_player, trap_map=None, race_probabilities=None, cache=None, pool=None):
+        """
+        :param game_state: The current game state.
+        :param active_player: The player making the decision.
+        :param trap_map: Optional result of trap_landing_map(). Without it trap moves are valued from the sampled
+            landing counts.
+        :param race_probabilities: Optional known race probabilities, see simulate_decision().
+        :param cache: Optional evalcache.EvaluationCache holding the DecisionEstimate of every board.
+        :param pool: Optional workerpool.WorkerPool. Every refinement is then split between its workers.
+        """
+        self.game_state = game_state
+        self.active_player = active_player
+        self.trap_map = trap_map
+        self.cache = cache
+        self.pool = pool
+        self.moves = get_valid_moves(game_state, active_player)
+        self.start_board = Board.from_game_state(game_state)
+
+        def new_estimate():
+            return DecisionEstimate(game_state.CAMELS, len(game_state.camel_track), race_probabilities)
+
+        self.key = ("decision", self.start_board.key(), race_probabilities is not None)
+        if cache is None:
+            self.estimate = new_estimate()
+        else:
+            self.estimate = cache.get_or_create(self.key, new_estimate)
+
+    def refine(self, num_simulations):
+        """
+        Samples more futures.
+        :param num_simulations: Number of futures to add.
+        :return: The AnytimeDecision.
+        """
+        if self.cache is None and self.pool is None:
+            for _ in range(num_simulations):
+                sample_future(self.start_board, self.estimate)
+            return self
+
+        # Sample outside the lock so that concurrent games sharing the estimate only wait for the merge
+        args = (self.start_board, self.estimate.camels, len(self.estimate.landing_sums),
+                self.estimate.known_race_probabilities)
+        if self.pool is None:
+            parts = [sample_futures(*args, num_simulations)]
+        else:
+            parts = self.pool.split(sample_futures, num_simulations, *args)
+        with self.cache.lock if self.cache is not None else contextlib.nullcontext():
+            for samples in parts:
+                self.estimate.merge(samples)
+        return self
+
+    def values(self):
+        """
+        :return: A dictionary mapping every valid move to a tuple (ev, standard_error).
+        """
+        return self.estimate.action_values(self.game_state, self.active_player, self.moves, self.trap_map)
+
+    def best(self):
+        """
+        The current best move, see best_move().
+        :return: A tuple (move, ev, confidence).
+        """
+        return best_move(self.moves, self.values())
+
+    def run(self, deadline=None, sample_budget=None, tolerance=None, separation=None, chunk_size=100,
+            min_simulations=100):
+        """
+        Refines the decision chunk by chunk until the deadline passes, the sample budget is used up or the decision
+        is clear (see is_decision_clear()). With only a deadline, at least one chunk is sampled.
+        :param deadline: Optional point in time (time.perf_counter()) by which to stop.
+        :param sample_budget: Optional maximum total number of sampled futures.
+        :param tolerance: Optional absolute EV tolerance.
+        :param separation: Optional number of standard errors by which the best move must lead the runner-up.
+        :param chunk_size: Number of futures sampled between checks.
+        :param min_simulations: Number of futures sampled before precision is checked for the first time.
+        :return: The AnytimeDecision.
+        """
+        if deadline is None and sample_budget is None:
+            raise ValueError("A deadline or a sample budget is required")
+        while sample_budget is None or self.estimate.num_simulations < sample_budget:
+            if sample_budget is None:
+                self.refine(chunk_size)
+            else:
+                self.refine(min(chunk_size, sample_budget - self.estimate.num_simulations))
+            if deadline is not None and time.perf_counter() >= deadline:
                 break
-            roll_id = (0,)
-            state = transition(state, current_player, roll_id)
-            current_player = (current_player + 1) % state.NUM_PLAYERS
-        money_no_trap += state.player_money_values[active_player]
-        
-    avg_money_no_trap =  money_no_trap / (num_simulations // 2)
-    
-    #adding trap
-    
-    current_player = active_player
-    money_with_trap = 0
-    state = game_state
-    start_state_with_trap = transition(state, current_player, (MOVE_TRAP_ACTION_ID, trap_type, trap_position))
-    for _ in range(num_simulations // 2):
-        state = start_state_with_trap
-        round_start = False
-        if all(state.camel_yet_to_move):
-            round_start = True
-        while round_start or not all(state.camel_yet_to_move):  # Continue until all camels have moved
-            round_start = False
-            if not state.active_game:
+            if (tolerance is not None or separation is not None) and \
+                    self.estimate.num_simulations >= min_simulations and \
+                    is_decision_clear(self.values(), tolerance, separation):
                 break
-            roll_id = (0,)
-            state = transition(state, current_player, roll_id)
-            current_player = (current_player + 1) % state.NUM_PLAYERS
-        money_with_trap += state.player_money_values[active_player]
-        
-    avg_money_with_trap =  money_with_trap / (num_simulations // 2)
-    
-    return avg_money_with_trap - avg_money_no_trap
+        if self.cache is not None:
+            self.cache.persist(self.key)
+        return self
 
-# END TRAPS
+def ponder_decision(game_state, active_player, cache, sample_budget, stopped, exact_traps=True, chunk_size=100):
+    """
+    Prepares a player's next decision in the background. Bets of the other players do not change the board, so the
+    current board is the one the player is most likely to face; its trap map and DecisionEstimate are computed into
+    the cache, where AnytimeDecision picks them up.
+    :param game_state: The player's copy of the current game state.
+    :param active_player: The player who will make the decision.
+    :param cache: evalcache.EvaluationCache receiving the results.
+    :param sample_budget: Number of futures to sample for the board in total.
+    :param stopped: Callable returning True once the work should be abandoned.
+    :param exact_traps: Whether to compute the trap map as well.
+    :param chunk_size: Number of futures sampled between checks of stopped().
+    """
+    if exact_traps:
+        trap_landing_map(game_state, active_player, cache=cache)
+    if stopped():
+        return
+    decision = AnytimeDecision(game_state, active_player, race_probabilities=lookup_race_probabilities(game_state),
+                               cache=cache)
+    while decision.estimate.num_simulations < sample_budget and not stopped():
+        decision.refine(min(chunk_size, sample_budget - decision.estimate.num_simulations))
+    cache.persist(decision.key)
+
+# END SHARED DECISION ESTIMATE
+
+# RACING
+
+class RacingStatistics:
+    """
+    Per-move sample sums of a RacingDecision. Parts sampled by different workers are merged, and the statistics of
+    a position can be kept in an evaluation cache.
+    """
+    def __init__(self):
+        self.num_simulations = 0
+        self.rollouts = 0
+        self.counts = {}
+        self.sums = {}
+        self.squared_sums = {}
+
+    def add(self, move, value):
+        """
+        Records the value of a move in one sampled future.
+        """
+        self.counts[move] = self.counts.get(move, 0) + 1
+        self.sums[move] = self.sums.get(move, 0.0) + value
+        self.squared_sums[move] = self.squared_sums.get(move, 0.0) + value ** 2
+
+    def merge(self, other):
+        """
+        Adds the samples of other statistics of the same position.
+        :param other: RacingStatistics.
+        :return: The RacingStatistics.
+        """
+        self.num_simulations += other.num_simulations
+        self.rollouts += other.rollouts
+        for move, count in other.counts.items():
+            self.counts[move] = self.counts.get(move, 0) + count
+            self.sums[move] = self.sums.get(move, 0.0) + other.sums[move]
+            self.squared_sums[move] = self.squared_sums.get(move, 0.0) + other.squared_sums[move]
+        return self
+
+
+def racing_move_value(game_state, active_player, move, round_ranking, race_ranking, plan, baseline, trap_board):
+    """
+    :return: The value of a move in one sampled future, see RacingDecision.
+    """
+    if move[0] == ROUND_BET_ACTION_ID:
+        place = round_ranking.index(game_state.CAMELS.index(move[1])) + 1
+        return get_round_bet_payout(game_state, move[1], min(place, 3))
+    if move[0] == GAME_BET_ACTION_ID:
+        _, bet_type, camel = move
+        camel_index = game_state.CAMELS.index(camel)
+        won = race_ranking[0] == camel_index if bet_type == "win" else race_ranking[-1] == camel_index
+        inverse = race_ranking[-1] == camel_index if bet_type == "win" else race_ranking[0] == camel_index
+        if won:
+            return get_race_bet_payout(game_state, camel, bet_type)
+        if inverse:
+            return -get_race_bet_payout(game_state, camel, "lose" if bet_type == "win" else "win")
+        return -1
+    return round_earnings(game_state, active_player, trap_board, plan) - baseline
+
+
+def race_futures(game_state, active_player, start_board, trap_boards, moves, num_simulations, seed=None):
+    """
+    Evaluates moves on new sampled futures. This is the unit of work a workerpool.WorkerPool runs per worker.
+    :param game_state: The current game state.
+    :param active_player: The player making the decision.
+    :param start_board: fastboard.Board object of the game state. It is not modified.
+    :param trap_boards: Dictionary mapping trap moves to the board with the trap placed, see trap_boards().
+    :param moves: List of moves to evaluate.
+    :param num_simulations: Number of futures to sample.
+    :param seed: Optional seed for the random streams of this process.
+    :return: A RacingStatistics.
+    """
+    if seed is not None:
+        seed_worker(seed)
+    statistics = RacingStatistics()
+    needs_race = any(move[0] == GAME_BET_ACTION_ID for move in moves)
+    # Trap moves are measured against the same future without the move (common random numbers)
+    needs_traps = any(move[0] == MOVE_TRAP_ACTION_ID for move in moves)
+    for _ in range(num_simulations):
+        board = start_board.copy()
+        plan = sample_round_plan(board)
+        coins = []
+        statistics.rollouts += 1
+        play_plan(board, plan, lambda landing, trap_owner: coins.append(1) if trap_owner == active_player else None)
+        round_ranking = board.ranking()
+        baseline = len(coins) + settle_round_bets(game_state, active_player, round_ranking) if needs_traps else 0
+        race_ranking = None
+        if needs_race:
+            statistics.rollouts += 1
+            race_ranking = play_to_end(board).ranking()
+        for move in moves:
+            if move[0] == MOVE_TRAP_ACTION_ID:
+                statistics.rollouts += 1
+            statistics.add(move, racing_move_value(game_state, active_player, move, round_ranking, race_ranking, plan,
+                                                   baseline, trap_boards.get(move)))
+    statistics.num_simulations += num_simulations
+    return statistics
+
+
+class RacingDecision:
+    """
+    A greedy decision made by successive elimination. Futures are sampled in rounds, and every sampled future is only
+    evaluated for the moves still in the race: a trap move costs a replay of the round on the board with the trap and
+    a game bet costs playing the future to the end of the game. After every round, moves whose upper confidence bound
+    falls below the leader's lower confidence bound are dropped, so dominated trap cells and hopeless game bets stop
+    costing rollouts early, and the race ends as soon as one move is left.
+
+    Values are known in advance where possible (rolling, traps with a trap map, game bets with known race
+    probabilities) and such moves take part in the race without costing any rollouts. Game bets keep the standard
+    error of the race probabilities they were computed from.
+    """
+    def __init__(self, game_state, active_player, trap_map=None, race_probabilities=None, cache=None, pool=None):
+        """
+        :param game_state: The current game state.
+        :param active_player: The player making the decision.
+        :param trap_map: Optional result of trap_landing_map(), giving exact trap values.
+        :param race_probabilities: Optional known race probabilities (with standard errors, see simulate_race()),
+            giving game bet values.
+        :param cache: Optional evalcache.EvaluationCache holding the RacingStatistics of every position. Move values
+            depend on the bets and trap owners as well as the board, so the key covers them and the active player.
+        :param pool: Optional workerpool.WorkerPool. Every refinement is then split between its workers.
+        """
+        self.game_state = game_state
+        self.active_player = active_player
+        self.cache = cache
+        self.pool = pool
+        self.moves = get_valid_moves(game_state, active_player)
+        self.start_board = Board.from_game_state(game_state)
+        self.known = {}
+        for move in self.moves:
+            if move[0] == MOVE_CAMEL_ACTION_ID:
+                self.known[move] = (calculate_rolling_ev(), 0)
+            elif move[0] == MOVE_TRAP_ACTION_ID and trap_map is not None:
+                self.known[move] = (trap_map[move[1:]]["payout"], 0)
+            elif move[0] == GAME_BET_ACTION_ID and race_probabilities is not None:
+                _, bet_type, camel = move
+                self.known[move] = (calculate_race_bet_ev(game_state, race_probabilities, camel, bet_type),
+                                    calculate_race_bet_standard_error(game_state, race_probabilities, camel, bet_type))
+        self.survivors = list(self.moves)
+        trap_moves = [move for move in self.moves if move[0] == MOVE_TRAP_ACTION_ID and move not in self.known]
+        self.trap_boards = dict(zip(trap_moves, trap_boards(self.start_board, active_player,
+                                                            [move[1:] for move in trap_moves])))
+
+        self.key = ("racing", self.start_board.key(), active_player,
+                    tuple((field, trap[1]) for field, trap in enumerate(game_state.trap_track) if trap),
+                    tuple(map(tuple, game_state.round_bets)), tuple(map(tuple, game_state.game_winner_bets)),
+                    tuple(map(tuple, game_state.game_loser_bets)), trap_map is not None,
+                    race_probabilities is not None)
+        if cache is None:
+            self.statistics = RacingStatistics()
+        else:
+            self.statistics = cache.get_or_create(self.key, RacingStatistics)
+
+    @property
+    def num_simulations(self):
+        return self.statistics.num_simulations
+
+    @property
+    def rollouts(self):
+        return self.statistics.rollouts
+
+    def refine(self, num_simulations):
+        """
+        Evaluates the surviving sampled moves on more futures.
+        :param num_simulations: Number of futures to add.
+        :return: The RacingDecision.
+        """
+        args = (self.game_state, self.active_player, self.start_board, self.trap_boards,
+                [move for move in self.survivors if move not in self.known])
+        # Sample outside the lock so that concurrent games sharing the statistics only wait for the merge
+        if self.pool is None:
+            parts = [race_futures(*args, num_simulations)]
+        else:
+            parts = self.pool.split(race_futures, num_simulations, *args)
+        with self.cache.lock if self.cache is not None else contextlib.nullcontext():
+            for part in parts:
+                self.statistics.merge(part)
+        return self
+
+    def values(self):
+        """
+        :return: A dictionary mapping every valid move to a tuple (ev, standard_error). Eliminated moves keep the
+            values they had when they were dropped.
+        """
+        values = {}
+        for move in self.moves:
+            n = self.statistics.counts.get(move, 0)
+            if move in self.known:
+                values[move] = self.known[move]
+            elif n == 0:
+                values[move] = (0, float('inf'))
+            else:
+                mean = self.statistics.sums[move] / n
+                variance = max(self.statistics.squared_sums[move] / n - mean ** 2, 0) * n / max(n - 1, 1)
+                values[move] = (mean, math.sqrt(variance / n))
+        return values
+
+    def eliminate(self, confidence):
+        """
+        Drops the moves whose upper confidence bound is below the leader's lower confidence bound.
+        :param confidence: Width of the confidence bounds in standard errors.
+        """
+        values = self.values()
+        best_lower = max(values[move][0] - confidence * values[move][1] for move in self.survivors)
+        self.survivors = [move for move in self.survivors
+                          if values[move][0] + confidence * values[move][1] >= best_lower]
+
+    def best(self):
+        """
+        The best surviving move, see best_move().
+        :return: A tuple (move, ev, confidence).
+        """
+        values = self.values()
+        return best_move(self.survivors, {move: values[move] for move in self.survivors})
+
+    def run(self, deadline=None, sample_budget=None, confidence=3, chunk_size=50, min_simulations=50):
+        """
+        Races the moves until one is left, the deadline passes or the sample budget is used up.
+        :param deadline: Optional point in time (time.perf_counter()) by which to stop.
+        :param sample_budget: Optional maximum total number of sampled futures.
+        :param confidence: Width of the confidence bounds in standard errors.
+        :param chunk_size: Number of futures sampled per round of the race.
+        :param min_simulations: Number of futures sampled before the first elimination.
+        :return: The RacingDecision.
+        """
+        if deadline is None and sample_budget is None:
+            raise ValueError("A deadline or a sample budget is required")
+        self.eliminate(confidence)
+        while len(self.survivors) > 1 and any(move not in self.known for move in self.survivors):
+            if sample_budget is not None and self.num_simulations >= sample_budget:
+                break
+            if sample_budget is None:
+                self.refine(chunk_size)
+            else:
+                self.refine(min(chunk_size, sample_budget - self.num_simulations))
+            if self.num_simulations >= min_simulations:
+                self.eliminate(confidence)
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        if self.cache is not None:
+            self.cache.persist(self.key)
+        return self
+
+# END RACING
 
 def transition(state : GameState, player, action):
         """
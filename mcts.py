@@ -1,18 +1,43 @@
 import numpy as np
-from camelup import get_valid_moves, GameState, move_camel, move_trap, place_round_winner_bet, place_game_bet
+from camelup import get_valid_moves, sample_valid_move, GameState, move_camel, move_trap, place_round_winner_bet, \
+    place_game_bet
 from actionids import *
 import copy
 import time
+import sys
+import random
+import threading
+import warnings
+import functools
+import contextlib
+from workerpool import seed_worker
+from batchrollout import batch_rollouts
+from fastboard import Board
+from exactround import enumerate_round
+from evalcache import shared_cache
+from racetable import estimate_race
+from greedy import lookup_race_probabilities, get_round_bets_value
 
 class MCTSNode:
-    def __init__(self, state: GameState, ptm=None, parent=None, action=None):
+    def __init__(self, state: GameState, ptm=None, parent=None, action=None, chance=False):
+        """
+        :param state: GameState of the node. A chance node shares the state before the roll with its parent.
+        :param ptm: The player to move; for a chance node, the player who rolls.
+        :param parent: Parent node.
+        :param action: The action leading to the node.
+        :param chance: Whether the node is a roll whose outcomes, the camel and the dice, are its children.
+        """
         self.state = state
         self.parent = parent
         self.children = []
         self.visits = 0 
-        self.value = 0
+        self.value = 0  # Wins of the player who chose the action leading to this node
         self.player_to_move = ptm
         self.action = action
+        self.chance = chance
+        self.outcomes = {}  # Children of a chance node by (camel_index, roll)
+        self.virtual_loss = 0  # Rollouts of concurrent searches still running below this node, counted as losses
+        self.stubs = None  # With progressive widening: actions without a child yet, best prior last
 
     def __repr__(self):
         return str(self)
@@ -20,28 +45,301 @@ class MCTSNode:
     def __str__(self):
         return f"Node: {self.state} \nVisits: {self.visits} \nValue: {self.value} \nParent: {self.parent}"
 
+LEAF_TEMPERATURE = 6  # Coins by which a lead multiplies the odds of winning by e, fit to random rollouts
+RACE_SIMULATIONS = 8  # Race playouts per leaf evaluation without a race table
+
+
+def random_rollout(state, current_player, seed=None, category_weights=None, cutoff=None):
+    """
+    Plays random moves from the given state until the game ends, or until a cutoff where evaluate_leaf() scores the
+    position. The moves are drawn by camelup.sample_valid_move() and applied to a single copy of the state.
+    :param state: GameState to start from. It is not modified.
+    :param current_player: The player to move.
+    :param seed: Optional seed for the random streams of this process, used when the rollout runs in a worker.
+    :param category_weights: Optional weights of the move categories, see camelup.sample_valid_move(). By default,
+        every valid move is equally likely.
+    :param cutoff: Optional cutoff: "round" to stop at the end of the current round, or a number of moves.
+    :return: Vector with a 1 for the winning player and 0 for everyone else, or the winning chances of every player
+        at a cutoff.
+    """
+    if seed is not None:
+        seed_worker(seed)
+    state = MCTSAgent.copy_state(state)
+    num_moves = 0
+    while state.active_game:
+        if cutoff is not None and cutoff != "round" and num_moves >= cutoff:
+            return evaluate_leaf(state)
+        action = sample_valid_move(state, current_player, category_weights)
+        MCTSAgent.apply(state, current_player, action)
+        current_player = (current_player + 1) % state.NUM_PLAYERS
+        num_moves += 1
+        if cutoff == "round" and action[0] == MOVE_CAMEL_ACTION_ID and state.active_game and \
+                all(state.camel_yet_to_move):
+            return evaluate_leaf(state)
+
+    winner = np.argmax(state.player_money_values)
+    result = np.zeros(state.NUM_PLAYERS)
+    result[winner] = 1
+    return result
+
+
+def expected_coins(state, cache=None):
+    """
+    The coins every player can expect once the outstanding bets are settled: the current coins, plus the round bets
+    valued with the exact probabilities of the rest of the round, plus the game bets valued with the race
+    probabilities of a race table (see racetable.py) or, without one, of RACE_SIMULATIONS fast playouts. Leaf boards
+    almost never repeat, so the playouts are not cached; the coins are linear in the race probabilities, which keeps
+    the estimate unbiased however few playouts it uses. Game bets are settled like camelup.end_of_game(), which skips
+    hidden bets and those of player 0.
+    :param state: GameState of a running game.
+    :param cache: evalcache.EvaluationCache for the round probabilities, by default the shared cache.
+    :return: Array with the expected coins of every player.
+    """
+    cache = cache if cache is not None else shared_cache()
+    coins = np.array(state.player_money_values, dtype=float)
+    board = Board.from_game_state(state)
+    if state.round_bets:
+        outcome = cache.get_or_create(("exact round", board.key()), lambda: enumerate_round(board))
+        for player in range(state.NUM_PLAYERS):
+            coins[player] += get_round_bets_value(state, player, outcome)
+    if state.game_winner_bets or state.game_loser_bets:
+        race = lookup_race_probabilities(state)
+        if race is None:
+            win, lose = estimate_race(board, RACE_SIMULATIONS)
+            race = {camel: {"win": win[i], "lose": lose[i]} for i, camel in enumerate(state.CAMELS)}
+        for bet_type, bets in (("win", state.game_winner_bets), ("lose", state.game_loser_bets)):
+            num_bets = {}
+            for camel, player in bets:
+                if not camel or not player:
+                    continue
+                payout = state.get_game_bets_payout(num_bets.get(camel, 0))
+                num_bets[camel] = num_bets.get(camel, 0) + 1
+                coins[player] += race[camel][bet_type] * payout + (1 - race[camel][bet_type]) * state.BAD_GAME_END_BET
+    return coins
+
+
+def evaluate_leaf(state, cache=None, temperature=LEAF_TEMPERATURE):
+    """
+    Turns the expected coins of a running game (see expected_coins()) into winning chances with a softmax: a player
+    with a lead of temperature coins is e times as likely to win as the player behind.
+    :param state: GameState of a running game.
+    :param cache: Optional evalcache.EvaluationCache, see expected_coins().
+    :param temperature: Softness of the softmax in coins.
+    :return: Vector with the winning chance of every player.
+    """
+    coins = expected_coins(state, cache)
+    weights = np.exp((coins - coins.max()) / temperature)
+    return weights / weights.sum()
+
+
+def action_prior(state, player, action):
+    """
+    A cheap guess at the worth of an action, used to order the children of a node under progressive widening: a
+    roll's coin, round bets by the payout of the next ticket and the place of the camel, traps by how close they lie in
+    front of a camel, and game bets on the leader to win or the last camel to lose.
+    :param state: GameState the action is taken in.
+    :param player: Player taking the action.
+    :param action: The action.
+    :return: A number, higher for more promising actions.
+    """
+    if action[0] == MOVE_CAMEL_ACTION_ID:
+        return 1
+    if action[0] == MOVE_TRAP_ACTION_ID:
+        distances = [action[2] - field for field, stack in enumerate(state.camel_track[:action[2]]) if stack]
+        return 0.5 / min(distances) if distances and min(distances) <= state.MOVE_RANGE[1] else 0
+    ranking = [camel for stack in reversed(state.camel_track) for camel in reversed(stack)]
+    if action[0] == ROUND_BET_ACTION_ID:
+        num_bets = sum(1 for bet in state.round_bets if bet[0] == action[1])
+        return state.FIRST_PLACE_ROUND_PAYOUT[num_bets] / (ranking.index(action[1]) + 2)
+    _, bet_type, camel = action
+    return 0.5 if camel == (ranking[0] if bet_type == "win" else ranking[-1]) else 0.1
+
+
+def same_position(state, game_state):
+    """
+    Tests whether a state in the tree is the position of a game state. Game bets are compared by number only, since
+    other players' bets are hidden in a player's copy of the game state.
+    :param state: GameState in the tree.
+    :param game_state: GameState of the game.
+    :return: True if both describe the same position.
+    """
+    return (state.camel_track == game_state.camel_track and state.trap_track == game_state.trap_track and
+            state.camel_yet_to_move == game_state.camel_yet_to_move and state.round_bets == game_state.round_bets and
+            state.player_money_values == game_state.player_money_values and
+            len(state.game_winner_bets) == len(game_state.game_winner_bets) and
+            len(state.game_loser_bets) == len(game_state.game_loser_bets) and
+            state.active_game == game_state.active_game)
+
+
+@contextlib.contextmanager
+def seeded_streams(seed):
+    """
+    Runs a block on the random streams of a seed and restores the previous streams afterwards, so a seeded search
+    neither depends on nor disturbs the random numbers the game itself draws.
+    :param seed: Integer seed.
+    """
+    state, np_state = random.getstate(), np.random.get_state()
+    seed_worker(seed)
+    try:
+        yield
+    finally:
+        random.setstate(state)
+        np.random.set_state(np_state)
+
+
+def root_search(game_state, active_player, settings, seed):
+    """
+    One search of a root-parallel MCTS (see MCTSAgent.root_statistics()), run in a worker process.
+    :param game_state: The current GameState.
+    :param active_player: The ID of the active player.
+    :param settings: Keyword arguments of the MCTSAgent running the search, see MCTSAgent.settings().
+    :param seed: Seed of the random streams of this search.
+    :return: A dictionary mapping the action of every root child to a tuple (visits, wins).
+    """
+    seed_worker(seed)
+    agent = MCTSAgent(**settings)
+    root = MCTSNode(game_state, ptm=active_player)
+    agent.search(root)
+    return {child.action: (child.visits, child.value) for child in root.children}
+
+
+def most_visited(statistics):
+    """
+    :param statistics: Dictionary mapping actions to sequences starting with the visit count.
+    :return: The action with the most visits, ties broken at random.
+    """
+    actions = list(statistics)
+    np.random.shuffle(actions)
+    return max(actions, key=lambda action: statistics[action][0])
+
+
 class MCTSAgent:
-    def __init__(self, c=np.sqrt(2)):
+    DEFAULT_WALL_TIME = 2
+
+    def __init__(self, c=np.sqrt(2), pool=None, iterations=None, cpu_time=None, wall_time=None, seed=None,
+                 root_parallel=False, threads=None, batch=None, rollout_weights=None, widening=None,
+                 cutoff=None):
         """
-        Monte Carlo Tree Search Agent.
+        Monte Carlo Tree Search Agent. The search for a move stops as soon as the first of the given budgets is used
+        up; without any budget it runs for DEFAULT_WALL_TIME seconds. Wall time shrinks in effect when other work
+        shares the machine, CPU time much less so, and an iteration budget not at all.
         :param c: Exploration parameter for UCB.
+        :param pool: Optional workerpool.WorkerPool. The rollouts of every expansion are then spread over its workers.
+        :param iterations: Optional number of search iterations per move.
+        :param cpu_time: Optional CPU seconds of this process per move (time spent in pool workers is not counted).
+        :param wall_time: Optional wall-clock seconds per move.
+        :param seed: Optional seed for deterministic mode. Every move is then searched on its own random streams,
+            derived from the seed and the number of moves made so far. With an iteration budget, the same positions
+            produce the same moves on any machine and under any load.
+        :param root_parallel: With a pool, run one independent search per worker, each with its own seed and the
+            full budget, and merge their root statistics (see root_statistics()) instead of spreading the rollouts
+            of single expansions over the workers. No tree is kept between turns in this mode.
+        :param threads: Optional number of threads searching one shared tree, see tree_parallel_search(). Only
+            free-threaded Python builds run their rollouts in parallel; with the GIL, more than one thread only adds
+            overhead and a RuntimeWarning points to root_parallel instead. Seeded searches are not reproducible with
+            more than one thread, and threads cannot be combined with batch.
+        :param batch: Optional number of leaves to expand per wave of the search, see iterate_wave(). The rollouts of
+            all their children are then played in lockstep by batchrollout.batch_rollouts() instead of one by one.
+        :param rollout_weights: Optional weights of the move categories in rollouts, see random_rollout(). Batched
+            rollouts always draw every valid move with equal probability.
+        :param widening: Optional tuple (k, alpha) for progressive widening: a node then gets at most
+            ceil(k * visits ** alpha) children, one per expansion in the order of action_prior(), and a child's state
+            is only built when it is first visited. By default, an expansion builds and rolls out every child at once.
+        :param cutoff: Optional rollout cutoff, "round" or a number of moves, after which evaluate_leaf() scores the
+            position instead of playing on, see random_rollout(). Batched rollouts always play to the end.
         """
+        if threads is not None and threads > 1:
+            if batch is not None:
+                raise ValueError("threads and batch cannot be combined")
+            if gil_enabled():
+                warnings.warn("Tree-parallel search with {} threads runs one thread at a time while the GIL is "
+                              "enabled; use root_parallel with a worker pool for parallel rollouts".format(threads),
+                              RuntimeWarning, stacklevel=2)
         self.c = c
+        self.pool = pool
+        self.iterations = iterations
+        self.cpu_time = cpu_time
+        self.wall_time = wall_time if (iterations, cpu_time, wall_time) != (None, None, None) else \
+            self.DEFAULT_WALL_TIME
+        self.seed = seed
+        self.root_parallel = root_parallel
+        self.threads = threads
+        self.batch = batch
+        self.rollout_weights = rollout_weights
+        self.widening = widening
+        self.cutoff = cutoff
+        self.moves_made = 0
+        self.root = None
 
     def get_move(self, active_player, game_state):
         """
-        Executes the MCTS algorithm to determine the best move.
+        Executes the MCTS algorithm to determine the best move. If the tree kept from earlier turns (see advance())
+        already holds the current position, the search continues below it.
         :param active_player: The ID of the active player.
         :param game_state: The current GameState.
         :return: The best action to take.
         """
-        root = MCTSNode(game_state, ptm=active_player)
-        start_time = time.time()
-        while time.time() - start_time < 2:
-            leaf = self.select(root)
-            children = self.expand(leaf)
-            results = self.simulate(children)
-            self.backpropagate(children, results)
+        if self.root_parallel and self.pool is not None:
+            self.moves_made += 1
+            if self.seed is None:
+                return most_visited(self.root_statistics(active_player, game_state))
+            with seeded_streams(int(np.random.SeedSequence([self.seed, self.moves_made]).generate_state(1)[0])):
+                return most_visited(self.root_statistics(active_player, game_state))
+
+        if self.root is None or self.root.player_to_move != active_player or \
+                not same_position(self.root.state, game_state):
+            self.root = MCTSNode(game_state, ptm=active_player)
+        self.moves_made += 1
+        if self.seed is None:
+            return self.search(self.root)
+        with seeded_streams(int(np.random.SeedSequence([self.seed, self.moves_made]).generate_state(1)[0])):
+            return self.search(self.root)
+
+    def settings(self):
+        """
+        :return: The keyword arguments that configure a search on one tree: everything except the pool, the seed and
+            root parallelism. Root-parallel workers build their agents from them.
+        """
+        return {"c": self.c, "iterations": self.iterations, "cpu_time": self.cpu_time, "wall_time": self.wall_time,
+                "threads": self.threads, "batch": self.batch, "rollout_weights": self.rollout_weights,
+                "widening": self.widening, "cutoff": self.cutoff}
+
+    def root_statistics(self, active_player, game_state):
+        """
+        Runs one independent search per worker of the pool and merges the visits and wins of their root children.
+        :param active_player: The ID of the active player.
+        :param game_state: The current GameState.
+        :return: A dictionary mapping every action to a list [visits, wins] summed over all searches.
+        """
+        tasks = [(game_state, active_player, self.settings())] * self.pool.workers
+        statistics = {}
+        for result in self.pool.map(root_search, tasks):
+            for action, (visits, value) in result.items():
+                totals = statistics.setdefault(action, [0, 0])
+                totals[0] += visits
+                totals[1] += value
+        return statistics
+
+    def search(self, root):
+        """
+        Iterates until the budget of a move is used up.
+        :param root: Root node of the search.
+        :return: The action of the most visited child of the root.
+        """
+        start_time = time.perf_counter()
+        start_cpu_time = time.process_time()
+        if self.threads is not None and self.threads > 1:
+            self.tree_parallel_search(root, start_time, start_cpu_time)
+        else:
+            num_iterations = 0
+            while self.within_budget(start_time, start_cpu_time, num_iterations):
+                if self.batch is None:
+                    self.iterate(root)
+                    num_iterations += 1
+                    continue
+                leaves = self.batch if self.iterations is None else min(self.batch, self.iterations - num_iterations)
+                self.iterate_wave(root, leaves)
+                num_iterations += leaves
 
         most_visits = -1
         best_action = None
@@ -55,6 +353,110 @@ class MCTSAgent:
         # print(best_action)
         return best_action
 
+    def within_budget(self, start_time, start_cpu_time, num_iterations):
+        """
+        :param start_time: perf_counter() at the start of the search.
+        :param start_cpu_time: process_time() at the start of the search.
+        :param num_iterations: Number of iterations started so far.
+        :return: True if none of the budgets is used up.
+        """
+        return (self.iterations is None or num_iterations < self.iterations) and \
+            (self.cpu_time is None or time.process_time() - start_cpu_time < self.cpu_time) and \
+            (self.wall_time is None or time.perf_counter() - start_time < self.wall_time)
+
+    def tree_parallel_search(self, root, start_time, start_cpu_time):
+        """
+        Runs self.threads searches on the same tree until the budget is used up. Selection, expansion and
+        backpropagation hold a lock on the tree, the rollouts run concurrently. While its rollouts run, every new child
+        and its ancestors carry a virtual loss: an extra visit without a win, which steers the other threads to
+        different paths. The budgets count the iterations and CPU time of all threads together.
+        :param root: Root node of the search.
+        :param start_time: perf_counter() at the start of the search.
+        :param start_cpu_time: process_time() at the start of the search.
+        """
+        lock = threading.Lock()
+        num_iterations = [0]
+
+        def work():
+            while True:
+                with lock:
+                    if not self.within_budget(start_time, start_cpu_time, num_iterations[0]):
+                        return
+                    num_iterations[0] += 1
+                    leaf = self.select(root)
+                    children = self.expand(leaf)
+                    self.add_virtual_loss(children, 1)
+                results = self.simulate(children)
+                with lock:
+                    self.add_virtual_loss(children, -1)
+                    self.backpropagate(children, results)
+
+        workers = [threading.Thread(target=work) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    @staticmethod
+    def add_virtual_loss(children, amount):
+        """
+        Adds a virtual loss to the path from every child to the root.
+        :param children: Nodes whose rollouts are pending.
+        :param amount: 1 to add a virtual loss per child, -1 to remove it.
+        """
+        for child in children:
+            node = child
+            while node:
+                node.virtual_loss += amount
+                node = node.parent
+
+    def iterate(self, root):
+        """
+        Runs one iteration of the search: selection, expansion, simulation and backpropagation.
+        :param root: Root node of the search.
+        """
+        leaf = self.select(root)
+        children = self.expand(leaf)
+        results = self.simulate(children)
+        self.backpropagate(children, results)
+
+    def iterate_wave(self, root, leaves):
+        """
+        Runs a wave of iterations whose rollouts are played together: selects and expands a number of leaves, with a
+        virtual loss (see tree_parallel_search()) on every new child so the next selections spread over the tree,
+        then backpropagates the results of one batch of rollouts from all new children.
+        :param root: Root node of the search.
+        :param leaves: Number of leaves to expand, i.e. of iterations in the wave.
+        """
+        children = []
+        for _ in range(leaves):
+            new_children = self.expand(self.select(root))
+            self.add_virtual_loss(new_children, 1)
+            children.extend(new_children)
+        results = self.simulate(children)
+        self.add_virtual_loss(children, -1)
+        self.backpropagate(children, results)
+
+    def advance(self, action, game_state):
+        """
+        Moves the root of the kept tree to the child reached by an action that was actually played, so the search
+        done below it carries over to the next turn. For a roll, the new root is the outcome of the chance node that
+        matches the camel and dice that were actually drawn. Without a matching child the tree is dropped.
+        :param action: The move tuple that was played.
+        :param game_state: The game state after the move.
+        """
+        if self.root is None:
+            return
+        for child in self.root.children:
+            if child.action != action:
+                continue
+            for node in child.children if child.chance else [child]:
+                if same_position(node.state, game_state):
+                    node.parent = None
+                    self.root = node
+                    return
+        self.root = None
+
     def select(self, node : MCTSNode):
         """
         Select the child node to expand using the UCB1 formula.
@@ -64,28 +466,54 @@ class MCTSAgent:
         best_ucb = -float('inf')
         best_child = None
         while node.state.active_game and node.children:
-            if node.visits == 0 or not node.children:
+            if node.visits + node.virtual_loss == 0 or not node.children:
+                return node
+            if node.chance:
+                # Outcomes are drawn with their true probabilities, so the visits of a roll average over the dice
+                node, created = self.sample_outcome(node)
+                if created:
+                    return node
+                continue
+            if self.can_widen(node):
                 return node
             best_ucb = -float('inf')
             best_child = None
             for child in node.children:
-                UCB = child.value / child.visits + self.c * \
-                    np.sqrt(np.log(node.visits) / child.visits)
+                visits = child.visits + child.virtual_loss
+                UCB = child.value / visits + self.c * \
+                    np.sqrt(np.log(node.visits + node.virtual_loss) / visits)
                 if UCB > best_ucb:
                     best_ucb = UCB
                     best_child = child
             node = best_child
         return node
 
+    def can_widen(self, node):
+        """
+        :param node: A node with children.
+        :return: True if progressive widening lets the node open another child.
+        """
+        if self.widening is None or not node.stubs:
+            return False
+        k, alpha = self.widening
+        return len(node.children) < k * (node.visits + node.virtual_loss) ** alpha
+
     def expand(self, leaf : MCTSNode):
         """
-        Expands a node by adding a child for an unexplored action.
+        Expands a node by adding a child for every action, or, with progressive widening, for the action with the best
+        prior that has no child yet.
         :param leaf: Node to expand.
-        :return: Newly created child node.
+        :return: List of the newly created children to simulate from.
         """
         if not leaf.state.active_game:
-            return [leaf] 
-        
+            return [leaf]
+
+        if self.widening is not None:
+            if leaf.stubs is None:
+                leaf.stubs = sorted(get_valid_moves(leaf.state, leaf.player_to_move),
+                                    key=lambda action: action_prior(leaf.state, leaf.player_to_move, action))
+            return [self.open_child(leaf, leaf.stubs.pop())]
+
         actions = get_valid_moves(leaf.state, leaf.player_to_move)
         # min_non_none_index = min([i for i, track in enumerate(leaf.state.camel_track) if track])
         # max_non_none_index = max([i for i, track in enumerate(leaf.state.camel_track) if track])
@@ -97,19 +525,48 @@ class MCTSAgent:
         #             pruned_actions.append(action)
         #     else:
         #         pruned_actions.append(action)
-                    
-                    
+
         np.random.shuffle(actions)
-        children = []
-        for action in actions:
-            new_state = self.transition(leaf.state, leaf.player_to_move, action)
-            new_ptm = (leaf.player_to_move + 1) % leaf.state.NUM_PLAYERS
-            new_node = MCTSNode(new_state, ptm=new_ptm, parent=leaf, action=action)
-            leaf.children.append(new_node)
-            children.append(new_node)
-            new_node.parent = leaf
-            
-        return children
+        return [self.open_child(leaf, action) for action in actions]
+
+    def open_child(self, leaf, action):
+        """
+        Builds the child of an action. A roll gets a chance node with one sampled outcome below it.
+        :param leaf: Parent node.
+        :param action: The action leading to the child.
+        :return: The new node to simulate from, i.e. the outcome for a roll.
+        """
+        if action[0] == MOVE_CAMEL_ACTION_ID:
+            chance_node = MCTSNode(leaf.state, ptm=leaf.player_to_move, parent=leaf, action=action, chance=True)
+            leaf.children.append(chance_node)
+            new_node, _ = self.sample_outcome(chance_node)
+            return new_node
+        new_state = self.transition(leaf.state, leaf.player_to_move, action)
+        new_ptm = (leaf.player_to_move + 1) % leaf.state.NUM_PLAYERS
+        new_node = MCTSNode(new_state, ptm=new_ptm, parent=leaf, action=action)
+        leaf.children.append(new_node)
+        return new_node
+
+    def sample_outcome(self, chance_node):
+        """
+        Draws the camel and the dice roll of a chance node and returns the matching child, which is created when the
+        outcome is drawn for the first time.
+        :param chance_node: Chance node.
+        :return: A tuple (child, created).
+        """
+        state = chance_node.state
+        camels = [i for i, yet_to_move in enumerate(state.camel_yet_to_move) if yet_to_move]
+        roll = np.random.randint(state.MOVE_RANGE[0], state.MOVE_RANGE[1] + 1)
+        outcome = (camels[np.random.randint(len(camels))], roll)
+        child = chance_node.outcomes.get(outcome)
+        if child is not None:
+            return child, False
+        new_state = self.transition(state, chance_node.player_to_move, chance_node.action, outcome)
+        child = MCTSNode(new_state, ptm=(chance_node.player_to_move + 1) % state.NUM_PLAYERS, parent=chance_node,
+                         action=chance_node.action)
+        chance_node.outcomes[outcome] = child
+        chance_node.children.append(child)
+        return child, True
 
     def simulate(self, children):
         """
@@ -117,22 +574,12 @@ class MCTSAgent:
         :param node: Node to simulate from.
         :return: Simulation result (game outcome).
         """
-        results = []
-        for child in children:
-            state = child.state
-            current_player = child.player_to_move
-            while state.active_game:
-                actions = get_valid_moves(state, current_player)
-                actions = list(actions)
-                action = actions[np.random.randint(len(actions))]
-                state = self.transition(state, current_player, action)
-                current_player = (current_player + 1) % state.NUM_PLAYERS
-            
-            winner = np.argmax(state.player_money_values)
-            result = np.zeros(state.NUM_PLAYERS)
-            result[winner] = 1
-            results.append(result) 
-        return results
+        if self.batch is not None:
+            return batch_rollouts([child.state for child in children], [child.player_to_move for child in children])
+        rollout = functools.partial(random_rollout, category_weights=self.rollout_weights, cutoff=self.cutoff)
+        if self.pool is not None and len(children) > 1:
+            return self.pool.map(rollout, [(child.state, child.player_to_move) for child in children])
+        return [rollout(child.state, child.player_to_move) for child in children]
 
     def backpropagate(self, children, results):
         """
@@ -144,18 +591,30 @@ class MCTSAgent:
             node = child
             while node:
                 node.visits += 1 
-                if result[node.player_to_move] == 1:
-                    node.value += 1
+                if node.parent is not None:
+                    node.value += result[node.parent.player_to_move]
                 node = node.parent
 
-    def transition(self, state : GameState, player, action):
+    @staticmethod
+    def transition(state : GameState, player, action, outcome=None):
         """
         Applies an action to a GameState and returns the resulting state.
         :param state: Current GameState.
         :param player: Player performing the action.
         :param action: Action to apply.
+        :param outcome: Optional tuple (camel_index, roll) fixing the outcome of a roll.
         :return: New GameState after the action.
         """
+        new_state = MCTSAgent.copy_state(state)
+        MCTSAgent.apply(new_state, player, action, outcome)
+        return new_state
+
+    @staticmethod
+    def copy_state(state : GameState):
+        """
+        :param state: A GameState.
+        :return: An independent copy of the state, without its verbosity.
+        """
         new_state = GameState(
             num_camels=state.NUM_CAMELS,
             num_players=state.NUM_PLAYERS,
@@ -175,16 +634,59 @@ class MCTSAgent:
         new_state.game_loser_bets = copy.deepcopy(state.game_loser_bets)
         new_state.player_money_values = copy.deepcopy(state.player_money_values)
         new_state.camel_yet_to_move = copy.deepcopy(state.camel_yet_to_move)
+        return new_state
 
+    @staticmethod
+    def apply(state : GameState, player, action, outcome=None):
+        """
+        Applies an action to a GameState in place.
+        :param state: GameState to modify.
+        :param player: Player performing the action.
+        :param action: Action to apply.
+        :param outcome: Optional tuple (camel_index, roll) fixing the outcome of a roll.
+        """
         if action[0] == MOVE_CAMEL_ACTION_ID:
-            move_camel(new_state, player)
+            move_camel(state, player, *(outcome or ()))
         elif action[0] == MOVE_TRAP_ACTION_ID:
             _, trap_type, trap_location = action
-            move_trap(new_state, trap_type, trap_location, player)
+            move_trap(state, trap_type, trap_location, player)
         elif action[0] == ROUND_BET_ACTION_ID:
             _, camel = action
-            place_round_winner_bet(new_state, camel, player)
+            place_round_winner_bet(state, camel, player)
         elif action[0] == GAME_BET_ACTION_ID:
             _, bet_type, camel = action
-            place_game_bet(new_state, camel, bet_type, player)
-        return new_state
+            place_game_bet(state, camel, bet_type, player)
+
+
+def gil_enabled():
+    """
+    :return: False on free-threaded Python builds running without the GIL, True otherwise.
+    """
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled() if is_gil_enabled is not None else True
+
+
+def scaling_curve(game_state, active_player, thread_counts=(1, 2, 4), wall_time=2):
+    """
+    Measures the rollouts per second of tree-parallel search for a range of thread counts. A count of 1 runs the
+    plain single-threaded search, so the curve starts at the baseline it is compared against.
+    :param game_state: The GameState to search.
+    :param active_player: The ID of the active player.
+    :param thread_counts: Numbers of threads to measure.
+    :param wall_time: Wall-clock seconds of every search.
+    :return: A dictionary mapping every thread count to the number of rollouts per second.
+    """
+    curve = {}
+    for threads in thread_counts:
+        agent = MCTSAgent(wall_time=wall_time, threads=threads)
+        root = MCTSNode(game_state, ptm=active_player)
+        start_time = time.perf_counter()
+        agent.search(root)
+        curve[threads] = root.visits / (time.perf_counter() - start_time)
+    return curve
+
+
+if __name__ == "__main__":
+    thread_counts = [int(arg) for arg in sys.argv[1:]] or [1, 2, 4]
+    for threads, rate in scaling_curve(GameState(), 0, thread_counts).items():
+        print("{} threads: {:.0f} rollouts/s".format(threads, rate))
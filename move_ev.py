@@ -5,44 +5,20 @@ import random
 import copy
 from camelup import GameState, summarize_game_state, get_valid_moves, move_camel, move_trap, place_round_winner_bet, place_game_bet, end_of_round, end_of_game, display_game_state
 from actionids import MOVE_CAMEL_ACTION_ID, MOVE_TRAP_ACTION_ID, ROUND_BET_ACTION_ID, GAME_BET_ACTION_ID
-from greedy import simulate_round, simulate_race, calculate_round_bet_ev, calculate_race_bet_ev, calculate_rolling_ev, simulate_round_with_traps
-
-class InlineGreedyAgent:
-    @staticmethod
-    def move(active_player, game_state):
-        probabilities_round = simulate_round(game_state, active_player)
-        probabilities_race = simulate_race(game_state, active_player)
-        valid_moves = get_valid_moves(game_state, active_player)
-
-        best_ev = float('-inf')
-        best_move = None
-
-        for move in valid_moves:
-            if move[0] == ROUND_BET_ACTION_ID:
-                camel = move[1]
-                ev = calculate_round_bet_ev(game_state, probabilities_round, camel)
-
-            elif move[0] == MOVE_CAMEL_ACTION_ID:
-                ev = calculate_rolling_ev()
-
-            elif move[0] == GAME_BET_ACTION_ID:
-                bet_type = move[1]  
-                camel = move[2]
-                ev = calculate_race_bet_ev(game_state, probabilities_race, camel, bet_type)
-
-            elif move[0] == MOVE_TRAP_ACTION_ID:
-                trap_type = move[1]
-                trap_position = move[2]
-                ev = simulate_round_with_traps(game_state, active_player, trap_type, trap_position)
-
-            else:
-                continue
-
-            if ev > best_ev:
-                best_ev = ev
-                best_move = move
-
-        return (best_move if best_move is not None else (0,)), best_ev
+from bots import GreedyAgent
+
+class InlineGreedyAgent(GreedyAgent):
+    """
+    A GreedyAgent that can also report the EV of its move, for logging. move() follows PlayerInterface, so the agent
+    plays in camelup.play_game() as well.
+    """
+    @classmethod
+    def move_with_ev(cls, active_player, game_state):
+        """
+        :return: A tuple (move, ev) with the move GreedyAgent would make and its expected value.
+        """
+        move, ev, confidence = cls.decide(active_player, game_state).best()
+        return move, ev
 
 def action(result, player, g):
     action_params = {}
@@ -80,12 +56,11 @@ def play_game(players):
 
     while g.active_game:
         active_player = (g_round % len(players))
-        player_move_result = players[active_player].move(active_player, g.get_player_copy(active_player))
-
-        if isinstance(player_move_result, tuple) and isinstance(player_move_result[0], tuple):
-            player_action, ev = player_move_result
+        player = players[active_player]
+        if hasattr(player, "move_with_ev"):
+            player_action, ev = player.move_with_ev(active_player, g.get_player_copy(active_player))
         else:
-            player_action = player_move_result
+            player_action = player.move(active_player, g.get_player_copy(active_player))
             ev = None
 
         if player_action not in get_valid_moves(g=g, player=active_player):
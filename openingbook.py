@@ -0,0 +1,213 @@
+import os
+import sys
+import random
+import itertools
+import multiprocessing
+import numpy as np
+import tqdm
+import camelup
+from camelup import get_valid_moves
+from fastboard import Board
+from exactround import enumerate_round
+from racetable import canonical_race_key, canonical_board, write_table, open_table, find_entry, estimate_race, \
+    race_probabilities
+from greedy import calculate_round_bet_ev, calculate_race_bet_ev, calculate_race_bet_standard_error, \
+    calculate_rolling_ev, best_move
+from actionids import MOVE_CAMEL_ACTION_ID, MOVE_TRAP_ACTION_ID, ROUND_BET_ACTION_ID
+
+OPENING_BOOK_ENV_VAR = "CAMELUP_OPENING_BOOK"
+DEFAULT_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "opening_book.npy")
+TRAP_TYPES = (-1, 1)
+
+
+def starting_boards(num_camels, board_size, move_range):
+    """
+    Enumerates every board GameState.__init__ can deal: each camel, in every placement order, on every field a first
+    roll can reach. Boards that only differ in camel colours share a canonical board (see
+    racetable.canonical_race_key()), which leaves one entry per way of stacking the camels on the start fields.
+    :param num_camels: Number of camels.
+    :param board_size: Integer, the field at which the finish line is crossed.
+    :param move_range: Tuple with the minimum and maximum dice roll (inclusive).
+    :return: Dictionary mapping canonical keys to canonical boards.
+    """
+    start_fields = range(move_range[0] - 1, move_range[1])
+    boards = {}
+    for order in itertools.permutations(range(num_camels)):
+        for fields in itertools.product(start_fields, repeat=num_camels):
+            stacks = {}
+            for camel, field in zip(order, fields):
+                stacks.setdefault(field, []).append(camel)
+            board = Board(stacks, {}, [True] * num_camels, board_size, move_range)
+            key, _ = canonical_race_key(board)
+            if key not in boards:
+                boards[key] = canonical_board(board)
+    return boards
+
+
+def book_dtype(num_camels, num_fields):
+    """
+    :param num_camels: Number of camels.
+    :param num_fields: Length of the camel track.
+    :return: The numpy record type of an opening book entry. Camel values are indexed by canonical label (place),
+        trap coins by trap type (-1, +1) and field. "playouts" is the number of race playouts behind "win" and "lose".
+    """
+    return np.dtype([("key", "<u8"), ("first", "<f4", (num_camels,)), ("second", "<f4", (num_camels,)),
+                     ("win", "<f4", (num_camels,)), ("lose", "<f4", (num_camels,)),
+                     ("trap_coins", "<f4", (len(TRAP_TYPES), num_fields)), ("playouts", "<u4")])
+
+
+def evaluate_opening(board, num_simulations):
+    """
+    Evaluates a starting board: the round exactly (see exactround.enumerate_round()), including a trap of either type
+    on every free field, and the race with num_simulations playouts.
+    :param board: Canonical fastboard.Board object.
+    :param num_simulations: Number of race playouts.
+    :return: A tuple (first, second, win, lose, trap_coins, playouts) in the layout of book_dtype().
+    """
+    num_fields = 2 * board.board_size
+    candidates = [(field, trap_type) for trap_type in TRAP_TYPES for field in range(1, board.board_size)
+                  if field not in board.stacks]
+    outcome, candidate_outcomes = enumerate_round(board, candidates)
+    trap_coins = np.zeros((len(TRAP_TYPES), num_fields))
+    for (field, trap_type), candidate_outcome in zip(candidates, candidate_outcomes):
+        trap_coins[TRAP_TYPES.index(trap_type), field] = candidate_outcome.landings[field]
+    win, lose = estimate_race(board, num_simulations)
+    return outcome.rank_probabilities[:, 0], outcome.rank_probabilities[:, 1], win, lose, trap_coins, num_simulations
+
+
+def _evaluate(args):
+    key, board, num_simulations, seed = args
+    random.seed(seed)
+    return (key, *evaluate_opening(board, num_simulations))
+
+
+def build_opening_book(path, boards, num_simulations=100000, processes=None, seed=0):
+    """
+    Evaluates every starting board in parallel and writes the results to a memory-mappable book file.
+    :param path: Output file path.
+    :param boards: Dictionary mapping canonical keys to canonical boards, see starting_boards().
+    :param num_simulations: Number of race playouts per board.
+    :param processes: Number of worker processes (defaults to the number of CPUs).
+    :param seed: Base seed; every board gets its own random stream derived from it.
+    :return: Number of entries written.
+    """
+    example = next(iter(boards.values()))
+    seeds = np.random.SeedSequence(seed).generate_state(len(boards))
+    tasks = [(key, board, num_simulations, int(s)) for (key, board), s in zip(boards.items(), seeds)]
+    entries = np.zeros(len(tasks), dtype=book_dtype(len(example.yet_to_move), 2 * example.board_size))
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.imap_unordered(_evaluate, tasks)
+        for i, entry in enumerate(tqdm.tqdm(results, total=len(tasks), desc="Evaluating openings")):
+            entries[i] = entry
+    write_table(path, entries)
+    return len(entries)
+
+
+class OpeningBook:
+    """
+    Read-only lookup of the move values of starting boards, see build_opening_book(). Bets never move camels, so a
+    board stays in the book until the first camel moves or the first trap is placed, i.e. for every seat's first
+    turn. Round bets and traps are exact for players without round bets; with round bets, the value of a trap would
+    also depend on how it shifts the round ranking, which the book does not store. Game bets are Monte Carlo
+    estimates and come with their standard error.
+    """
+    def __init__(self, path):
+        """
+        :param path: Path of a book file written by build_opening_book().
+        """
+        self.path = path
+        self.entries = open_table(path)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def values(self, game_state, active_player, moves=None):
+        """
+        :param game_state: The current game state.
+        :param active_player: The player making the decision.
+        :param moves: List of moves to evaluate. Defaults to every valid move.
+        :return: A dictionary mapping every move to a tuple (ev, standard_error) like
+            greedy.DecisionEstimate.action_values(), or None if the position is not in the book.
+        """
+        if any(bet[1] == active_player for bet in game_state.round_bets):
+            return None
+        board = Board.from_game_state(game_state)
+        if not board.active:
+            return None
+        key, ranking = canonical_race_key(board)
+        entry = find_entry(self.entries, key)
+        if entry is None:
+            return None
+
+        place = {game_state.CAMELS[camel]: label for label, camel in enumerate(ranking)}
+        round_probabilities = {camel: {"first": float(entry["first"][place[camel]]),
+                                       "second": float(entry["second"][place[camel]])} for camel in game_state.CAMELS}
+        race = race_probabilities(entry, ranking, game_state.CAMELS)
+        moves = moves if moves is not None else get_valid_moves(game_state, active_player)
+        values = {}
+        for move in moves:
+            if move[0] == MOVE_CAMEL_ACTION_ID:
+                values[move] = (calculate_rolling_ev(), 0)
+            elif move[0] == MOVE_TRAP_ACTION_ID:
+                _, trap_type, trap_position = move
+                values[move] = (float(entry["trap_coins"][TRAP_TYPES.index(trap_type), trap_position]), 0)
+            elif move[0] == ROUND_BET_ACTION_ID:
+                values[move] = (calculate_round_bet_ev(game_state, round_probabilities, move[1]), 0)
+            else:
+                _, bet_type, camel = move
+                values[move] = (calculate_race_bet_ev(game_state, race, camel, bet_type),
+                                calculate_race_bet_standard_error(game_state, race, camel, bet_type))
+        return values
+
+    def best(self, game_state, active_player):
+        """
+        :param game_state: The current game state.
+        :param active_player: The player making the decision.
+        :return: A tuple (move, ev, confidence) like greedy.best_move(), or None if the position is not in the book.
+        """
+        moves = get_valid_moves(game_state, active_player)
+        values = self.values(game_state, active_player, moves)
+        if values is None:
+            return None
+        return best_move(moves, values)
+
+
+_default_book = None
+
+
+def default_book():
+    """
+    The opening book named by the CAMELUP_OPENING_BOOK environment variable, or the book shipped in
+    data/opening_book.npy, loaded once per process.
+    :return: An OpeningBook, or None if there is no book file.
+    """
+    global _default_book
+    path = os.environ.get(OPENING_BOOK_ENV_VAR) or DEFAULT_BOOK_PATH
+    if not os.path.exists(path):
+        return None
+    if _default_book is None or _default_book.path != path:
+        _default_book = OpeningBook(path)
+    return _default_book
+
+
+def book_move(game_state, active_player):
+    """
+    :param game_state: The current game state.
+    :param active_player: The player making the decision.
+    :return: The best move according to default_book(), or None if there is no book or the position is not in it.
+    """
+    book = default_book()
+    opening = book.best(game_state, active_player) if book is not None else None
+    return opening[0] if opening is not None else None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python {} <OUTPUT_FILE> [NUM_SIMULATIONS]".format(sys.argv[0]))
+        exit(0)
+
+    g = camelup.GameState()
+    boards = starting_boards(g.NUM_CAMELS, g.BOARD_SIZE, g.MOVE_RANGE)
+    num_simulations = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    num_entries = build_opening_book(sys.argv[1], boards, num_simulations=num_simulations)
+    print("Wrote {} starting boards to {}".format(num_entries, sys.argv[1]))
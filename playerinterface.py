@@ -30,8 +30,57 @@ class PlayerInterface:
     a bot is on this list.
 
     Subclasses should remain stateless and the move()-function should be a static function as the game-code never
-    instantiates any of the player classes.
+    instantiates any of the player classes. Bots with settings keep them in upper-case class attributes; configured()
+    derives variants with other settings.
+
+    Bots that need to carry state from turn to turn can instead be passed to camelup.play_game() as instances, one per
+    seat. The game then calls on_game_start(), observe_action() after every action (with notify_players=True) and
+    on_game_end() on them, so they can follow the game between their own moves.
     """
+    @classmethod
+    def configured(cls, **settings):
+        """
+        Creates a subclass with different settings. Player classes are never instantiated, so settings live on the
+        class.
+        :param settings: New values for the upper-case class attributes, e.g. DEADLINE=0.1 for bots.GreedyAgent.
+        :return: The new agent class.
+        """
+        for name in settings:
+            if not name.isupper() or not hasattr(cls, name):
+                raise ValueError("{} has no setting {}".format(cls.__name__, name))
+        return type(cls.__name__, (cls,), settings)
+
+    @staticmethod
+    def on_game_start(player, game_state):
+        """
+        Called by camelup.play_game() before the first move. Does nothing by default.
+        :param player: The ID of the player.
+        :param game_state: The player's copy of the initial game state.
+        """
+        pass
+
+    @staticmethod
+    def observe_action(player, active_player, action, game_state):
+        """
+        Called by camelup.play_game(notify_players=True) after every applied action. Bots can use it to follow the
+        game or to start work on their next decision in the background; it must return quickly. Does nothing by
+        default.
+        :param player: The ID of the observing player.
+        :param active_player: The ID of the player who made the move.
+        :param action: The move tuple, see move().
+        :param game_state: The observing player's copy of the game state after the move.
+        """
+        pass
+
+    @staticmethod
+    def on_game_end(player, game_state):
+        """
+        Called by camelup.play_game() once the game is over. Does nothing by default.
+        :param player: The ID of the player.
+        :param game_state: The player's copy of the final game state.
+        """
+        pass
+
     @staticmethod
     def move(active_player, game_state):
         raise NotImplementedError(
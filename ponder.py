@@ -0,0 +1,82 @@
+import threading
+
+
+class Ponderer:
+    """
+    Runs speculative work on a background thread while other players move. Each call to ponder() replaces the task
+    being worked on, and the work function receives a stopped() check so it can give up as soon as a newer position
+    arrives.
+    """
+    def __init__(self, work):
+        """
+        :param work: Callable work(*args, stopped=..., **kwargs) doing the speculative computation in small steps.
+        """
+        self.work = work
+        self.condition = threading.Condition()
+        self.task = None
+        self.generation = 0
+        self.busy = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def ponder(self, *args, **kwargs):
+        """
+        Starts working on a new task, abandoning the current one.
+        :param args: Arguments for the work function.
+        :param kwargs: Keyword arguments for the work function.
+        """
+        with self.condition:
+            self.task = (args, kwargs)
+            self.generation += 1
+            self.condition.notify_all()
+
+    def cancel(self):
+        """
+        Abandons the current task.
+        """
+        with self.condition:
+            self.task = None
+            self.generation += 1
+            self.condition.notify_all()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until all submitted work is done.
+        :param timeout: Optional maximum number of seconds to wait.
+        :return: True if the ponderer is idle.
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: self.task is None and not self.busy, timeout)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.task is not None)
+                (args, kwargs), generation = self.task, self.generation
+                self.task = None
+                self.busy = True
+            try:
+                self.work(*args, stopped=lambda: self.generation != generation, **kwargs)
+            finally:
+                with self.condition:
+                    self.busy = False
+                    self.condition.notify_all()
+
+
+_ponderers = {}
+_ponderers_lock = threading.Lock()
+
+
+def shared_ponderer(owner, work):
+    """
+    The ponderer of an owner, e.g. an agent class and seat, started on first use. Player classes are never
+    instantiated, so their background threads are kept here.
+    :param owner: Hashable owner.
+    :param work: Work function, used when the ponderer is created.
+    :return: A Ponderer.
+    """
+    with _ponderers_lock:
+        ponderer = _ponderers.get(owner)
+        if ponderer is None:
+            ponderer = _ponderers[owner] = Ponderer(work)
+        return ponderer
@@ -0,0 +1,245 @@
+import os
+import sys
+import random
+import hashlib
+import multiprocessing
+import numpy as np
+import tqdm
+import camelup
+from fastboard import Board, play_to_end
+from actionids import MOVE_CAMEL_ACTION_ID, MOVE_TRAP_ACTION_ID, ROUND_BET_ACTION_ID
+
+RACE_TABLE_ENV_VAR = "CAMELUP_RACE_TABLE"
+
+
+def canonical_race_key(board):
+    """
+    Race probabilities only depend on the camel layout, the traps and which camels have yet to move. This function
+    relabels the camels by their current place (0 for the leader), so that boards which only differ in camel colours
+    share a key, and hashes the result into 64 bits.
+    :param board: fastboard.Board object.
+    :return: A tuple (key, ranking) with the integer key and the camel indices ordered from first to last place, i.e.
+        ranking[k] is the camel that canonical label k refers to.
+    """
+    ranking = board.ranking()
+    layout = tuple((field, len(board.stacks[field])) for field in sorted(board.stacks, reverse=True))
+    traps = tuple(sorted((field, trap[0]) for field, trap in board.traps.items()))
+    yet_to_move = tuple(board.yet_to_move[camel] for camel in ranking)
+    description = repr((layout, traps, yet_to_move, board.board_size, tuple(board.move_range)))
+    key = int.from_bytes(hashlib.blake2b(description.encode(), digest_size=8).digest(), "little")
+    return key, ranking
+
+
+def canonical_board(board):
+    """
+    :param board: fastboard.Board object.
+    :return: A copy of the board with the camels relabelled by place (see canonical_race_key()) and without trap
+        owners.
+    """
+    _, ranking = canonical_race_key(board)
+    label = {camel: place for place, camel in enumerate(ranking)}
+    stacks = {field: [label[camel] for camel in stack] for field, stack in board.stacks.items()}
+    traps = {field: (trap[0], None) for field, trap in board.traps.items()}
+    yet_to_move = [board.yet_to_move[camel] for camel in ranking]
+    return Board(stacks, traps, yet_to_move, board.board_size, board.move_range, board.active)
+
+
+def table_dtype(num_camels):
+    """
+    :param num_camels: Number of camels.
+    :return: The numpy record type of a race table entry.
+    """
+    return np.dtype([("key", "<u8"), ("win", "<f4", (num_camels,)), ("lose", "<f4", (num_camels,)),
+                     ("playouts", "<u4")])
+
+
+def write_table(path, entries):
+    """
+    Writes table entries, sorted by key, to a .npy file that can be memory-mapped.
+    :param path: Output file path.
+    :param entries: Structured numpy array with a "key" field.
+    """
+    entries = np.sort(entries, order="key")
+    table = np.lib.format.open_memmap(path, mode="w+", dtype=entries.dtype, shape=entries.shape)
+    table[:] = entries
+    table.flush()
+
+
+def open_table(path):
+    """
+    Memory-maps a table written by write_table() read-only, so any number of processes can share one copy.
+    :param path: Table file path.
+    :return: Structured numpy array backed by the file.
+    """
+    return np.load(path, mmap_mode="r")
+
+
+def find_entry(table, key):
+    """
+    :param table: Structured numpy array sorted by "key".
+    :param key: Integer key.
+    :return: The matching entry or None.
+    """
+    index = np.searchsorted(table["key"], np.uint64(key))
+    if index < len(table) and table["key"][index] == key:
+        return table[index]
+    return None
+
+
+class RaceTable:
+    """
+    Read-only lookup of precomputed race probabilities, see build_race_table().
+    """
+    def __init__(self, path):
+        """
+        :param path: Path of a table file written by build_race_table().
+        """
+        self.path = path
+        self.entries = open_table(path)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, game_state):
+        """
+        :param game_state: The current game state.
+        :return: A dictionary with probabilities (and their standard errors "win_se" and "lose_se") for each camel
+            winning or losing the game in the format of greedy.simulate_race(), or None if the position is not in
+            the table.
+        """
+        board = Board.from_game_state(game_state)
+        key, ranking = canonical_race_key(board)
+        entry = find_entry(self.entries, key)
+        if entry is None:
+            return None
+        return race_probabilities(entry, ranking, game_state.CAMELS)
+
+
+_default_table = None
+
+
+def default_table():
+    """
+    The race table named by the CAMELUP_RACE_TABLE environment variable, loaded once per process.
+    :return: A RaceTable, or None if the variable is not set.
+    """
+    global _default_table
+    path = os.environ.get(RACE_TABLE_ENV_VAR)
+    if not path:
+        return None
+    if _default_table is None or _default_table.path != path:
+        _default_table = RaceTable(path)
+    return _default_table
+
+
+def race_probabilities(entry, ranking, camels):
+    """
+    Maps the race probabilities of a table entry back to camel IDs. Standard errors follow from the number of playouts
+    the entry was estimated from.
+    :param entry: Record with "win", "lose" and "playouts" fields, indexed by canonical label.
+    :param ranking: Camel indices ordered from first to last place, see canonical_race_key().
+    :param camels: List of camel IDs (GameState.CAMELS).
+    :return: A dictionary in the format of greedy.simulate_race().
+    """
+    n = max(int(entry["playouts"]), 1)
+    probabilities = {}
+    for place, camel in enumerate(ranking):
+        win = float(entry["win"][place])
+        lose = float(entry["lose"][place])
+        probabilities[camels[camel]] = {"win": win, "lose": lose,
+                                        "win_se": float(np.sqrt(win * (1 - win) / n)),
+                                        "lose_se": float(np.sqrt(lose * (1 - lose) / n))}
+    return probabilities
+
+
+def estimate_race(board, num_simulations):
+    """
+    Monte Carlo estimate of the race probabilities of a canonical board.
+    :param board: fastboard.Board object.
+    :param num_simulations: Number of playouts.
+    :return: A tuple (win, lose) of probability vectors indexed by camel.
+    """
+    num_camels = len(board.yet_to_move)
+    win = np.zeros(num_camels)
+    lose = np.zeros(num_camels)
+    for _ in range(num_simulations):
+        ranking = play_to_end(board.copy()).ranking()
+        win[ranking[0]] += 1
+        lose[ranking[-1]] += 1
+    return win / num_simulations, lose / num_simulations
+
+
+def _evaluate(args):
+    key, board, num_simulations, seed = args
+    random.seed(seed)
+    win, lose = estimate_race(board, num_simulations)
+    return key, win, lose
+
+
+def collect_boards(num_games, players=None):
+    """
+    Collects the canonical boards that occur in simulated games, i.e. the positions worth tabulating.
+    :param num_games: Number of games to simulate.
+    :param players: List of bot classes. Defaults to four bots.RandomAgent players.
+    :return: Dictionary mapping canonical keys to canonical boards.
+    """
+    import bots
+    players = players if players is not None else [bots.RandomAgent] * 4
+    boards = {}
+
+    def collect(g):
+        board = Board.from_game_state(g)
+        if board.active:
+            key, _ = canonical_race_key(board)
+            boards.setdefault(key, canonical_board(board))
+
+    for _ in tqdm.tqdm(range(num_games), desc="Collecting positions"):
+        g = camelup.GameState(num_players=len(players))
+        collect(g)
+        active_player = 0
+        while g.active_game:
+            action = players[active_player].move(active_player, g.get_player_copy(active_player))
+            if action[0] == MOVE_CAMEL_ACTION_ID:
+                camelup.move_camel(g, active_player)
+            elif action[0] == MOVE_TRAP_ACTION_ID:
+                camelup.move_trap(g, action[1], action[2], active_player)
+            elif action[0] == ROUND_BET_ACTION_ID:
+                camelup.place_round_winner_bet(g, action[1], active_player)
+            else:
+                camelup.place_game_bet(g, action[2], action[1], active_player)
+            collect(g)
+            active_player = (active_player + 1) % len(players)
+    return boards
+
+
+def build_race_table(path, boards, num_simulations=2000, processes=None, seed=0):
+    """
+    Evaluates the race probabilities of every board in parallel and writes them to a memory-mappable table file.
+    :param path: Output file path.
+    :param boards: Dictionary mapping canonical keys to canonical boards, see collect_boards().
+    :param num_simulations: Number of playouts per board.
+    :param processes: Number of worker processes (defaults to the number of CPUs).
+    :param seed: Base seed; every board gets its own random stream derived from it.
+    :return: Number of entries written.
+    """
+    num_camels = len(next(iter(boards.values())).yet_to_move)
+    seeds = np.random.SeedSequence(seed).generate_state(len(boards))
+    tasks = [(key, board, num_simulations, int(s)) for (key, board), s in zip(boards.items(), seeds)]
+    entries = np.zeros(len(tasks), dtype=table_dtype(num_camels))
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.imap_unordered(_evaluate, tasks, chunksize=16)
+        for i, (key, win, lose) in enumerate(tqdm.tqdm(results, total=len(tasks), desc="Evaluating races")):
+            entries[i] = (key, win, lose, num_simulations)
+    write_table(path, entries)
+    return len(entries)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python {} <OUTPUT_FILE> <NUM_GAMES> [NUM_SIMULATIONS]".format(sys.argv[0]))
+        exit(0)
+
+    boards = collect_boards(int(sys.argv[2]))
+    num_simulations = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+    num_entries = build_race_table(sys.argv[1], boards, num_simulations=num_simulations)
+    print("Wrote {} positions to {}".format(num_entries, sys.argv[1]))
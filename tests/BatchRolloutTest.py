@@ -0,0 +1,53 @@
+import copy
+import random
+import unittest
+import numpy as np
+import camelup
+from mcts import MCTSAgent
+from batchrollout import RolloutBatch, batch_rollouts
+
+
+class BatchRolloutTest(unittest.TestCase):
+
+    def setUp(self):
+        # A game some way in, with traps and bets on the board
+        self.g = camelup.GameState()
+        self.player = 0
+        for _ in range(30):
+            moves = camelup.get_valid_moves(self.g, self.player)
+            self.g = MCTSAgent.transition(self.g, self.player, random.choice(moves[1:]))
+            self.player = (self.player + 1) % self.g.NUM_PLAYERS
+
+    def assertSameGame(self, batch, g):
+        track = [[] for _ in g.camel_track]
+        for camel in np.argsort(batch.height[0]):
+            track[batch.position[0, camel]].append(g.CAMELS[camel])
+        self.assertEqual(track, g.camel_track)
+        self.assertEqual(list(batch.money[0]), g.player_money_values)
+        self.assertEqual(list(batch.yet_to_move[0]), g.camel_yet_to_move)
+        self.assertEqual(batch.active[0], g.active_game)
+
+    def test_moves_are_counted_like_valid_moves(self):
+        batch = RolloutBatch([self.g], [self.player])
+        self.assertEqual(batch.num_moves()[0], len(camelup.get_valid_moves(self.g, self.player)))
+
+    def test_rolls_follow_the_rules(self):
+        batch = RolloutBatch([self.g], [self.player])
+        while self.g.active_game:
+            camel = random.choice([i for i, yet_to_move in enumerate(self.g.camel_yet_to_move) if yet_to_move])
+            distance = random.randint(*self.g.MOVE_RANGE)
+            camelup.move_camel(self.g, self.player, camel, distance)
+            batch.move_camel(np.array([0]), np.array([self.player]), np.array([camel]), np.array([distance]))
+            self.assertSameGame(batch, self.g)
+
+    def test_every_rollout_has_one_winner(self):
+        finished = copy.deepcopy(self.g)
+        finished.active_game = False
+        results = batch_rollouts([self.g] * 20 + [finished], [self.player] * 21)
+        self.assertEqual(results.shape, (21, self.g.NUM_PLAYERS))
+        self.assertTrue((results.sum(1) == 1).all())
+        self.assertEqual(np.argmax(results[-1]), np.argmax(finished.player_money_values))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import camelup
+import bots
+import distill
+from actionids import MOVE_CAMEL_ACTION_ID
+
+
+class DistillTest(unittest.TestCase):
+
+    def setUp(self):
+        self.g = camelup.GameState()
+
+    def test_features_cover_every_move(self):
+        moves, features = distill.state_features(self.g, 0)
+        self.assertEqual(features.shape, (len(moves), distill.NUM_FEATURES))
+        # Every move type fills its own block
+        self.assertEqual(features[moves.index((MOVE_CAMEL_ACTION_ID,)), 0], 1)
+
+    def test_fit_learns_the_teacher(self):
+        examples = []
+        for player in range(4):
+            g = camelup.GameState()
+            moves, features = distill.state_features(g, player)
+            examples.append((features, np.array([move == (MOVE_CAMEL_ACTION_ID,) for move in moves], dtype=float)))
+        policy = distill.fit_policy(examples)
+        self.assertEqual(distill.agreement(policy, examples), 1)
+        self.assertEqual(distill.regret(policy, examples), 0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "policy.npz")
+            policy.save(path)
+            loaded = distill.DistilledPolicy.load(path)
+            np.testing.assert_allclose(loaded.weights, policy.weights)
+            agent = bots.DistilledGreedyAgent.configured(POLICY=path)
+            self.assertEqual(agent.move(0, self.g), (MOVE_CAMEL_ACTION_ID,))
+
+
+if __name__ == '__main__':
+    unittest.main()
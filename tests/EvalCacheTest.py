@@ -0,0 +1,117 @@
+import os
+import tempfile
+import unittest
+import multiprocessing
+import camelup
+import greedy
+import evalcache
+
+
+class EvalCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.g = camelup.GameState()
+        self.cache = evalcache.EvaluationCache()
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = evalcache.EvaluationCache(max_entries=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(len(cache), 2)
+
+    def test_bets_share_the_estimate(self):
+        first = greedy.AnytimeDecision(self.g, 0, cache=self.cache).refine(200)
+        camelup.place_round_winner_bet(self.g, self.g.CAMELS[0], 0)
+        second = greedy.AnytimeDecision(self.g, 1, cache=self.cache)
+        self.assertIs(first.estimate, second.estimate)
+        self.assertEqual(second.estimate.num_simulations, 200)
+        second.run(sample_budget=200)
+        self.assertEqual(second.estimate.num_simulations, 200)
+
+    def test_camel_move_invalidates(self):
+        first = greedy.AnytimeDecision(self.g, 0, cache=self.cache).refine(10)
+        camelup.move_camel(self.g, 0)
+        second = greedy.AnytimeDecision(self.g, 1, cache=self.cache)
+        self.assertIsNot(first.estimate, second.estimate)
+        self.assertEqual(second.estimate.num_simulations, 0)
+
+    def test_round_probabilities_are_reused(self):
+        probabilities = greedy.simulate_round(self.g, 0, num_simulations=100, cache=self.cache)
+        camelup.place_game_bet(self.g, self.g.CAMELS[0], "win", 0)
+        self.assertIs(greedy.simulate_round(self.g, 1, num_simulations=100, cache=self.cache), probabilities)
+
+    def test_trap_map_matches_uncached(self):
+        cached = greedy.trap_landing_map(self.g, 0, cache=self.cache)
+        self.assertEqual(cached.keys(), greedy.trap_landing_map(self.g, 0).keys())
+        greedy.trap_landing_map(self.g, 1, cache=self.cache)
+        self.assertEqual(self.cache.hits, 1)
+
+
+def _fill(path, worker):
+    store = evalcache.DiskCache(path)
+    for i in range(50):
+        store.put((worker, i), i)
+    return len(store)
+
+
+class DiskCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "evaluations.sqlite")
+        self.g = camelup.GameState()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_estimates_survive_a_restart(self):
+        store = evalcache.DiskCache(self.path)
+        decision = greedy.AnytimeDecision(self.g, 0, cache=evalcache.EvaluationCache(store=store))
+        decision.run(sample_budget=200)
+        store.close()
+
+        restarted = evalcache.EvaluationCache(store=evalcache.DiskCache(self.path))
+        self.assertEqual(greedy.AnytimeDecision(self.g, 1, cache=restarted).estimate.num_simulations, 200)
+        self.assertEqual(restarted.hits, 1)
+
+    def test_other_versions_are_dropped(self):
+        store = evalcache.DiskCache(self.path)
+        store.put(("round", 1), {"c_0": 1})
+        store.close()
+        self.assertEqual(evalcache.DiskCache(self.path).get(("round", 1)), {"c_0": 1})
+        self.assertIsNone(evalcache.DiskCache(self.path, version=evalcache.CACHE_VERSION + 1).get(("round", 1)))
+
+    def test_least_recently_used_entries_are_deleted(self):
+        store = evalcache.DiskCache(self.path, max_entries=2)
+        store.put("a", 1)
+        store.put("b", 2)
+        self.assertEqual(store.get("a"), 1)
+        store.put("c", 3)
+        self.assertIsNone(store.get("b"))
+        self.assertEqual(len(store), 2)
+
+    def test_reads_batch_their_recency_updates(self):
+        store = evalcache.DiskCache(self.path)
+        store.put("a", 1)
+        store.get("a")
+        self.assertEqual(store.touched.keys(), {repr("a")})
+        for _ in range(store.TOUCH_BATCH):
+            store.get("a")
+        self.assertLess(len(store.touched), store.TOUCH_BATCH)
+        store.put("b", 2)
+        self.assertEqual(store.touched, {})
+
+    def test_processes_share_the_file(self):
+        with multiprocessing.Pool(3) as pool:
+            pool.starmap(_fill, [(self.path, worker) for worker in range(3)])
+        store = evalcache.DiskCache(self.path)
+        self.assertEqual(len(store), 150)
+        self.assertEqual(store.get((2, 49)), 49)
+
+
+if __name__ == '__main__':
+    unittest.main()
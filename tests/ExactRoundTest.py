@@ -0,0 +1,70 @@
+import unittest
+import numpy as np
+import camelup
+import greedy
+from fastboard import Board
+from exactround import enumerate_round, reachable_fields
+
+
+class ExactRoundTest(unittest.TestCase):
+
+    def setUp(self):
+        self.g = camelup.GameState()
+
+        # Remove camels from start positions
+        self.g.camel_track[0] = []
+        self.g.camel_track[1] = []
+        self.g.camel_track[2] = []
+
+        self.g.camel_yet_to_move = [True, False, True, True, False]
+        self.g.camel_track[3] = ["c_1", "c_3"]
+        self.g.camel_track[5] = ["c_4"]
+        self.g.camel_track[6] = ["c_0", "c_2"]
+        self.g.trap_track[8] = [-1, 1]
+
+    def test_single_camel_left(self):
+        self.g.camel_yet_to_move = [False, False, False, False, True]
+        outcome = enumerate_round(Board.from_game_state(self.g))
+        # c_4 lands on top of the stack on 6, alone on 7, or on the -1 trap on 8 which drops it back to 7
+        self.assertAlmostEqual(outcome.place_probability(4, 1), 1)
+        self.assertAlmostEqual(outcome.landings[6], 1 / 3)
+        self.assertAlmostEqual(outcome.landings[7], 1 / 3)
+        self.assertAlmostEqual(outcome.landings[8], 1 / 3)
+
+    def test_probabilities_sum_to_one(self):
+        outcome = enumerate_round(Board.from_game_state(self.g))
+        np.testing.assert_allclose(outcome.rank_probabilities.sum(axis=0), 1)
+        np.testing.assert_allclose(outcome.rank_probabilities.sum(axis=1), 1)
+        self.assertAlmostEqual(outcome.landings.sum(), 3)
+
+    def test_trap_candidates_match_placed_traps(self):
+        board = Board.from_game_state(self.g)
+        candidates = [(7, 1), (10, -1), (12, 1)]
+        _, candidate_outcomes = enumerate_round(board, candidates)
+        for (field, trap_type), candidate_outcome in zip(candidates, candidate_outcomes):
+            trapped = board.copy()
+            trapped.traps[field] = (trap_type, 0)
+            expected = enumerate_round(trapped)
+            np.testing.assert_allclose(candidate_outcome.rank_probabilities, expected.rank_probabilities)
+            np.testing.assert_allclose(candidate_outcome.landings, expected.landings)
+
+    def test_unreachable_fields(self):
+        board = Board.from_game_state(self.g)
+        outcome = enumerate_round(board)
+        reachable = reachable_fields(board)
+        for field in range(len(outcome.landings)):
+            if field not in reachable:
+                self.assertEqual(outcome.landings[field], 0)
+
+    def test_trap_landing_map(self):
+        trap_map = greedy.trap_landing_map(self.g, 0)
+        valid_traps = {(move[1], move[2]) for move in camelup.get_valid_moves(self.g, 0) if move[0] == 1}
+        self.assertEqual(set(trap_map), valid_traps)
+        # Nothing can land on field 15 before the round is over
+        self.assertEqual(trap_map[(1, 15)]["payout"], 0)
+        for entry in trap_map.values():
+            self.assertAlmostEqual(entry["payout"], entry["coins"])
+
+
+if __name__ == '__main__':
+    unittest.main()
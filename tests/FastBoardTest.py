@@ -0,0 +1,64 @@
+import unittest
+import random
+import camelup
+import greedy
+from fastboard import Board, sample_round_plan, play_plan
+
+
+class FastBoardTest(unittest.TestCase):
+
+    def setUp(self):
+        self.g = camelup.GameState()
+
+        # Remove camels from start positions
+        self.g.camel_track[0] = []
+        self.g.camel_track[1] = []
+        self.g.camel_track[2] = []
+
+        self.g.camel_track[3] = ["c_1", "c_3"]
+        self.g.camel_track[5] = ["c_4"]
+        self.g.camel_track[6] = ["c_0", "c_2"]
+        self.g.trap_track[7] = [-1, 0]
+        self.g.trap_track[9] = [1, 2]
+
+    def test_board_matches_game_engine(self):
+        for seed in range(25):
+            g = camelup.GameState()
+            g.camel_track = [list(stack) for stack in self.g.camel_track]
+            g.trap_track = [list(trap) for trap in self.g.trap_track]
+            board = Board.from_game_state(g)
+
+            random.seed(seed)
+            while g.active_game:
+                camelup.move_camel(g, 0)
+
+            random.seed(seed)
+            while board.active:
+                play_plan(board, sample_round_plan(board))
+
+            self.assertEqual(Board.from_game_state(g).key()[:2], board.key()[:2])
+
+    def test_minus_trap_moves_stack_underneath(self):
+        board = Board.from_game_state(self.g)
+        landing, trap_owner = board.move(4, 2)  # c_4 lands on the -1 trap at 7 and drops onto c_0/c_2
+        self.assertEqual(landing, 7)
+        self.assertEqual(trap_owner, 0)
+        self.assertEqual(board.stacks[6], [4, 0, 2])
+        self.assertEqual(board.ranking()[:3], [2, 0, 4])
+
+    def test_decision_estimate_probabilities(self):
+        estimate = greedy.simulate_decision(self.g, 0, num_simulations=200)
+        round_probabilities = estimate.round_probabilities()
+        race_probabilities = estimate.race_probabilities()
+        self.assertAlmostEqual(sum(p["first"] for p in round_probabilities.values()), 1)
+        self.assertAlmostEqual(sum(p["second"] for p in round_probabilities.values()), 1)
+        self.assertAlmostEqual(sum(p["win"] for p in race_probabilities.values()), 1)
+        self.assertAlmostEqual(sum(p["lose"] for p in race_probabilities.values()), 1)
+        # Five camels roll once each during a fresh round
+        self.assertAlmostEqual(sum(estimate.trap_landings()), 5)
+        # No camel is behind field 3, so nothing can land on it
+        self.assertEqual(estimate.trap_landings()[3], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
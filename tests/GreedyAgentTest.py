@@ -0,0 +1,72 @@
+import time
+import unittest
+import camelup
+import greedy
+import bots
+import evalcache
+
+
+class GreedyAgentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.g = camelup.GameState()
+        evalcache.shared_cache().clear()
+
+    def test_sample_budget(self):
+        agent = bots.GreedyAgent.configured(SAMPLE_BUDGET=150, SEPARATION=None, EXACT_TRAPS=False)
+        decision = agent.decide(0, self.g)
+        self.assertEqual(decision.estimate.num_simulations, 150)
+        self.assertIn(agent.move(0, self.g), camelup.get_valid_moves(self.g, 0))
+
+    def test_deadline(self):
+        agent = bots.GreedyAgent.configured(DEADLINE=0.05, SAMPLE_BUDGET=None, SEPARATION=None, EXACT_TRAPS=False)
+        start = time.perf_counter()
+        decision = agent.decide(0, self.g)
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertGreater(decision.estimate.num_simulations, 0)
+
+    def test_unknown_setting(self):
+        self.assertRaises(ValueError, bots.GreedyAgent.configured, BUDGET=10)
+
+    def test_standard_errors_shrink_with_samples(self):
+        decision = greedy.AnytimeDecision(self.g, 0, trap_map=greedy.trap_landing_map(self.g, 0)).refine(50)
+        move, ev, confidence = decision.best()
+        self.assertIn(move, decision.moves)
+        self.assertGreaterEqual(confidence, 0.5)
+        self.assertLessEqual(confidence, 1)
+        values = decision.values()
+        self.assertEqual(ev, max(value[0] for value in values.values()))
+
+        # 40 times the samples: every standard error shrinks by a factor of about sqrt(40)
+        errors = {move: error for move, (_, error) in values.items()}
+        decision.refine(1950)
+        for move, (_, error) in decision.values().items():
+            if errors[move] > 0:
+                self.assertLess(error, errors[move] / 3)
+
+    def test_run_requires_a_limit(self):
+        self.assertRaises(ValueError, greedy.AnytimeDecision(self.g, 0).run)
+
+    def test_racing_eliminates_dominated_moves(self):
+        decision = greedy.RacingDecision(self.g, 0).run(sample_budget=500)
+        move, ev, confidence = decision.best()
+        self.assertIn(move, decision.moves)
+        self.assertLess(len(decision.survivors), len(decision.moves))
+        # Evaluating every move on every future would cost a rollout per trap move and future
+        self.assertLess(decision.rollouts, len(decision.moves) * decision.num_simulations)
+
+    def test_racing_statistics_are_cached(self):
+        cache = evalcache.EvaluationCache()
+        first = greedy.RacingDecision(self.g, 0, cache=cache).refine(100)
+        second = greedy.RacingDecision(self.g, 0, cache=cache)
+        self.assertEqual(second.num_simulations, 100)
+        self.assertEqual(greedy.RacingDecision(self.g, 1, cache=cache).num_simulations, 0)
+        self.assertEqual(first.values(), second.values())
+
+    def test_racing_agent(self):
+        agent = bots.GreedyAgent.configured(RACING=True, SAMPLE_BUDGET=200)
+        self.assertIn(agent.move(0, self.g), camelup.get_valid_moves(self.g, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import numpy as np
+import camelup
+import greedy
+
+
+class GreedySamplingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.g = camelup.GameState()
+
+        # Remove camels from start positions
+        self.g.camel_track[0] = []
+        self.g.camel_track[1] = []
+        self.g.camel_track[2] = []
+
+        # c_3 is far ahead and nothing can catch up this round
+        self.g.camel_track[2] = ["c_0", "c_1", "c_2", "c_4"]
+        self.g.camel_track[15] = ["c_3"]
+
+    def test_standard_error(self):
+        statistics = greedy.SampleStatistics(2)
+        statistics.add([[0, 1], [1, 1], [0, 1], [1, 1]])
+        np.testing.assert_allclose(statistics.mean(), [0.5, 1])
+        np.testing.assert_allclose(statistics.standard_error(), [np.sqrt(1 / 3 / 4), 0])
+
+    def test_sampling_stops_at_tolerance(self):
+        statistics = greedy.sample_in_chunks(
+            lambda n: np.ones((n, 1)), greedy.SampleStatistics(1), num_simulations=1000, tolerance=0.01)
+        self.assertEqual(statistics.count, 100)
+
+    def test_sampling_uses_full_budget_without_target(self):
+        statistics = greedy.sample_in_chunks(
+            lambda n: np.ones((n, 1)), greedy.SampleStatistics(1), num_simulations=250, chunk_size=100)
+        self.assertEqual(statistics.count, 250)
+
+    def test_simulate_round_reports_standard_errors(self):
+        probabilities = greedy.simulate_round(self.g, 0, num_simulations=1000, tolerance=0.001)
+        self.assertEqual(probabilities["c_3"]["first"], 1)
+        self.assertEqual(probabilities["c_3"]["first_se"], 0)
+
+    def test_clear_decision_stops_early(self):
+        trap_map = greedy.trap_landing_map(self.g, 0)
+        estimate = greedy.simulate_decision(self.g, 0, num_simulations=2000, separation=3, trap_map=trap_map)
+        self.assertLess(estimate.num_simulations, 2000)
+
+    def test_is_decision_clear(self):
+        values = {(0,): (0.75, 0), (2, "c_3"): (5, 0.1), (2, "c_1"): (-1, 0.1)}
+        self.assertTrue(greedy.is_decision_clear(values, separation=3))
+        self.assertFalse(greedy.is_decision_clear(values, tolerance=0.05))
+        values[(2, "c_1")] = (4.9, 0.1)
+        self.assertFalse(greedy.is_decision_clear(values, separation=3))
+
+    def test_trap_comparisons_share_futures(self):
+        # The same move listed twice sees identical futures, so the two estimates cannot differ
+        gains, errors, difference_errors = greedy.compare_trap_moves(
+            self.g, 0, [(1, 4), (1, 4), (-1, 3)], num_simulations=50)
+        self.assertEqual(difference_errors[0, 1], 0)
+        self.assertGreaterEqual(errors[(-1, 3)], 0)
+
+    def test_importance_sampling_is_unbiased(self):
+        probabilities = greedy.simulate_race_importance(self.g, 0, num_simulations=400)
+        reference = greedy.simulate_race(self.g, 0, num_simulations=4000)
+        for camel in self.g.CAMELS:
+            for outcome in ("win", "lose"):
+                error = np.hypot(probabilities[camel][outcome + "_se"], reference[camel][outcome + "_se"])
+                self.assertLessEqual(abs(probabilities[camel][outcome] - reference[camel][outcome]), 5 * error + 0.01)
+
+    def test_control_variates_use_the_exact_round(self):
+        # c_3 leads the round and the race alike, so the round outcome explains the race outcome
+        probabilities, report = greedy.simulate_race_control_variate(
+            self.g, 0, num_simulations=300, return_report=True)
+        self.assertEqual(report["playouts"], 300)
+        self.assertGreaterEqual(report["variance_reduction"], 1)
+        self.assertAlmostEqual(probabilities["c_3"]["win"], 1, delta=0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import copy
+import math
+import random
+import unittest
+import warnings
+import numpy as np
+import camelup
+import bots
+import mcts
+import greedy
+import evalcache
+import racetable
+from fastboard import Board
+from exactround import enumerate_round
+from playerinterface import PlayerInterface
+from actionids import MOVE_CAMEL_ACTION_ID, ROUND_BET_ACTION_ID
+
+
+class MCTSTest(unittest.TestCase):
+
+    def setUp(self):
+        self.g = camelup.GameState()
+        self.agent = mcts.MCTSAgent()
+        self.agent.root = mcts.MCTSNode(self.g, ptm=0)
+        self.agent.iterate(self.agent.root)
+
+    def test_root_follows_played_actions(self):
+        action = (ROUND_BET_ACTION_ID, self.g.CAMELS[0])
+        child = next(child for child in self.agent.root.children if child.action == action)
+        camelup.place_round_winner_bet(self.g, self.g.CAMELS[0], 0)
+        self.agent.advance(action, self.g.get_player_copy(1))
+        self.assertIs(self.agent.root, child)
+        self.assertIsNone(child.parent)
+
+    def test_rolls_are_chance_nodes(self):
+        roll = next(child for child in self.agent.root.children if child.action == (MOVE_CAMEL_ACTION_ID,))
+        self.assertTrue(roll.chance)
+        for _ in range(20):
+            self.agent.sample_outcome(roll)
+        self.assertGreater(len(roll.outcomes), 1)
+        for (camel_index, distance), outcome in roll.outcomes.items():
+            self.assertFalse(outcome.state.camel_yet_to_move[camel_index])
+            self.assertIs(outcome.parent, roll)
+
+    def test_root_follows_the_dice(self):
+        roll = next(child for child in self.agent.root.children if child.action == (MOVE_CAMEL_ACTION_ID,))
+        (camel_index, distance), outcome = next(iter(roll.outcomes.items()))
+        camelup.move_camel(self.g, 0, camel_index, distance)
+        self.agent.advance((MOVE_CAMEL_ACTION_ID,), self.g)
+        self.assertIs(self.agent.root, outcome)
+
+    def test_tree_is_dropped_for_other_dice(self):
+        roll = next(child for child in self.agent.root.children if child.action == (MOVE_CAMEL_ACTION_ID,))
+        camel_index, distance = next(iter(roll.outcomes))
+        other = next(i for i, yet_to_move in enumerate(self.g.camel_yet_to_move) if yet_to_move and i != camel_index)
+        camelup.move_camel(self.g, 0, other, distance)
+        self.agent.advance((MOVE_CAMEL_ACTION_ID,), self.g)
+        self.assertIsNone(self.agent.root)
+
+    def test_seeded_search_is_reproducible(self):
+        moves = []
+        for _ in range(2):
+            state = random.getstate()
+            agent = mcts.MCTSAgent(iterations=1, seed=7)
+            moves.append((agent.get_move(0, self.g), sorted(child.visits for child in agent.root.children)))
+            self.assertEqual(random.getstate(), state)
+        self.assertEqual(moves[0], moves[1])
+
+    def test_tree_parallel_search_clears_virtual_loss(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            agent = mcts.MCTSAgent(iterations=2, threads=2)
+        agent.get_move(0, self.g)
+        self.assertEqual(sum(child.visits for child in agent.root.children), agent.root.visits)
+        nodes = [agent.root]
+        while nodes:
+            node = nodes.pop()
+            self.assertEqual(node.virtual_loss, 0)
+            nodes.extend(node.children)
+
+    def test_threads_need_a_free_threaded_build_and_no_batch(self):
+        with self.assertRaises(ValueError):
+            mcts.MCTSAgent(iterations=2, threads=2, batch=4)
+        if mcts.gil_enabled():
+            with self.assertWarns(RuntimeWarning):
+                mcts.MCTSAgent(iterations=2, threads=2)
+
+    def test_virtual_loss_steers_selection(self):
+        first = self.agent.select(self.agent.root)
+        self.agent.add_virtual_loss([first], 10)
+        self.assertIsNot(self.agent.select(self.agent.root), first)
+
+    def test_waves_count_every_leaf(self):
+        agent = mcts.MCTSAgent(iterations=5, batch=2)
+        agent.get_move(0, self.g)
+        self.assertEqual(sum(child.visits for child in agent.root.children), agent.root.visits)
+        self.assertGreater(sum(1 for child in agent.root.children if child.children), 1)
+        self.assertEqual(agent.root.virtual_loss, 0)
+
+    def test_rollouts_leave_the_state_alone(self):
+        state = copy.deepcopy(self.g)
+        weights = {MOVE_CAMEL_ACTION_ID: 3, ROUND_BET_ACTION_ID: 1}
+        for result in (mcts.random_rollout(self.g, 0), mcts.random_rollout(self.g, 0, category_weights=weights)):
+            self.assertEqual(sum(result), 1)
+        self.assertEqual(vars(self.g), vars(state))
+
+    def test_progressive_widening(self):
+        agent = mcts.MCTSAgent(iterations=10, widening=(1, 0.5))
+        agent.get_move(0, self.g)
+        root = agent.root
+        self.assertLessEqual(len(root.children), math.ceil(root.visits ** 0.5))
+        self.assertEqual(len(root.children) + len(root.stubs), len(camelup.get_valid_moves(self.g, 0)))
+        priors = [mcts.action_prior(self.g, 0, action) for action in root.stubs]
+        opened = [mcts.action_prior(self.g, 0, child.action) for child in root.children]
+        self.assertEqual(priors, sorted(priors))
+        self.assertGreaterEqual(min(opened), priors[-1])
+
+    def test_expected_coins(self):
+        leader = camelup.find_camel_in_nth_place(self.g, 1)
+        camelup.place_round_winner_bet(self.g, leader, 2)
+        self.g.game_winner_bets = [[leader, 0], [leader, 1], [None, None]]
+        board = Board.from_game_state(self.g)
+        random.seed(1)
+        win, _ = racetable.estimate_race(board, mcts.RACE_SIMULATIONS)
+        outcome = enumerate_round(board)
+        expected = list(self.g.player_money_values)
+        leader_win = win[self.g.CAMELS.index(leader)]
+        expected[1] += leader_win * self.g.GAME_END_PAYOUT[0] - (1 - leader_win)
+        expected[2] += greedy.get_round_bets_value(self.g, 2, outcome)
+        random.seed(1)
+        self.assertTrue(np.allclose(mcts.expected_coins(self.g, evalcache.EvaluationCache()), expected))
+
+    def test_rollouts_stop_at_the_cutoff(self):
+        # No camel can finish in the first round, so every rollout is scored at the cutoff
+        for cutoff in ("round", 3):
+            result = mcts.random_rollout(self.g, 0, cutoff=cutoff)
+            self.assertAlmostEqual(sum(result), 1)
+            self.assertTrue(all(result > 0))
+
+    def test_play_game_drives_stateful_players(self):
+        class Recorder(PlayerInterface):
+            def __init__(self):
+                self.calls = []
+
+            def on_game_start(self, player, game_state):
+                self.calls.append("start")
+
+            def observe_action(self, player, active_player, action, game_state):
+                self.calls.append("observe")
+
+            def on_game_end(self, player, game_state):
+                self.calls.append("end")
+
+            def move(self, active_player, game_state):
+                return (MOVE_CAMEL_ACTION_ID,)
+
+        recorder = Recorder()
+        log, g = camelup.play_game([recorder, bots.RollAgent], notify_players=True)
+        self.assertEqual(recorder.calls, ["start"] + ["observe"] * (len(log) - 1) + ["end"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+import camelup
+import greedy
+import openingbook
+from fastboard import Board
+from exactround import enumerate_round
+from racetable import canonical_race_key
+from actionids import MOVE_TRAP_ACTION_ID, ROUND_BET_ACTION_ID, GAME_BET_ACTION_ID
+
+
+class OpeningBookTest(unittest.TestCase):
+
+    def setUp(self):
+        self.g = camelup.GameState()
+        board = Board.from_game_state(self.g)
+        boards = openingbook.starting_boards(len(board.yet_to_move), board.board_size, board.move_range)
+        key, _ = canonical_race_key(board)
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, "book.npy")
+        openingbook.build_opening_book(path, {key: boards[key]}, num_simulations=100, processes=1)
+        self.book = openingbook.OpeningBook(path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_every_deal_is_a_starting_board(self):
+        boards = openingbook.starting_boards(5, 16, (1, 3))
+        for _ in range(20):
+            key, _ = canonical_race_key(Board.from_game_state(camelup.GameState()))
+            self.assertIn(key, boards)
+
+    def test_values_are_exact(self):
+        values = self.book.values(self.g, 0)
+        self.assertEqual(values.keys(), set(camelup.get_valid_moves(self.g, 0)))
+        trap_map = greedy.trap_landing_map(self.g, 0)
+        for (trap_type, trap_position), entry in trap_map.items():
+            self.assertAlmostEqual(values[(MOVE_TRAP_ACTION_ID, trap_type, trap_position)][0], entry["payout"], 5)
+        outcome = enumerate_round(Board.from_game_state(self.g))
+        probabilities = {camel: {"first": outcome.place_probability(i, 1), "second": outcome.place_probability(i, 2)}
+                         for i, camel in enumerate(self.g.CAMELS)}
+        for camel in self.g.CAMELS:
+            self.assertAlmostEqual(values[(ROUND_BET_ACTION_ID, camel)][0],
+                                   greedy.calculate_round_bet_ev(self.g, probabilities, camel), 5)
+
+    def test_game_bets_report_standard_errors(self):
+        values = self.book.values(self.g, 0)
+        for move, (ev, standard_error) in values.items():
+            if move[0] == GAME_BET_ACTION_ID:
+                self.assertGreater(standard_error, 0)
+            else:
+                self.assertEqual(standard_error, 0)
+
+    def test_bets_keep_the_board_in_the_book(self):
+        camelup.place_round_winner_bet(self.g, self.g.CAMELS[0], 0)
+        self.assertIsNone(self.book.best(self.g, 0))
+        self.assertIsNotNone(self.book.best(self.g, 1))
+        camelup.move_camel(self.g, 1)
+        self.assertIsNone(self.book.best(self.g, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
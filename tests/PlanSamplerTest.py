@@ -0,0 +1,54 @@
+import itertools
+import unittest
+import camelup
+import fastboard
+import greedy
+
+
+class PlanSamplerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.remaining = [0, 1, 2, 3, 4]
+        self.move_range = (1, 3)
+
+    def assertValidPlan(self, plan):
+        self.assertEqual(sorted(camel for camel, _ in plan), self.remaining)
+        for _, distance in plan:
+            self.assertTrue(self.move_range[0] <= distance <= self.move_range[1])
+
+    def test_all_modes_draw_valid_plans(self):
+        for mode in fastboard.SAMPLING_MODES:
+            sampler = fastboard.PlanSampler(self.remaining, self.move_range, mode)
+            for _ in range(50):
+                self.assertValidPlan(sampler.draw())
+
+    def test_stratified_covers_every_order_and_face(self):
+        sampler = fastboard.PlanSampler(self.remaining, self.move_range, "stratified")
+        plans = [sampler.draw() for _ in range(120)]
+        self.assertEqual({tuple(camel for camel, _ in plan) for plan in plans},
+                         set(itertools.permutations(self.remaining)))
+        for camel in self.remaining:
+            rolls = [distance for plan in plans for moved, distance in plan if moved == camel]
+            self.assertEqual([rolls.count(face) for face in (1, 2, 3)], [40, 40, 40])
+
+    def test_antithetic_pairs_mirror_the_dice(self):
+        sampler = fastboard.PlanSampler(self.remaining, self.move_range, "antithetic")
+        first, second = sampler.draw(), sampler.draw()
+        self.assertEqual([camel for camel, _ in first], [camel for camel, _ in second])
+        self.assertEqual([distance for _, distance in first], [4 - distance for _, distance in second])
+
+    def test_unknown_mode(self):
+        self.assertRaises(ValueError, fastboard.PlanSampler, self.remaining, self.move_range, "sobol")
+
+    def test_variance_report(self):
+        g = camelup.GameState()
+        report = greedy.variance_report(greedy.simulate_round, g, 0, modes=("random", "stratified"),
+                                        num_simulations=20, replications=3)
+        self.assertEqual(set(report), {"random", "stratified"})
+        self.assertEqual(report["random"]["efficiency"], 1)
+        probabilities = greedy.simulate_round(g, 0, num_simulations=120, sampling="quasi")
+        self.assertAlmostEqual(sum(p["first"] for p in probabilities.values()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import camelup
+import bots
+import evalcache
+import greedy
+import ponder
+from actionids import ROUND_BET_ACTION_ID
+
+
+class PonderTest(unittest.TestCase):
+
+    def setUp(self):
+        evalcache.shared_cache().clear()
+
+    def test_newer_task_replaces_older(self):
+        seen = []
+        ponderer = ponder.Ponderer(lambda value, stopped: seen.append((value, stopped())))
+        ponderer.ponder(1)
+        self.assertTrue(ponderer.wait(5))
+        ponderer.ponder(2)
+        self.assertTrue(ponderer.wait(5))
+        self.assertEqual(seen, [(1, False), (2, False)])
+
+    def test_greedy_agent_ponders_on_observed_actions(self):
+        agent = bots.GreedyAgent.configured(PONDER=True, SAMPLE_BUDGET=300)
+        g = camelup.GameState()
+        bet = (ROUND_BET_ACTION_ID, g.CAMELS[0])
+        camelup.place_round_winner_bet(g, g.CAMELS[0], 1)
+        agent.observe_action(0, 1, bet, g.get_player_copy(0))
+        self.assertTrue(ponder.shared_ponderer((agent, 0), None).wait(30))
+        decision = greedy.AnytimeDecision(g, 0, race_probabilities=greedy.lookup_race_probabilities(g),
+                                          cache=evalcache.shared_cache())
+        self.assertEqual(decision.estimate.num_simulations, 300)
+
+    def test_play_game_notifies_players(self):
+        observed = []
+
+        class Observer(bots.RollAgent):
+            @staticmethod
+            def observe_action(player, active_player, action, game_state):
+                observed.append((player, active_player))
+
+        log, g = camelup.play_game([Observer, bots.RollAgent], notify_players=True)
+        self.assertEqual(len(observed), len(log) - 1)
+        self.assertTrue(all(player == 0 for player, _ in observed))
+
+
+if __name__ == '__main__':
+    unittest.main()
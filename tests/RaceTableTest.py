@@ -0,0 +1,61 @@
+import os
+import unittest
+import tempfile
+import camelup
+import greedy
+import racetable
+from fastboard import Board
+
+
+class RaceTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.g = camelup.GameState()
+
+        # Remove camels from start positions
+        self.g.camel_track[0] = []
+        self.g.camel_track[1] = []
+        self.g.camel_track[2] = []
+
+        self.g.camel_track[3] = ["c_1", "c_3"]
+        self.g.camel_track[5] = ["c_4"]
+        self.g.camel_track[14] = ["c_0", "c_2"]
+        self.g.trap_track[7] = [-1, 0]
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "race_table.npy")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_canonical_key_ignores_camel_colours(self):
+        other = camelup.GameState()
+        other.camel_track = [[] for _ in other.camel_track]
+        other.camel_track[3] = ["c_0", "c_1"]
+        other.camel_track[5] = ["c_2"]
+        other.camel_track[14] = ["c_3", "c_4"]
+        other.trap_track[7] = [-1, 3]
+        key, _ = racetable.canonical_race_key(Board.from_game_state(self.g))
+        other_key, _ = racetable.canonical_race_key(Board.from_game_state(other))
+        self.assertEqual(key, other_key)
+
+    def test_lookup(self):
+        board = Board.from_game_state(self.g)
+        key, _ = racetable.canonical_race_key(board)
+        racetable.build_race_table(self.path, {key: racetable.canonical_board(board)}, num_simulations=200,
+                                   processes=1)
+        table = racetable.RaceTable(self.path)
+        probabilities = greedy.lookup_race_probabilities(self.g, table)
+        self.assertGreater(probabilities["c_2"]["win"], probabilities["c_4"]["win"])
+        self.assertGreater(probabilities["c_1"]["lose"], probabilities["c_2"]["lose"])
+        self.assertAlmostEqual(sum(p["win"] for p in probabilities.values()), 1, places=5)
+        for p in probabilities.values():
+            self.assertAlmostEqual(p["win_se"], (p["win"] * (1 - p["win"]) / 200) ** 0.5, places=5)
+
+        self.g.camel_track[5] = []
+        self.g.camel_track[6] = ["c_4"]
+        self.assertIsNone(table.lookup(self.g))
+
+
+if __name__ == '__main__':
+    unittest.main()
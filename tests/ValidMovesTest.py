@@ -137,6 +137,26 @@ class ValidMovesTest(unittest.TestCase):
         self.assertEqual(set(valid_moves_2), set(expected_result_2))
         self.assertEqual(set(valid_moves_3), set(expected_result_3))
 
+    def test_slots_hold_the_valid_moves(self):
+        slots = move_slots(self.g)
+        num_slots = sum(num_slots for _, num_slots in slots.values())
+        for player in range(self.g.NUM_PLAYERS):
+            moves = [slot_move(self.g, player, slot) for slot in range(num_slots)]
+            self.assertEqual([move for move in moves if move is not None], get_valid_moves(self.g, player))
+
+    def test_sampled_moves(self):
+        moves = get_valid_moves(self.g, 0)
+        samples = [sample_valid_move(self.g, 0) for _ in range(50 * len(moves))]
+        self.assertEqual(set(samples), set(moves))
+
+        weights = {MOVE_CAMEL_ACTION_ID: 1, GAME_BET_ACTION_ID: 1}
+        samples = [sample_valid_move(self.g, 0, weights) for _ in range(400)]
+        self.assertTrue(100 < samples.count((MOVE_CAMEL_ACTION_ID,)) < 300)
+        # Player 1 has bet on every camel, which leaves the roll
+        self.assertEqual({sample_valid_move(self.g, 1, weights) for _ in range(20)}, {(MOVE_CAMEL_ACTION_ID,)})
+        with self.assertRaises(ValueError):
+            sample_valid_move(self.g, 1, {GAME_BET_ACTION_ID: 1})
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import camelup
+import greedy
+import mcts
+import workerpool
+
+
+class WorkerPoolTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = workerpool.WorkerPool(2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def setUp(self):
+        self.g = camelup.GameState()
+
+    def test_decision_samples_are_split_and_merged(self):
+        decision = greedy.AnytimeDecision(self.g, 0, pool=self.pool).refine(101)
+        self.assertEqual(decision.estimate.num_simulations, 101)
+        self.assertEqual(sum(decision.estimate.first_counts), 101)
+        self.assertEqual(sum(decision.estimate.win_counts), 101)
+
+    def test_racing_samples_are_split_and_merged(self):
+        decision = greedy.RacingDecision(self.g, 0, pool=self.pool).refine(101)
+        self.assertEqual(decision.num_simulations, 101)
+        self.assertTrue(all(decision.statistics.counts[move] == 101 for move in decision.survivors
+                            if move not in decision.known))
+
+    def test_workers_use_independent_streams(self):
+        board = greedy.Board.from_game_state(self.g)
+        parts = self.pool.split(greedy.sample_futures, 400, board, self.g.CAMELS, len(self.g.camel_track), None)
+        self.assertEqual(len(parts), 2)
+        self.assertNotEqual(parts[0].landing_sums, parts[1].landing_sums)
+
+    def test_mcts_rollouts_in_workers(self):
+        agent = mcts.MCTSAgent(pool=self.pool)
+        root = mcts.MCTSNode(self.g, ptm=0)
+        children = agent.expand(root)
+        results = agent.simulate(children)
+        self.assertEqual(len(results), len(children))
+        for result in results:
+            self.assertEqual(result.sum(), 1)
+
+    def test_root_parallel_search_merges_trees(self):
+        agent = mcts.MCTSAgent(pool=self.pool, iterations=1, root_parallel=True)
+        statistics = agent.root_statistics(0, self.g)
+        self.assertEqual(set(statistics), set(camelup.get_valid_moves(self.g, 0)))
+        self.assertTrue(all(visits == 2 for visits, _ in statistics.values()))
+        self.assertIn(agent.get_move(0, self.g), statistics)
+
+    def test_root_parallel_workers_get_every_setting(self):
+        agent = mcts.MCTSAgent(pool=self.pool, iterations=4, root_parallel=True, widening=(1, 0.5), cutoff="round")
+        statistics = agent.root_statistics(0, self.g)
+        # Progressive widening opens at most ceil(sqrt(4)) children per worker
+        self.assertLessEqual(len(statistics), 2 * self.pool.workers)
+        self.assertEqual(sum(visits for visits, _ in statistics.values()), 4 * self.pool.workers)
+
+
+if __name__ == '__main__':
+    unittest.main()
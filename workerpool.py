@@ -0,0 +1,84 @@
+import atexit
+import random
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+
+class WorkerPool:
+    """
+    A persistent pool of worker processes that splits the simulations of one decision into independent parts. Every
+    part gets its own random stream, derived with numpy.random.SeedSequence from a seed drawn from the calling
+    process' random module, so runs stay reproducible under random.seed() and no two workers share a stream.
+    """
+    def __init__(self, workers):
+        """
+        :param workers: Number of worker processes.
+        """
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(workers)
+
+    def seeds(self, num_seeds):
+        """
+        :param num_seeds: Number of seeds.
+        :return: List of independent integer seeds.
+        """
+        sequence = np.random.SeedSequence(random.getrandbits(64))
+        return [int(seed) for seed in sequence.generate_state(num_seeds)]
+
+    def split(self, function, num_simulations, *args):
+        """
+        Runs function(*args, n, seed) in the workers, dividing num_simulations as evenly as possible between them.
+        :param function: Picklable (module-level) function.
+        :param num_simulations: Total number of simulations.
+        :param args: Leading arguments passed to every call.
+        :return: List of the results of all parts.
+        """
+        parts = [num_simulations // self.workers + (i < num_simulations % self.workers) for i in range(self.workers)]
+        parts = [n for n in parts if n > 0]
+        futures = [self.executor.submit(function, *args, n, seed) for n, seed in zip(parts, self.seeds(len(parts)))]
+        return [future.result() for future in futures]
+
+    def map(self, function, tasks):
+        """
+        Runs function(*task, seed) for every task with its own seed.
+        :param function: Picklable (module-level) function.
+        :param tasks: List of argument tuples.
+        :return: List of results in the order of the tasks.
+        """
+        seeds = self.seeds(len(tasks))
+        chunksize = max(len(tasks) // (4 * self.workers), 1)
+        return list(self.executor.map(function, *zip(*tasks), seeds, chunksize=chunksize))
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+_shared_pools = {}
+
+
+def shared_pool(workers):
+    """
+    The process-wide pool with the given number of workers, started on first use and reused by every later decision.
+    :param workers: Number of worker processes.
+    :return: A WorkerPool.
+    """
+    pool = _shared_pools.get(workers)
+    if pool is None:
+        pool = _shared_pools[workers] = WorkerPool(workers)
+    return pool
+
+
+@atexit.register
+def _shutdown_pools():
+    for pool in _shared_pools.values():
+        pool.shutdown()
+    _shared_pools.clear()
+
+
+def seed_worker(seed):
+    """
+    Seeds both random number generators used by the game engine in a worker process.
+    :param seed: Integer seed.
+    """
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)